@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""
+# AnalysisScheduler analyzes positions of many FiveInARow games with one
+#  fixed pool of worker processes, instead of one thread per game.
+#
+# The analysis of a position is split in one job per depth. When a depth is
+# done, the job for the next depth is queued, as long as the game is within
+# its depth and time budget. Jobs are taken in order of depth minus priority,
+# so under load all games get a shallow answer before any game gets a deep
+# one, and a game with priority 2 is served as if it were two depths
+# shallower.
+#
+# When a game submits a new position, the jobs of its old position are
+# dropped. A job already running in a worker is not stopped, but its result
+# is thrown away.
+#
+# "analyze_positions" is for many independent positions at once, e.g. puzzles
+# to check. Each worker sets its own FiveInARow up with one position after the
+# other, so the game and its evaluation cache are reused. Results are yielded
+# as they are done, and only a bounded number of positions are read ahead.
+#
+# Usage:
+#
+#   scheduler = AnalysisScheduler(numberOfWorkers=4)
+#   analyzer = GameAnalyzer(game, scheduler=scheduler)
+#
+#   for positionNumber, result in analyze_positions(positions, 4, ordered=False):
+#       ...
+#
+"""
+
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import GamePlayer.GameSearch as gs
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.WorkerPool as wp
+import concurrent.futures
+import heapq
+import itertools
+import os
+import threading
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Keys in result dictionaries.
+KEY_MOVE = "keyMove"
+KEY_EVAL = "keyEval"
+KEY_DEPTH = "keyDepth"
+KEY_HISTORY = "keyHistory"
+KEY_TIME = "keyTime"
+
+# Deepest search of "analyze_positions" when given a time.
+MAX_TIMED_DEPTH = 30
+
+# Positions submitted and not yet yielded by "analyze_positions", per worker.
+IN_FLIGHT_PER_WORKER = 4
+
+
+# Runs in the worker processes, on the FiveInARow that each worker keeps.
+# "boardData" as from getDataForSave. Moves in the result are coordinates.
+def analyzePosition(boardData, whoHas, depth):
+    startTime = time.time()
+    game = wp.getWorkerGame(fiar.FiveInARow)
+    game.setUpPosition(boardData, whoHas)
+    moveDict = game.computerAlgo.calculateMoveWithHistory(gs.historyAlgoFor(game.SEARCH_ALGO), whoHas == fiar.X_TOKEN, depth)
+    return __resultFor(game, moveDict, depth, startTime)
+
+
+# As "analyzePosition", but searches as deep as it gets in "seconds".
+def analyzePositionForTime(boardData, whoHas, seconds):
+    startTime = time.time()
+    game = wp.getWorkerGame(fiar.FiveInARow)
+    game.setUpPosition(boardData, whoHas)
+    moveDict = game.computerAlgo.calculateMoveBeforeDeadline(game.SEARCH_ALGO, whoHas == fiar.X_TOKEN, MAX_TIMED_DEPTH,
+                                                             startTime + seconds)
+    return __resultFor(game, moveDict, moveDict[gs.KEY_DEPTH], startTime)
+
+
+# "job" is (position number, boardData, whoHas, depth or seconds). Returns (position number, result).
+def analyzeJob(job):
+    positionNumber, boardData, whoHas, depthOrTime = job
+    if isinstance(depthOrTime, float):
+        return positionNumber, analyzePositionForTime(boardData, whoHas, depthOrTime)
+    return positionNumber, analyzePosition(boardData, whoHas, depthOrTime)
+
+
+def __resultFor(game, moveDict, depth, startTime):
+    move = moveDict[mma.KEY_BESTMOVE]
+    return {KEY_MOVE: game.board.dimCoordinateForIndex(move) if move is not None else None,
+            KEY_EVAL: moveDict[mma.KEY_EVAL],
+            KEY_DEPTH: depth,
+            KEY_HISTORY: [game.board.dimCoordinateForIndex(m) for m in moveDict[mma.KEY_HISTORY]],
+            KEY_TIME: time.time() - startTime}
+
+
+# Analyzes every position of "positions", (boardData, whoHas) with boardData as from getDataForSave.
+# "depthOrTime" is a search depth (int) or seconds per position (float). Yields (position number, result),
+# position numbers counted from 0, results as from "analyzePosition". If "ordered", in the order of the
+# positions, else as soon as they are done. Positions are read from "positions" as they are needed, at most
+# "maxInFlight" ahead (default IN_FLIGHT_PER_WORKER per worker). Runs in "executor" if given (a
+# ProcessPoolExecutor that can be shared between calls), else in a pool of its own with "numberOfWorkers".
+def analyze_positions(positions, depthOrTime, ordered=True, numberOfWorkers=None, maxInFlight=None, executor=None):
+    numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+    maxInFlight = maxInFlight or numberOfWorkers * IN_FLIGHT_PER_WORKER
+    jobs = ((positionNumber, boardData, whoHas, depthOrTime)
+            for positionNumber, (boardData, whoHas) in enumerate(positions))
+    if executor is not None:
+        for result in wp.imapBounded(executor, analyzeJob, jobs, maxInFlight, ordered):
+            yield result
+        return
+    with concurrent.futures.ProcessPoolExecutor(numberOfWorkers) as ownExecutor:
+        for result in wp.imapBounded(ownExecutor, analyzeJob, jobs, maxInFlight, ordered):
+            yield result
+
+
+####### CLASS ANALYSIS SCHEDULER #########
+class AnalysisScheduler:
+    """
+    Shares a pool of worker processes between the analysis of many games.
+    """
+
+    START_DEPTH = 2
+    MAX_DEPTH = 8
+
+    # Seconds of worker time one position may use. None means no limit.
+    TIME_BUDGET = None
+
+    def __init__(self, numberOfWorkers=None):
+        self.numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.numberOfWorkers)
+        # Reentrant, since a job that is already done calls back directly from add_done_callback.
+        self.lock = threading.RLock()
+        self.jobQueue = []  # Heap of (depth - priority, sequence number, gameId, version, depth)
+        self.sequence = itertools.count()
+        self.games = {}  # gameId -> dict, see "submitPosition"
+        self.running = 0
+
+    # Analyze a new position for "gameId". Drops whatever was queued for its previous position.
+    def submitPosition(self, gameId, boardData, whoHas, priority=0, maxDepth=None, timeBudget=None):
+        with self.lock:
+            version = self.games[gameId]['version'] + 1 if gameId in self.games else 0
+            self.games[gameId] = {'version': version,
+                                  'boardData': boardData,
+                                  'whoHas': whoHas,
+                                  'priority': priority,
+                                  'maxDepth': maxDepth or self.MAX_DEPTH,
+                                  'timeBudget': timeBudget if timeBudget is not None else self.TIME_BUDGET,
+                                  'usedTime': 0.0,
+                                  'result': None}
+            self.__queueJob(gameId, self.START_DEPTH)
+            self.__dispatch()
+
+    # Deepest result so far for the current position of the game, or None.
+    def getBestResult(self, gameId):
+        with self.lock:
+            game = self.games.get(gameId)
+            return None if game is None else game['result']
+
+    def removeGame(self, gameId):
+        with self.lock:
+            self.games.pop(gameId, None)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    ################################################################
+    #
+    #                   Private help methods
+    #           Called with self.lock held.
+    #
+    ################################################################
+    def __queueJob(self, gameId, depth):
+        game = self.games[gameId]
+        heapq.heappush(self.jobQueue, (depth - game['priority'], next(self.sequence), gameId, game['version'], depth))
+
+    def __dispatch(self):
+        while self.running < self.numberOfWorkers and len(self.jobQueue) > 0:
+            order, sequence, gameId, version, depth = heapq.heappop(self.jobQueue)
+            game = self.games.get(gameId)
+            if game is None or not game['version'] == version:
+                continue  # Position has changed since the job was queued.
+            future = self.executor.submit(analyzePosition, game['boardData'], game['whoHas'], depth)
+            self.running += 1
+            future.add_done_callback(lambda f, g=gameId, v=version: self.__jobDone(f, g, v))
+
+    def __jobDone(self, future, gameId, version):
+        with self.lock:
+            self.running -= 1
+            game = self.games.get(gameId)
+            if game is not None and game['version'] == version and future.exception() is None:
+                result = future.result()
+                game['result'] = result
+                game['usedTime'] += result[KEY_TIME]
+                withinTime = game['timeBudget'] is None or game['usedTime'] < game['timeBudget']
+                if result[KEY_MOVE] is not None and result[KEY_DEPTH] < game['maxDepth'] and withinTime:
+                    self.__queueJob(gameId, result[KEY_DEPTH] + 1)
+            self.__dispatch()
+####### END CLASS ANALYSIS SCHEDULER #########
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+# AnalysisStore keeps search results on disk, so they survive the process
+#  and can be shared by several processes.
+#
+# Each position (see BoardSymmetry.canonicalPositionKey) gets best move,
+# depth, score and bound. Moves are stored in the canonical orientation.
+#
+# The store is a SQLite database in WAL mode: any number of processes can
+# read while one writes. Open it with readOnly=True in processes that only
+# read. When the store grows above MAX_ENTRIES, the shallowest and oldest
+# entries are evicted.
+#
+# Usage:
+#
+#   store = AnalysisStore("analysis.db")
+#   game.analysisStore = store
+#
+"""
+
+import sqlite3
+import threading
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+BOUND_EXACT = 0
+BOUND_LOWER = 1
+BOUND_UPPER = 2
+
+# Keys in the dictionary from "lookup".
+KEY_BEST_MOVE = "keyBestMove"
+KEY_DEPTH = "keyDepth"
+KEY_SCORE = "keyScore"
+KEY_BOUND = "keyBound"
+
+
+# Position keys are tuples of (dimensions, board string, who has). Stored as text.
+def positionKeyToString(positionKey):
+    dimensions, boardData, whoHas = positionKey
+    return "x".join(str(d) for d in dimensions) + ":" + whoHas + ":" + boardData
+
+
+####### CLASS ANALYSIS STORE #########
+class AnalysisStore:
+    """
+    Position analysis in a SQLite database, shared between processes.
+    """
+
+    MAX_ENTRIES = 1000000
+
+    # Eviction is checked every this many stores.
+    EVICTION_INTERVAL = 1000
+
+    def __init__(self, path, readOnly=False):
+        self.path = path
+        self.readOnly = readOnly
+        self.connections = threading.local()
+        self.storesSinceEviction = 0
+        if not readOnly:
+            connection = self.__getConnection()
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS analysis ("
+                               "position TEXT PRIMARY KEY, "
+                               "best_move INTEGER, "
+                               "depth INTEGER, "
+                               "score REAL, "
+                               "bound INTEGER, "
+                               "stored_at REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS analysis_eviction ON analysis (depth, stored_at)")
+            connection.commit()
+
+    # Returns dict with KEY_BEST_MOVE, KEY_DEPTH, KEY_SCORE and KEY_BOUND, or None if position is not stored.
+    def lookup(self, positionKey):
+        try:
+            row = self.__getConnection().execute("SELECT best_move, depth, score, bound FROM analysis WHERE position = ?",
+                                                 (positionKeyToString(positionKey),)).fetchone()
+        except sqlite3.OperationalError:
+            return None  # E.g. a reader opening the store before any writer has created it.
+        if row is None:
+            return None
+        return {KEY_BEST_MOVE: row[0], KEY_DEPTH: row[1], KEY_SCORE: row[2], KEY_BOUND: row[3]}
+
+    # An entry is only replaced by one of at least the same depth.
+    def store(self, positionKey, bestMove, depth, score, bound=BOUND_EXACT):
+        if self.readOnly:
+            raise Exception("AnalysisStore is opened read only!")
+        connection = self.__getConnection()
+        connection.execute("INSERT INTO analysis (position, best_move, depth, score, bound, stored_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?) "
+                           "ON CONFLICT(position) DO UPDATE SET "
+                           "best_move = excluded.best_move, depth = excluded.depth, score = excluded.score, "
+                           "bound = excluded.bound, stored_at = excluded.stored_at "
+                           "WHERE excluded.depth >= analysis.depth",
+                           (positionKeyToString(positionKey), bestMove, depth, score, bound, time.time()))
+        connection.commit()
+
+        self.storesSinceEviction += 1
+        if self.storesSinceEviction >= self.EVICTION_INTERVAL:
+            self.storesSinceEviction = 0
+            self.evict()
+
+    # Removes the shallowest, and among them the oldest, entries above MAX_ENTRIES.
+    def evict(self):
+        connection = self.__getConnection()
+        numberOfEntries = connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+        if numberOfEntries <= self.MAX_ENTRIES:
+            return
+        connection.execute("DELETE FROM analysis WHERE position IN "
+                           "(SELECT position FROM analysis ORDER BY depth, stored_at LIMIT ?)",
+                           (numberOfEntries - self.MAX_ENTRIES,))
+        connection.commit()
+
+    def close(self):
+        connection = getattr(self.connections, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.connections.connection = None
+
+    # SQLite connections can not be shared between threads. One per thread.
+    def __getConnection(self):
+        connection = getattr(self.connections, 'connection', None)
+        if connection is None:
+            if self.readOnly:
+                connection = sqlite3.connect("file:" + self.path + "?mode=ro", uri=True, timeout=30)
+            else:
+                connection = sqlite3.connect(self.path, timeout=30)
+            self.connections.connection = connection
+        return connection
+####### END CLASS ANALYSIS STORE #########
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""
+# ArchiveAnnotator annotates every move of every game in a FiveInARow game
+#  archive with the engine's opinion of it.
+#
+# The archive is a text file with one game per line, as JSON:
+#
+#   {"moves": [[3, 3], [4, 3], ...], "result": "X"}
+#
+# X makes the first move. Moves are coordinates as given to makeMove when
+# the game was played, i.e. on the board as it had grown at that time.
+#
+# For each move the annotation has the evaluation before the move (search
+# from the position), the best move, the evaluation after the move (search
+# from the position after it, one ply less) and the error: how much worse the
+# move was than the best move, for the player that made it. Evaluations are
+# from X's view, as everywhere in FiveInARow.
+#
+# Games are read one at a time and analyzed in a pool of worker processes,
+# with a bounded number of games in flight. Annotations are appended to the
+# output, one game per line, in archive order. A checkpoint file records how
+# many games are done, so an interrupted run continues where it stopped.
+#
+# Usage:
+#
+#   python ArchiveAnnotator.py games.jsonl annotations.jsonl --depth 3 --workers 8
+#
+"""
+
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.GameSearch as gs
+import GamePlayer.WorkerPool as wp
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import argparse
+import concurrent.futures
+import functools
+import json
+import os
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Keys in the archive and in the annotations.
+KEY_MOVES = "moves"
+KEY_RESULT = "result"
+KEY_GAME = "game"
+KEY_ANNOTATIONS = "annotations"
+KEY_ERROR_MESSAGE = "errorMessage"
+KEY_MOVE = "move"
+KEY_PLAYER = "player"
+KEY_EVAL_BEFORE = "evalBefore"
+KEY_EVAL_AFTER = "evalAfter"
+KEY_BEST_MOVE = "bestMove"
+KEY_ERROR = "error"
+
+# Keys in the checkpoint file.
+KEY_GAMES_DONE = "gamesDone"
+KEY_OUTPUT_SIZE = "outputSize"
+
+
+# Yields (game number, game) for the games of the archive, from game number "skip".
+def readArchive(path, skip=0):
+    with open(path, 'r') as archiveFile:
+        gameNumber = 0
+        for line in archiveFile:
+            if len(line.strip()) == 0:
+                continue
+            if gameNumber >= skip:
+                yield gameNumber, json.loads(line)
+            gameNumber += 1
+
+
+################################################################
+#
+#       Runs in the worker processes, on the FiveInARow
+#       that each worker keeps.
+#
+################################################################
+def annotateGame(numberedGame, depth):
+    gameNumber, archivedGame = numberedGame
+    game = wp.getWorkerGame(fiar.FiveInARow)
+    game.resetGame()
+    annotations = []
+    for move in archivedGame[KEY_MOVES]:
+        player = game.whoHas
+        evalBefore, bestMove = __search(game, depth)
+        bestCoordinates = game.board.dimCoordinateForIndex(bestMove) if bestMove is not None else None
+        isBestMove = bestCoordinates is not None and list(move) == list(bestCoordinates)
+
+        if not game.makeMove(move, player):
+            return {KEY_GAME: gameNumber, KEY_ANNOTATIONS: annotations,
+                    KEY_ERROR_MESSAGE: "Illegal move " + str(move) + " for " + player}
+
+        # The best move keeps the evaluation, no need to search again.
+        if isBestMove:
+            evalAfter = evalBefore
+        elif game.getWinnerOfCurrentPosition() is not None or depth <= 1:
+            evalAfter = game.evalBoard()
+        else:
+            evalAfter = __search(game, depth - 1)[0]
+
+        error = evalBefore - evalAfter if player == fiar.X_TOKEN else evalAfter - evalBefore
+        annotations.append({KEY_MOVE: list(move),
+                            KEY_PLAYER: player,
+                            KEY_EVAL_BEFORE: evalBefore,
+                            KEY_EVAL_AFTER: evalAfter,
+                            KEY_BEST_MOVE: bestCoordinates,
+                            KEY_ERROR: max(0, error)})
+    return {KEY_GAME: gameNumber, KEY_ANNOTATIONS: annotations}
+
+
+# Returns (evaluation, best move index) of the current position of "game".
+def __search(game, depth):
+    moveDict = game.computerAlgo.calculateMoveWithHistory(gs.historyAlgoFor(game.SEARCH_ALGO), game.whoHas == fiar.X_TOKEN, depth)
+    return moveDict[mma.KEY_EVAL], moveDict[mma.KEY_BESTMOVE]
+
+
+####### CLASS ARCHIVE ANNOTATOR #########
+class ArchiveAnnotator:
+    """
+    Streams a game archive through a pool of workers and writes the annotations.
+    """
+
+    SEARCH_DEPTH = fiar.FiveInARow.SEARCH_DEPTH
+
+    # Games in flight per worker. Keeps workers busy without reading far ahead.
+    IN_FLIGHT_PER_WORKER = 4
+
+    # The checkpoint is written after this many games.
+    CHECKPOINT_INTERVAL = 100
+
+    def __init__(self, archivePath, outputPath, checkpointPath=None, numberOfWorkers=None, depth=None):
+        self.archivePath = archivePath
+        self.outputPath = outputPath
+        self.checkpointPath = checkpointPath or outputPath + ".checkpoint"
+        self.numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+        self.depth = depth or self.SEARCH_DEPTH
+
+    # Annotates the games not done by an earlier run. Returns the number of games annotated by this run.
+    def run(self, progress_callback=None):
+        gamesDone, outputSize = self.__readCheckpoint()
+
+        # Annotations written after the last checkpoint will be written again.
+        with open(self.outputPath, 'ab') as outputFile:
+            outputFile.truncate(outputSize)
+
+        startTime = time.time()
+        annotated = 0
+        with concurrent.futures.ProcessPoolExecutor(self.numberOfWorkers) as executor, \
+                open(self.outputPath, 'a') as outputFile:
+            results = wp.imapBounded(executor, functools.partial(annotateGame, depth=self.depth),
+                                     readArchive(self.archivePath, gamesDone),
+                                     self.numberOfWorkers * self.IN_FLIGHT_PER_WORKER)
+            for result in results:
+                outputFile.write(json.dumps(result) + "\n")
+                gamesDone += 1
+                annotated += 1
+                if annotated % self.CHECKPOINT_INTERVAL == 0:
+                    self.__writeCheckpoint(outputFile, gamesDone)
+                    if progress_callback is not None:
+                        progress_callback(gamesDone, time.time() - startTime)
+            self.__writeCheckpoint(outputFile, gamesDone)
+        return annotated
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # Returns (games done, size of output when they were done).
+    def __readCheckpoint(self):
+        if not os.path.exists(self.checkpointPath):
+            return 0, 0
+        with open(self.checkpointPath, 'r') as checkpointFile:
+            checkpoint = json.load(checkpointFile)
+        return checkpoint[KEY_GAMES_DONE], checkpoint[KEY_OUTPUT_SIZE]
+
+    # The output is on disk before the checkpoint that counts it. The checkpoint is replaced in one step.
+    def __writeCheckpoint(self, outputFile, gamesDone):
+        outputFile.flush()
+        os.fsync(outputFile.fileno())
+        temporaryPath = self.checkpointPath + ".tmp"
+        with open(temporaryPath, 'w') as checkpointFile:
+            json.dump({KEY_GAMES_DONE: gamesDone, KEY_OUTPUT_SIZE: outputFile.tell()}, checkpointFile)
+        os.replace(temporaryPath, self.checkpointPath)
+####### END CLASS ARCHIVE ANNOTATOR #########
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Annotates every move in a FiveInARow game archive.")
+    parser.add_argument("archive", help="Games, one JSON object per line")
+    parser.add_argument("output", help="Annotations are appended here, one game per line")
+    parser.add_argument("--checkpoint", help="Checkpoint file. Default is output + '.checkpoint'")
+    parser.add_argument("--depth", type=int, help="Search depth. Default " + str(ArchiveAnnotator.SEARCH_DEPTH))
+    parser.add_argument("--workers", type=int, help="Number of worker processes. Default one per CPU")
+    arguments = parser.parse_args()
+
+    annotator = ArchiveAnnotator(arguments.archive, arguments.output, arguments.checkpoint, arguments.workers, arguments.depth)
+    printProgress = lambda gamesDone, usedTime: print("Games done:", gamesDone, "Time: {:.1f} s".format(usedTime))
+    print("Annotated", annotator.run(printProgress), "games.")
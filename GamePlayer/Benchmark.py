@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+"""
+# Benchmark compares search algorithms on a fixed set of positions.
+#
+# For each position, algorithm and depth it measures the number of nodes
+# (moves made by the search) and the time to reach the depth.
+#
+# Usage:
+#
+#   python Benchmark.py
+#
+#   or call "benchmarkSearch" with own positions and algorithms.
+#
+#   "benchmarkEvaluation" compares the two ways BoardScanner reads the lines
+#   of a board, a dict and a list per line (scanBoardForEvaluation) and one
+#   line buffer for all lines (scanLines). Allocations are counted with tracemalloc.
+#
+#   Games with selective search enabled (GameEngine.enableSelectiveSearch)
+#   are searched with it, so the same positions can be run with and without.
+#
+"""
+
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import StrideDimensions.StrideDimensions as sd
+import GamePlayer.GameSearch as gs
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.TicTacToe as ttt
+import time
+import tracemalloc
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Positions are given row by row, top row first. X always starts, so the
+# player to move follows from the number of tokens.
+FIVE_IN_A_ROW_POSITIONS = [
+    ["-------",
+     "-------",
+     "--OX---",
+     "---XO--",
+     "---X---",
+     "-------",
+     "-------"],
+
+    ["--------",
+     "--------",
+     "---O----",
+     "--XXO---",
+     "---XXO--",
+     "---OX---",
+     "--------",
+     "--------"],
+
+    ["---------",
+     "---------",
+     "----O----",
+     "--OXXX---",
+     "---XOO---",
+     "--X-O----",
+     "---------",
+     "---------",
+     "---------"],
+]
+
+TIC_TAC_TOE_POSITIONS = [
+    ["---",
+     "-X-",
+     "---"],
+
+    ["X--",
+     "-O-",
+     "--X"],
+]
+
+ALGOS = [mma.MINMAXALPHABETAPRUNINGWITHHISTORY_ALGO, gs.PVS_ASPIRATION_ALGO]
+
+
+# Sets up the position on "game", any GameEngine game.
+def setUpFromRows(game, rows):
+    board = sd.StrideDimension((len(rows[0]), len(rows)))
+    board.fillData(game.NO_TOKEN)
+    for y, row in enumerate(reversed(rows)):
+        for x, token in enumerate(row):
+            if not token == game.NO_TOKEN:
+                board.setData((x + 1, y + 1), token)
+    allData = board.getAllData()
+    whoHas = game.X_TOKEN if allData.count(game.X_TOKEN) == allData.count(game.O_TOKEN) else game.O_TOKEN
+    game.setUpPosition(board.getDataForSave(), whoHas)
+    return game
+
+
+def fiveInARowFromRows(rows):
+    return setUpFromRows(fiar.FiveInARow(), rows)
+
+
+def ticTacToeFromRows(rows):
+    return setUpFromRows(ttt.TicTacToe(), rows)
+
+
+# Wraps the callbacks of "game" to count every move the search makes. Search settings are those of the game.
+def countingAlgo(game, counter):
+    def moveX(move):
+        counter[0] += 1
+        game.moveX(move)
+
+    def moveO(move):
+        counter[0] += 1
+        game.moveO(move)
+
+    algo = gs.GameSearchAlgo(game.evalBoard, moveX, moveO, game.undoMove, game.undoMove,
+                             game.getPossibleMovesMaximizer, game.getPossibleMovesMinimizer,
+                             game.MIN_EVAL, game.MAX_EVAL)
+    game.configureSearchAlgo(algo)
+    return algo
+
+
+# Returns a list of dicts, one per position, algorithm and depth.
+def benchmarkSearch(games, algos, maxDepth):
+    results = []
+    for positionNumber, game in enumerate(games):
+        # Both games use 'X' for the maximizer.
+        maximizer = game.whoHas == fiar.X_TOKEN
+        for algo in algos:
+            for depth in range(1, maxDepth + 1):
+                counter = [0]
+                algoToTest = countingAlgo(game, counter)
+                game.evalCache.clear()  # Every run starts without cached evaluations.
+                startTime = time.time()
+                moveDict = algoToTest.calculateMoveWithHistory(algo, maximizer, depth)
+                results.append({'position': positionNumber,
+                                'algo': algo,
+                                'depth': depth,
+                                'nodes': counter[0],
+                                'time': time.time() - startTime,
+                                'move': game.board.dimCoordinateForIndex(moveDict[mma.KEY_BESTMOVE]),
+                                'eval': moveDict[mma.KEY_EVAL]})
+    return results
+
+
+# Evaluates "boards" (StrideDimensions) "repeats" times through each scan. Returns a dict per scan with the
+# time used, and the memory blocks and bytes allocated per evaluation for the callback arguments. These are
+# counted by tracemalloc, with the arguments of every callback kept alive until counted.
+def benchmarkEvaluation(boards, repeats):
+    evaluator = fiar.GameEvaluator()
+    scanner = evaluator.board_scanner
+    keptArguments = []
+
+    def listCallback(d):
+        keptArguments.append(d)
+        return evaluator.evaluateList(d[fiar.BoardScanner.KEY_BOARD_LIST_DATA])
+
+    def lineCallback(lineBuffer, start, end):
+        keptArguments.append(lineBuffer)
+        return evaluator.evaluateRange(lineBuffer, start, end)
+
+    scans = [('scanBoardForEvaluation', lambda board, keep: scanner.scanBoardForEvaluation(
+                 board, listCallback if keep else lambda d: evaluator.evaluateList(d[fiar.BoardScanner.KEY_BOARD_LIST_DATA]))),
+             ('scanLines', lambda board, keep: scanner.scanLines(board, lineCallback if keep else evaluator.evaluateRange))]
+    results = []
+    for name, scan in scans:
+        for board in boards:
+            scan(board, False)  # Line layouts and compiled patterns are made before measuring.
+
+        startTime = time.time()
+        for i in range(repeats):
+            for board in boards:
+                scan(board, False)
+        usedTime = time.time() - startTime
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for board in boards:
+            scan(board, True)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        allocated = [stat for stat in after.compare_to(before, 'filename') if stat.count_diff > 0]
+        results.append({'scan': name,
+                        'evaluations': repeats * len(boards),
+                        'time': usedTime,
+                        'blocks': sum(stat.count_diff for stat in allocated) / len(boards),
+                        'bytes': sum(stat.size_diff for stat in allocated) / len(boards)})
+        keptArguments.clear()
+    return results
+
+
+def printEvaluationResults(results):
+    print("{:>24} {:>11} {:>9} {:>18} {:>17}".format("scan", "evaluations", "time", "blocks/evaluation", "bytes/evaluation"))
+    for r in results:
+        print("{:>24} {:>11} {:>9.3f} {:>18.1f} {:>17.0f}".format(r['scan'], r['evaluations'], r['time'], r['blocks'], r['bytes']))
+
+
+def printResults(results):
+    print("{:>3} {:>20} {:>5} {:>9} {:>9} {:>10} {:>7}".format("pos", "algo", "depth", "nodes", "time", "move", "eval"))
+    for r in results:
+        print("{:>3} {:>20} {:>5} {:>9} {:>9.3f} {:>10} {:>7}".format(r['position'], str(r['algo']), r['depth'], r['nodes'],
+                                                                   r['time'], str(r['move']), r['eval']))
+    print("")
+    print("Totals:")
+    for algo in set(r['algo'] for r in results):
+        nodes = sum(r['nodes'] for r in results if r['algo'] == algo)
+        usedTime = sum(r['time'] for r in results if r['algo'] == algo)
+        print("{:>20} nodes: {:>9} time: {:>9.3f}".format(str(algo), nodes, usedTime))
+
+
+if __name__ == '__main__':
+    print("*** TIC TAC TOE ***")
+    printResults(benchmarkSearch([ticTacToeFromRows(rows) for rows in TIC_TAC_TOE_POSITIONS], ALGOS, 6))
+    print("")
+    print("*** FIVE IN A ROW ***")
+    printResults(benchmarkSearch([fiveInARowFromRows(rows) for rows in FIVE_IN_A_ROW_POSITIONS], ALGOS, 4))
+    print("")
+    print("*** FIVE IN A ROW, SELECTIVE SEARCH ***")
+    selectiveGames = [fiveInARowFromRows(rows) for rows in FIVE_IN_A_ROW_POSITIONS]
+    for selectiveGame in selectiveGames:
+        selectiveGame.enableSelectiveSearch()
+    printResults(benchmarkSearch(selectiveGames, [gs.PVS_ASPIRATION_ALGO], 6))
+    print("")
+    print("*** FIVE IN A ROW, EVALUATION ***")
+    printEvaluationResults(benchmarkEvaluation([fiveInARowFromRows(rows).board for rows in FIVE_IN_A_ROW_POSITIONS], 200))
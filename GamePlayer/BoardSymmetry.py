@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""
+# BoardSymmetry gives the same key to positions that are rotations or
+#  reflections of each other, so caches and tables can store them once.
+#
+# A square board has 8 symmetries (4 rotations, each also reflected).
+# A board that is not square has 4 (identity, rotation 180 degrees and
+# the two reflections), since the others change the board size.
+#
+# Usage:
+#
+#   symmetry = getBoardSymmetry(board.dimensions)
+#   key, transform = symmetry.canonicalize(board.getAllData())
+#   ...
+#   move = symmetry.fromCanonicalIndex(canonicalMove, transform)
+#
+"""
+
+import StrideDimensions.StrideDimensions as sd
+from operator import itemgetter
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+IDENTITY = 0
+
+# Each transform maps coordinate (x, y) on a board with c columns and r rows.
+TRANSFORMS_ALL_BOARDS = [
+    lambda x, y, c, r: (x, y),                  # Identity
+    lambda x, y, c, r: (c + 1 - x, r + 1 - y),  # Rotate 180
+    lambda x, y, c, r: (c + 1 - x, y),          # Reflect left-right
+    lambda x, y, c, r: (x, r + 1 - y),          # Reflect up-down
+]
+TRANSFORMS_SQUARE_BOARDS = [
+    lambda x, y, c, r: (r + 1 - y, x),          # Rotate 90
+    lambda x, y, c, r: (y, c + 1 - x),          # Rotate 270
+    lambda x, y, c, r: (y, x),                  # Reflect in diagonal up
+    lambda x, y, c, r: (r + 1 - y, c + 1 - x),  # Reflect in diagonal down
+]
+
+
+####### CLASS BOARD SYMMETRY #########
+class BoardSymmetry:
+    """
+    Index permutation tables for all symmetries of one board size.
+    """
+
+    def __init__(self, dimensions):
+        self.dimensions = tuple(dimensions)
+        columns, rows = self.dimensions
+        transforms = TRANSFORMS_ALL_BOARDS
+        if columns == rows:
+            transforms = TRANSFORMS_ALL_BOARDS + TRANSFORMS_SQUARE_BOARDS
+
+        # Let a board of this size do the index <-> coordinate mapping.
+        board = sd.StrideDimension(self.dimensions)
+        numberOfCells = columns * rows
+
+        # toCanonical[t][i] is where cell i ends up by transform t.
+        # fromCanonical[t][j] is the cell that ends up at j, i.e. the inverse.
+        self.toCanonical = []
+        self.fromCanonical = []
+        for transform in transforms:
+            forward = [0] * numberOfCells
+            for index in range(numberOfCells):
+                x, y = board.dimCoordinateForIndex(index)
+                forward[index] = board.indexForDimCoordinate(transform(x, y, columns, rows))
+            inverse = [0] * numberOfCells
+            for index, transformedIndex in enumerate(forward):
+                inverse[transformedIndex] = index
+            self.toCanonical.append(forward)
+            self.fromCanonical.append(inverse)
+
+        self.__getters = [itemgetter(*inverse) for inverse in self.fromCanonical]
+
+    # "boardData" as from getAllData. Returns (canonical string, transform that gives it).
+    # The canonical string is the smallest of the strings of all transformed boards.
+    def canonicalize(self, boardData):
+        bestString = None
+        bestTransform = IDENTITY
+        for transform, getter in enumerate(self.__getters):
+            transformed = ''.join(getter(boardData))
+            if bestString is None or transformed < bestString:
+                bestString = transformed
+                bestTransform = transform
+        return bestString, bestTransform
+
+    def toCanonicalIndex(self, index, transform):
+        return self.toCanonical[transform][index]
+
+    def fromCanonicalIndex(self, index, transform):
+        return self.fromCanonical[transform][index]
+####### END CLASS BOARD SYMMETRY #########
+
+
+__symmetries = {}
+
+
+# Returns the (shared) BoardSymmetry of a board size. Tables are built on first use.
+def getBoardSymmetry(dimensions):
+    dimensions = tuple(dimensions)
+    if dimensions not in __symmetries:
+        __symmetries[dimensions] = BoardSymmetry(dimensions)
+    return __symmetries[dimensions]
+
+
+# Returns (key, transform) for a board and the player to move. Rotated and reflected
+# positions get the same key. Moves found in a position with this key are mapped
+# back with getBoardSymmetry(board.dimensions).fromCanonicalIndex(move, transform).
+def canonicalPositionKey(board, whoHas):
+    symmetry = getBoardSymmetry(board.dimensions)
+    canonicalData, transform = symmetry.canonicalize(board.getAllData())
+    return (tuple(board.dimensions), canonicalData, whoHas), transform
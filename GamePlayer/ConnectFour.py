@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+"""
+# ConnectFour implements game with same name on top of GameEngine.
+#
+# Tokens are dropped in a column and fall to the lowest free square. Four in
+# a row, column or diagonal wins.
+#
+# Besides the engine's board, the position is kept in two bitboards, one per
+# player, updated on every move. Bit (x - 1) * 7 + (y - 1) is square (x, y),
+# so every column has one spare bit on top. That makes the move generator and
+# the win check a few integer operations:
+#   - Adding the bottom row to all occupied squares gives the lowest free
+#     square of every column that is not full.
+#   - Four in a row is found by and-ing the bitboard with itself shifted 1
+#     (column), 7 (row), 6 and 8 (diagonals).
+#
+# Usage:
+#
+#   python ConnectFour.py
+#
+"""
+
+import GamePlayer.GameEngine as ge
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+COLUMNS = 7
+ROWS = 6
+BITS_PER_COLUMN = ROWS + 1
+
+BOTTOM_ROW = sum(1 << (x * BITS_PER_COLUMN) for x in range(COLUMNS))
+ALL_SQUARES = BOTTOM_ROW * ((1 << ROWS) - 1)
+COLUMN_MASKS = [((1 << ROWS) - 1) << (x * BITS_PER_COLUMN) for x in range(COLUMNS)]
+
+# Column, row, diagonal up and diagonal down.
+DIRECTIONS = [1, BITS_PER_COLUMN, BITS_PER_COLUMN + 1, BITS_PER_COLUMN - 1]
+
+
+def bitForCoordinate(x, y):
+    return (x - 1) * BITS_PER_COLUMN + (y - 1)
+
+
+def hasFour(bitboard):
+    for shift in DIRECTIONS:
+        pairs = bitboard & (bitboard >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
+    return False
+
+
+def countBits(bitboard):
+    return bin(bitboard).count('1')
+
+
+# Every four squares in a line, as bitboards.
+WINDOWS = []
+for x in range(1, COLUMNS + 1):
+    for y in range(1, ROWS + 1):
+        for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            if 1 <= x + 3 * dx <= COLUMNS and 1 <= y + 3 * dy <= ROWS:
+                WINDOWS.append(sum(1 << bitForCoordinate(x + i * dx, y + i * dy) for i in range(4)))
+
+
+####### CLASS CONNECT FOUR #########
+class ConnectFour(ge.GameEngine):
+    """
+    Connect four with bitboard move generation and evaluation.
+    """
+
+    MIN_EVAL = -1000
+    MAX_EVAL = 1000
+    SEARCH_DEPTH = 6
+
+    # Weights of a line of four with only one player's tokens in it.
+    EVAL_THREE = 5
+    EVAL_TWO = 2
+    # Weight of each token in the middle column.
+    EVAL_CENTER = 3
+
+    # Middle columns first, which makes alpha beta cut more.
+    COLUMN_ORDER = sorted(range(COLUMNS), key=lambda x: abs(x - COLUMNS // 2))
+
+    def __init__(self):
+        # Board index <-> bit. Board indices are whatever the StrideDimension uses.
+        self.indexToBit = {}
+        self.bitToIndex = {}
+        super().__init__((COLUMNS, ROWS))
+        for x in range(1, COLUMNS + 1):
+            for y in range(1, ROWS + 1):
+                index = self.board.indexForDimCoordinate((x, y))
+                self.indexToBit[index] = bitForCoordinate(x, y)
+                self.bitToIndex[bitForCoordinate(x, y)] = index
+        self.rehash()
+
+    ########################################
+    #
+    #           Game interface
+    #
+    ########################################
+    # Returns the coordinates a token dropped in column "x" lands on, or None if the column is full.
+    def getDropCoordinates(self, x):
+        freeSquare = (self.bitboards[self.X_TOKEN] | self.bitboards[self.O_TOKEN]) + BOTTOM_ROW & COLUMN_MASKS[x - 1]
+        if freeSquare == 0:
+            return None
+        return (x, freeSquare.bit_length() - (x - 1) * BITS_PER_COLUMN)
+
+    def getWinnerOfCurrentPosition(self):
+        if hasFour(self.bitboards[self.X_TOKEN]):
+            return self.X_TOKEN
+        if hasFour(self.bitboards[self.O_TOKEN]):
+            return self.O_TOKEN
+        if (self.bitboards[self.X_TOKEN] | self.bitboards[self.O_TOKEN]) == ALL_SQUARES:
+            return self.NO_TOKEN
+        return None
+
+    ###############################################
+    #
+    # Callback Interfaces for different algorithms
+    #
+    ###############################################
+    # Called by the engine's evalBoard, which caches the result.
+    def evaluatePosition(self):
+        xBitboard = self.bitboards[self.X_TOKEN]
+        oBitboard = self.bitboards[self.O_TOKEN]
+        if hasFour(xBitboard):
+            return self.MAX_EVAL
+        if hasFour(oBitboard):
+            return self.MIN_EVAL
+
+        addVal = 0
+        for window in WINDOWS:
+            xInWindow = xBitboard & window
+            oInWindow = oBitboard & window
+            if xInWindow and not oInWindow:
+                addVal += self.__evalLine(countBits(xInWindow))
+            elif oInWindow and not xInWindow:
+                addVal -= self.__evalLine(countBits(oInWindow))
+        center = COLUMN_MASKS[COLUMNS // 2]
+        addVal += self.EVAL_CENTER * (countBits(xBitboard & center) - countBits(oBitboard & center))
+        return addVal
+
+    # The lowest free square of each column that is not full, middle columns first.
+    def getPossibleMoves(self):
+        xBitboard = self.bitboards[self.X_TOKEN]
+        oBitboard = self.bitboards[self.O_TOKEN]
+        if hasFour(xBitboard) or hasFour(oBitboard):
+            return []
+        freeSquares = (xBitboard | oBitboard) + BOTTOM_ROW & ALL_SQUARES
+        moves = []
+        for x in self.COLUMN_ORDER:
+            freeSquare = freeSquares & COLUMN_MASKS[x]
+            if freeSquare:
+                moves.append(self.bitToIndex[freeSquare.bit_length() - 1])
+        return moves
+
+    def onTokenPlaced(self, index, token):
+        self.bitboards[token] ^= 1 << self.indexToBit[index]
+
+    def onTokenRemoved(self, index, token):
+        self.bitboards[token] ^= 1 << self.indexToBit[index]
+
+    ################################################################
+    #
+    #                   Help methods
+    #
+    ################################################################
+    # A token must land on the bottom or on another token.
+    def checkMove(self, coordinate, token):
+        super().checkMove(coordinate, token)
+        if not list(self.getDropCoordinates(int(coordinate[0]))) == [int(coordinate[0]), int(coordinate[1])]:
+            raise Exception("!!! Token must be dropped in the column !!!")
+
+    # Bitboards are built again whenever the engine hashes from scratch.
+    def rehash(self):
+        super().rehash()
+        self.bitboards = {self.X_TOKEN: 0, self.O_TOKEN: 0}
+        if len(self.indexToBit) == 0:
+            return  # Called by the engine before the bit tables are set up.
+        for index, token in enumerate(self.board.getAllData()):
+            if token in self.bitboards:
+                self.bitboards[token] |= 1 << self.indexToBit[index]
+
+    def __evalLine(self, numberOfTokens):
+        if numberOfTokens == 3:
+            return self.EVAL_THREE
+        if numberOfTokens == 2:
+            return self.EVAL_TWO
+        return 0
+####### END CLASS CONNECT FOUR #########
+
+
+"""
+Example how to use ConnectFour-class to play.
+"""
+class TextBasedConnectFourGame(ge.TextBasedGame):
+    def __init__(self):
+        super().__init__(ConnectFour(), "CONNECT FOUR")
+
+    # The player only gives the column.
+    def askPlayerForMove(self):
+        while True:
+            print("Your move(" + self.playersToken + "), column>")
+            try:
+                x = int(input())
+            except:
+                print("!!! Give number of column !!!")
+                continue
+            if x < 1 or x > COLUMNS:
+                print("!!!! Column min=1 max=" + str(COLUMNS) + " !!!")
+                continue
+            coordinates = self.game.getDropCoordinates(x)
+            if coordinates is None:
+                print("!!! Column is full !!!")
+                continue
+            return coordinates
+
+
+if __name__ == '__main__':
+    print("Welcome to GamePlayer - Connect four!")
+    tbcf = TextBasedConnectFourGame()
+    tbcf.play()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+"""
+# EvaluationTuner fits the pattern weights of GameEvaluator to the results of
+#  played games (Texel tuning).
+#
+# Every position of the games in an archive (same format as ArchiveAnnotator)
+# is turned into a feature vector: how many lines of the board have each
+# pattern, from GameEvaluator.pattern_counts_batch. The evaluation is then the
+# features times the weights. The weights are fitted so that
+#
+#   sigmoid(scale * evaluation)
+#
+# predicts the result of the game (1 X wins, 0.5 draw, 0 O wins) with least
+# squared error. The scale is fitted first, with the current weights.
+#
+# A pattern and its mirror (X and O swapped) share one weight with opposite
+# signs, so the tuned table stays symmetric. Five in a row keeps MIN_EVAL and
+# MAX_EVAL, and positions with five in a row are not used.
+#
+# Features are kept as a sparse matrix (most patterns are in few lines) and
+# can be cached to a file. Evaluations and gradients of all positions are then
+# one bincount each per iteration.
+#
+# Usage:
+#
+#   python EvaluationTuner.py games.jsonl weights.json --cache features.npz
+#
+#   GameEvaluator(json.load(open("weights.json")))
+#
+"""
+
+import StrideDimensions.StrideDimensions as sd
+import GamePlayer.ArchiveAnnotator as aa
+import GamePlayer.FiveInARow as fiar
+import argparse
+import json
+import os
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+RESULT_VALUES = {fiar.X_TOKEN: 1.0, fiar.O_TOKEN: 0.0, fiar.NO_TOKEN: 0.5}
+
+X_FIVE = fiar.X_TOKEN * 5
+O_FIVE = fiar.O_TOKEN * 5
+MIRROR = str.maketrans({fiar.X_TOKEN: fiar.O_TOKEN, fiar.O_TOKEN: fiar.X_TOKEN})
+
+
+# Yields (board, result value) for the positions of the games in the archive.
+# Boards are copies. Games without a result are skipped.
+def readPositions(archivePath, skipOpeningMoves):
+    game = fiar.FiveInARow()
+    for gameNumber, archivedGame in aa.readArchive(archivePath):
+        if archivedGame.get(aa.KEY_RESULT) not in RESULT_VALUES:
+            continue
+        result = RESULT_VALUES[archivedGame[aa.KEY_RESULT]]
+        game.resetGame()
+        for moveNumber, move in enumerate(archivedGame[aa.KEY_MOVES]):
+            if not game.makeMove(move, game.whoHas):
+                break
+            if moveNumber + 1 >= skipOpeningMoves:
+                board = sd.StrideDimension(game.board.dimensions)
+                board.setUpWithData(game.board.getDataForSave())
+                yield board, result
+
+
+####### CLASS SPARSE FEATURES #########
+class SparseFeatures:
+    """
+    Feature matrix as (row, column, value) of its non zero elements.
+    """
+
+    def __init__(self, rows, columns, values, numberOfRows, numberOfColumns):
+        self.rows = rows
+        self.columns = columns
+        self.values = values
+        self.numberOfRows = numberOfRows
+        self.numberOfColumns = numberOfColumns
+
+    # Matrix times "vector" (one value per column).
+    def dot(self, vector):
+        return np.bincount(self.rows, weights=self.values * vector[self.columns], minlength=self.numberOfRows)
+
+    # Transposed matrix times "vector" (one value per row).
+    def transposeDot(self, vector):
+        return np.bincount(self.columns, weights=self.values * vector[self.rows], minlength=self.numberOfColumns)
+
+    def save(self, path, results):
+        np.savez(path, rows=self.rows, columns=self.columns, values=self.values, results=results,
+                 shape=np.array([self.numberOfRows, self.numberOfColumns]))
+####### END CLASS SPARSE FEATURES #########
+
+
+# Returns (SparseFeatures, results) as saved by SparseFeatures.save.
+def loadFeatures(path):
+    data = np.load(path)
+    numberOfRows, numberOfColumns = data['shape']
+    features = SparseFeatures(data['rows'], data['columns'], data['values'], int(numberOfRows), int(numberOfColumns))
+    return features, data['results']
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+####### CLASS EVALUATION TUNER #########
+class EvaluationTuner:
+    """
+    Fits GameEvaluator pattern weights to game results.
+    """
+
+    # The first moves of a game say little about its result.
+    SKIP_OPENING_MOVES = 6
+
+    # Positions are turned into features this many at a time.
+    BATCH_SIZE = 1000
+
+    ITERATIONS = 2000
+    # Step size in evaluation units. Adam is used, so steps are about this size whatever the gradient.
+    LEARNING_RATE = 0.5
+
+    # Candidate scales, sigmoid(scale * evaluation), for "fitScale".
+    SCALES = [0.001 * 1.2 ** i for i in range(40)]
+
+    def __init__(self, evaluations=None):
+        if np is None:
+            raise Exception("EvaluationTuner needs NumPy!")
+        self.evaluator = fiar.GameEvaluator(evaluations)
+        self.patterns = list(self.evaluator.evaluations)
+        self.__setUpParameters()
+        self.scale = None
+
+    # Returns (SparseFeatures with one column per parameter, results). Read from "cachePath" if it exists,
+    # else extracted from the archive and saved there.
+    def extractFeatures(self, archivePath, cachePath=None):
+        if cachePath is not None and os.path.exists(cachePath):
+            return loadFeatures(cachePath)
+
+        rows = []
+        columns = []
+        values = []
+        results = []
+        boards = []
+        boardResults = []
+        numberOfRows = 0
+        for board, result in readPositions(archivePath, self.SKIP_OPENING_MOVES):
+            boards.append(board)
+            boardResults.append(result)
+            if len(boards) == self.BATCH_SIZE:
+                numberOfRows = self.__addBatch(boards, boardResults, numberOfRows, rows, columns, values, results)
+                boards = []
+                boardResults = []
+        numberOfRows = self.__addBatch(boards, boardResults, numberOfRows, rows, columns, values, results)
+
+        features = SparseFeatures(np.concatenate(rows + [np.zeros(0, dtype=np.int64)]),
+                                  np.concatenate(columns + [np.zeros(0, dtype=np.int64)]),
+                                  np.concatenate(values + [np.zeros(0, dtype=np.float64)]),
+                                  numberOfRows, len(self.parameterPatterns))
+        results = np.array(results, dtype=np.float64)
+        if cachePath is not None:
+            features.save(cachePath, results)
+        return features, results
+
+    # Returns the parameters of the current weights.
+    def getParameters(self):
+        return np.array([self.evaluator.evaluations[pattern] for pattern in self.parameterPatterns], dtype=np.float64)
+
+    # Picks the scale that best predicts the results with "parameters" (default: current weights).
+    def fitScale(self, features, results, parameters=None):
+        if parameters is None:
+            parameters = self.getParameters()
+        evaluations = features.dot(parameters)
+        errors = [np.mean((results - sigmoid(scale * evaluations)) ** 2) for scale in self.SCALES]
+        self.scale = self.SCALES[int(np.argmin(errors))]
+        return self.scale
+
+    # Returns the mean squared error of "parameters".
+    def getError(self, features, results, parameters):
+        return float(np.mean((results - sigmoid(self.scale * features.dot(parameters))) ** 2))
+
+    # Gradient descent (Adam) on the mean squared error. Returns the tuned weights, see "getWeights".
+    def tune(self, features, results, progress_callback=None):
+        if self.scale is None:
+            self.fitScale(features, results)
+        parameters = self.getParameters()
+        firstMoment = np.zeros_like(parameters)
+        secondMoment = np.zeros_like(parameters)
+        numberOfPositions = max(len(results), 1)
+        for iteration in range(1, self.ITERATIONS + 1):
+            predictions = sigmoid(self.scale * features.dot(parameters))
+            residuals = (predictions - results) * predictions * (1.0 - predictions) * self.scale
+            gradient = 2.0 * features.transposeDot(residuals) / numberOfPositions
+
+            firstMoment = 0.9 * firstMoment + 0.1 * gradient
+            secondMoment = 0.999 * secondMoment + 0.001 * gradient * gradient
+            step = (firstMoment / (1 - 0.9 ** iteration)) / (np.sqrt(secondMoment / (1 - 0.999 ** iteration)) + 1e-12)
+            parameters -= self.LEARNING_RATE * step
+
+            if progress_callback is not None and iteration % 100 == 0:
+                progress_callback(iteration, self.getError(features, results, parameters))
+        return self.getWeights(parameters)
+
+    # Returns the full weight table for "parameters", as GameEvaluator.evaluations.
+    def getWeights(self, parameters):
+        weights = dict(self.evaluator.evaluations)
+        for parameter, pattern in enumerate(self.parameterPatterns):
+            weights[pattern] = int(round(parameters[parameter]))
+            mirror = self.__mirror(pattern)
+            if mirror in weights and not mirror == pattern:
+                weights[mirror] = -weights[pattern]
+        return weights
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # One parameter per pattern, shared with its mirror. Five in a row is not tuned.
+    def __setUpParameters(self):
+        self.parameterPatterns = []
+        self.parameterOfPattern = np.full(len(self.patterns), -1, dtype=np.int64)
+        self.signOfPattern = np.zeros(len(self.patterns), dtype=np.float64)
+        parameterOf = {}
+        for patternNumber, pattern in enumerate(self.patterns):
+            if pattern in (X_FIVE, O_FIVE):
+                continue
+            mirror = self.__mirror(pattern)
+            if mirror in parameterOf:
+                self.parameterOfPattern[patternNumber] = parameterOf[mirror]
+                self.signOfPattern[patternNumber] = -1.0
+            else:
+                parameterOf[pattern] = len(self.parameterPatterns)
+                self.parameterPatterns.append(pattern)
+                self.parameterOfPattern[patternNumber] = parameterOf[pattern]
+                self.signOfPattern[patternNumber] = 1.0
+        self.fivePatterns = [self.patterns.index(p) for p in (X_FIVE, O_FIVE) if p in self.patterns]
+
+    def __mirror(self, pattern):
+        return pattern.translate(MIRROR)
+
+    # Adds the non zero features of "boards" to the lists, and their results. Returns number of rows after.
+    def __addBatch(self, boards, boardResults, numberOfRows, rows, columns, values, results):
+        if len(boards) == 0:
+            return numberOfRows
+        counts = self.evaluator.pattern_counts_batch(boards)
+
+        # Positions with five in a row are decided. They are not used.
+        undecided = counts[:, self.fivePatterns].sum(axis=1) == 0
+        counts = counts[undecided]
+        results += [result for result, keep in zip(boardResults, undecided) if keep]
+
+        batchRows, patternNumbers = np.nonzero(counts)
+        parameters = self.parameterOfPattern[patternNumbers]
+        tuned = parameters >= 0
+        rows.append(batchRows[tuned] + numberOfRows)
+        columns.append(parameters[tuned])
+        values.append(counts[batchRows, patternNumbers][tuned] * self.signOfPattern[patternNumbers][tuned])
+        return numberOfRows + len(counts)
+####### END CLASS EVALUATION TUNER #########
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tunes the pattern weights of GameEvaluator to game results.")
+    parser.add_argument("archive", help="Games, one JSON object per line, with result")
+    parser.add_argument("output", help="Tuned weights are written here as JSON")
+    parser.add_argument("--cache", help="Features are cached in this .npz file")
+    parser.add_argument("--iterations", type=int, help="Default " + str(EvaluationTuner.ITERATIONS))
+    arguments = parser.parse_args()
+
+    tuner = EvaluationTuner()
+    if arguments.iterations is not None:
+        tuner.ITERATIONS = arguments.iterations
+    features, results = tuner.extractFeatures(arguments.archive, arguments.cache)
+    print("Positions:", len(results), "Scale:", tuner.fitScale(features, results))
+    print("Error before:", tuner.getError(features, results, tuner.getParameters()))
+    weights = tuner.tune(features, results, lambda iteration, error: print("Iteration", iteration, "error", error))
+    with open(arguments.output, 'w') as outputFile:
+        json.dump(weights, outputFile, indent=4)
+    print("Weights written to", arguments.output)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+"""
+# EventDispatcher delivers game events to listeners without letting the
+#  listeners slow down the game.
+#
+# Posting an event only puts it on the queue of each listener. Every listener
+# has a delivery thread of its own that calls the callbacks. Callbacks bound to
+# the same object share one queue and thread, so an object gets its events in
+# the order they happened.
+#
+# A queue is bounded. When it is full the backpressure policy of the listener
+# decides what happens:
+#   BACKPRESSURE_DROP       The new event is dropped.
+#   BACKPRESSURE_COALESCE   The oldest waiting event for the same callback is
+#                           removed, so only the latest is delivered. If no
+#                           event for the callback waits, the new one is dropped.
+#   BACKPRESSURE_BLOCK      The poster waits until there is room.
+#
+"""
+
+import collections
+import threading
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+BACKPRESSURE_DROP = "backpressureDrop"
+BACKPRESSURE_COALESCE = "backpressureCoalesce"
+BACKPRESSURE_BLOCK = "backpressureBlock"
+
+# Keys in the dictionaries from "getListenerMetrics".
+KEY_LISTENER = "keyListener"
+KEY_DELIVERED = "keyDelivered"
+KEY_DROPPED = "keyDropped"
+KEY_COALESCED = "keyCoalesced"
+KEY_QUEUED = "keyQueued"
+KEY_TOTAL_TIME = "keyTotalTime"
+KEY_MAX_TIME = "keyMaxTime"
+
+
+####### CLASS LISTENER QUEUE #########
+class ListenerQueue:
+    """
+    Bounded queue and delivery thread for one listener.
+    """
+
+    def __init__(self, name, maxSize, backpressure):
+        self.name = name
+        self.maxSize = maxSize
+        self.backpressure = backpressure
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.busy = False
+
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.totalTime = 0.0
+        self.maxTime = 0.0
+
+        self.deliveryDaemon = threading.Thread(target=self.__deliver, daemon=True)
+        self.deliveryDaemon.start()
+
+    def put(self, callback, args):
+        with self.condition:
+            if len(self.pending) >= self.maxSize:
+                if self.backpressure == BACKPRESSURE_DROP:
+                    self.dropped += 1
+                    return
+                elif self.backpressure == BACKPRESSURE_COALESCE:
+                    if not self.__removeOldest(callback):
+                        self.dropped += 1
+                        return
+                    self.coalesced += 1
+                else:
+                    while len(self.pending) >= self.maxSize and not self.stopped:
+                        self.condition.wait()
+            self.pending.append((callback, args))
+            self.condition.notify_all()
+
+    # Waits until all queued events are delivered. Returns False on timeout.
+    def waitUntilDelivered(self, timeout=None):
+        endTime = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while len(self.pending) > 0 or self.busy:
+                remaining = None if endTime is None else endTime - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def getMetrics(self):
+        with self.condition:
+            return {KEY_LISTENER: self.name,
+                    KEY_DELIVERED: self.delivered,
+                    KEY_DROPPED: self.dropped,
+                    KEY_COALESCED: self.coalesced,
+                    KEY_QUEUED: len(self.pending),
+                    KEY_TOTAL_TIME: self.totalTime,
+                    KEY_MAX_TIME: self.maxTime}
+
+    # Returns False if no event for "callback" is waiting.
+    def __removeOldest(self, callback):
+        for i, (queuedCallback, args) in enumerate(self.pending):
+            if queuedCallback == callback:
+                del self.pending[i]
+                return True
+        return False
+
+    def __deliver(self):
+        while True:
+            with self.condition:
+                while len(self.pending) == 0 and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                callback, args = self.pending.popleft()
+                self.busy = True
+                self.condition.notify_all()
+
+            startTime = time.time()
+            try:
+                callback(*args)
+            except Exception as err:
+                print("*** CRASH *** in event listener", self.name, err)
+            usedTime = time.time() - startTime
+
+            with self.condition:
+                self.busy = False
+                self.delivered += 1
+                self.totalTime += usedTime
+                self.maxTime = max(self.maxTime, usedTime)
+                self.condition.notify_all()
+####### END CLASS LISTENER QUEUE #########
+
+
+####### CLASS EVENT DISPATCHER #########
+class EventDispatcher:
+    """
+    Keeps the listeners of each event and posts events to their queues.
+    """
+
+    MAX_QUEUE_SIZE = 100
+    BACKPRESSURE = BACKPRESSURE_COALESCE
+
+    def __init__(self):
+        self.listeners = {}  # Event -> list of (callback, ListenerQueue)
+        self.queues = {}  # id of listening object -> ListenerQueue
+        self.lock = threading.Lock()
+
+    # "backpressure" and "maxQueueSize" are used when the listening object gets its queue,
+    # i.e. for its first callback. None means the class defaults.
+    def addListener(self, event, callback, backpressure=None, maxQueueSize=None):
+        owner = getattr(callback, '__self__', callback)
+        with self.lock:
+            if id(owner) not in self.queues:
+                self.queues[id(owner)] = ListenerQueue(type(owner).__name__,
+                                                       maxQueueSize or self.MAX_QUEUE_SIZE,
+                                                       backpressure or self.BACKPRESSURE)
+            self.listeners.setdefault(event, []).append((callback, self.queues[id(owner)]))
+
+    # Constant cost per listener, whatever the listeners do with the event.
+    def post(self, event, *args):
+        for callback, listenerQueue in self.listeners.get(event, []):
+            listenerQueue.put(callback, args)
+
+    def waitUntilDelivered(self, timeout=None):
+        return all(listenerQueue.waitUntilDelivered(timeout) for listenerQueue in list(self.queues.values()))
+
+    def getListenerMetrics(self):
+        return [listenerQueue.getMetrics() for listenerQueue in list(self.queues.values())]
+
+    # Stops the queue of "owner", the object the callbacks are bound to. Its events are no longer posted.
+    def removeListener(self, owner):
+        with self.lock:
+            listenerQueue = self.queues.pop(id(owner), None)
+            if listenerQueue is None:
+                return
+            self.listeners = {event: [(callback, queue) for callback, queue in callbacks if queue is not listenerQueue]
+                              for event, callbacks in self.listeners.items()}
+        listenerQueue.stop()
+
+    # Stops all queues. Events posted after this are not delivered.
+    def stop(self):
+        with self.lock:
+            listenerQueues = list(self.queues.values())
+            self.listeners = {}
+            self.queues = {}
+        for listenerQueue in listenerQueues:
+            listenerQueue.stop()
+####### END CLASS EVENT DISPATCHER #########
@@ -20,11 +20,23 @@
 
 import MinMaxAlgorithm.MinMaxAlgorithm as mma
 import StrideDimensions.StrideDimensions as sd
+import GamePlayer.GameSearch as gs
+import GamePlayer.GameEngine as ge
+import GamePlayer.BoardSymmetry as bs
+import GamePlayer.EventDispatcher as ed
+import GamePlayer.AnalysisStore as ans
+import GamePlayer.AnalysisScheduler as asch
 import re
 import time
 import random
 import logging
 import threading
+import collections
+import operator
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Only needed by the batch methods of GameEvaluator.
 logging.basicConfig(level=logging.DEBUG, format='%(levelname)s=> %(message)s')
 
 __author__ = "Helge Modén, www.github.com/helgemod"
@@ -45,44 +57,65 @@ NO_TOKEN = '-'
 
 
 ####### CLASS FIVE IN A ROW #########
-class FiveInARow:
+class FiveInARow(ge.GameEngine):
 
     START_WITH_NO_OF_COLUMNS = 5
     START_WITH_NO_OF_ROWS = 5
     DYNAMIC_BOARD = True
+    SEARCH_DEPTH = 4
+
+    # As GameEvaluator.
+    MIN_EVAL = -1000
+    MAX_EVAL = 1000
+
+    # Any algorithm of mma or GameSearch, e.g. gs.PVS_ASPIRATION_ALGO.
+    SEARCH_ALGO = mma.MINMAXALPHABETAPRUNING_ALGO
+
+    # Selective search (see GameEngine.enableSelectiveSearch), for use with gs.PVS_ASPIRATION_ALGO.
+    # While it is on, getMoves returns up to SELECTIVE_CANDIDATE_MOVES within SELECTIVE_MOVE_MARGIN
+    # of the best, instead of the hard cut of GameEvaluator. The reductions and the pruning decide
+    # how deep each of them is searched.
+    LATE_MOVE_REDUCTION_FROM = 2
+    FUTILITY_MARGINS = {1: 20, 2: 60}
+    SELECTIVE_CANDIDATE_MOVES = 6
+    SELECTIVE_MOVE_MARGIN = 25
 
     # Events happening in this game, that can be listened to by other objects.
     # Apply for listening by calling "apply_for_event".
     # Typically used by game analyzers.
+    # Listeners are called from delivery threads of their own, see EventDispatcher.
+    #   EVENT_MOVE_MADE:            callback(coordinates, token)
+    #   EVENT_BOARD_SIZE_CHANGE:    callback(dimension, numberOfExtends, atLowEnd), as to extendDimension
+    #   EVENT_GAME_RESET:           callback()
     EVENT_MOVE_MADE = 0
     EVENT_BOARD_SIZE_CHANGE = 1
-
-    KEY_EVENT_CALLBACK = "keyEventCallback"
+    EVENT_GAME_RESET = 2
 
     def __init__(self):
-        self.whoHas = X_TOKEN
-        self.playersToken = X_TOKEN
-        self.board = sd.StrideDimension((self.START_WITH_NO_OF_COLUMNS, self.START_WITH_NO_OF_ROWS))
+        # Winners and (potential) winning moves of the board, updated on every move. See "rehash".
+        self.threatTracker = ThreatTracker()
+        super().__init__((self.START_WITH_NO_OF_COLUMNS, self.START_WITH_NO_OF_ROWS))
         self.analyzeBoard = sd.StrideDimension((6, 6))
-        self.board.fillData(NO_TOKEN)
         self.analyzeBoard.fillData(NO_TOKEN)
-        self.computerAlgo = mma.GameAlgo(self.evalBoard,
-                                           self.moveX, self.moveO,
-                                           self.undoMove, self.undoMove,
-                                           self.getPossibleMovesMaximizer, self.getPossibleMovesMinimizer,
-                                           GameEvaluator.MIN_EVAL, GameEvaluator.MAX_EVAL)
-
 
         self.board_scanner = BoardScanner()
         self.game_evaluator = GameEvaluator()
 
-        # List to hold objects that are "listening" for events happening in this game.
-        self.eventList = [None, None]
-        self.eventList[self.EVENT_MOVE_MADE] = []
-        self.eventList[self.EVENT_BOARD_SIZE_CHANGE] = []
+        # Evaluates positions instead of "game_evaluator" if set, e.g. a LearnedEvaluator.
+        # Moves are still generated by "game_evaluator".
+        self.positionEvaluator = None
+
+        # Holds objects that are "listening" for events happening in this game.
+        self.eventDispatcher = ed.EventDispatcher()
 
         self.analyzeDaemon = None
 
+        # Set by "enablePondering". Searches the predicted reply while opponent thinks.
+        self.ponderer = None
+
+        # Set to an AnalysisStore to look up positions before searching them, and store the results.
+        self.analysisStore = None
+
     ########################################
     #
     #           Game interface
@@ -97,34 +130,21 @@ class FiveInARow:
 
     # Makes an actual move and do all administrations. Return True if move could be made. Else False.
     def makeMove(self, coordinates, token):
-        try:
-            self.__checkMove(coordinates, token)
-        except Exception as err:
-            print(str(err))
+        if not super().makeMove(coordinates, token):
             return False
-        self.board.setData(coordinates, token)
-        self.__invertWhoHas()
 
         # If some analyze object is interested in that a move is made in the "main game".
-        try:
-            for dict in self.eventList[self.EVENT_MOVE_MADE]:
-                move_made_callback = dict[self.KEY_EVENT_CALLBACK]
-                move_made_callback(coordinates, token)
-        except Exception as err:
-            print("*** CRASH *** in eventList for move made", err)
-            pass
+        self.eventDispatcher.post(self.EVENT_MOVE_MADE, coordinates, token)
 
+        lowEndExtends = (0, 0)
         if self.DYNAMIC_BOARD:
-            self.__extendBoardIfCloseToEdge()
-            try:
-                for dict in self.eventList[self.EVENT_BOARD_SIZE_CHANGE]:
-                    board_resize_callback = dict[self.KEY_EVENT_CALLBACK]
-                    board_resize_callback()
-            except Exception as err:
-                print("*** CRASH *** in eventList for resize board", err)
-                pass
+            lowEndExtends = self.__extendBoardIfCloseToEdge()
+
+        if self.ponderer is not None:
+            self.ponderer.moveMade(coordinates, token, lowEndExtends)
         return True
 
+    # Returns (coordinates, token). Coordinates are None if the search finds no move, e.g. when the game is over.
     def getComputersMoveForCurrentPosition(self):
         # Special case
         # 1) Is it the first move?
@@ -135,11 +155,45 @@ class FiveInARow:
         if ocoord is not None:
             return (ocoord, self.whoHas)
 
+        if self.ponderer is not None or self.analysisStore is not None:
+            return self.__getMoveUsingStoredAnalysis()
+
         #move = self.computerAlgo.calculateMove(mma.MINMAX_ALGO, self.whoHas == X_TOKEN, 4)
-        move = self.computerAlgo.calculateMove(mma.MINMAXALPHABETAPRUNING_ALGO, self.whoHas == X_TOKEN, 4)
+        move = self.searchCurrentPosition()[mma.KEY_BESTMOVE]
         #move = self.computerAlgo.calculateMove(mma.MINMAX_ALGO_WITH_LOGGING, self.whoHas == X_TOKEN, 4)
         if move is None:
             print("\n\n**********MOVE IS NONE*********\n\n")
+            return (None, self.whoHas)
+        return (self.board.dimCoordinateForIndex(move), self.whoHas)
+
+    # As "getComputersMoveForCurrentPosition", but first asks the ponderer and the analysis store.
+    def __getMoveUsingStoredAnalysis(self):
+        positionKey, transform = self.getCanonicalPositionKey()
+        symmetry = bs.getBoardSymmetry(self.board.dimensions)
+
+        if self.ponderer is not None:
+            # Answer instantly if this position was pondered (or searched before).
+            move = self.ponderer.getPonderedMove(positionKey, transform)
+            if move is not None:
+                return (self.board.dimCoordinateForIndex(move), self.whoHas)
+
+        if self.analysisStore is not None:
+            entry = self.analysisStore.lookup(positionKey)
+            if entry is not None and entry[ans.KEY_DEPTH] >= self.SEARCH_DEPTH and entry[ans.KEY_BOUND] == ans.BOUND_EXACT:
+                move = symmetry.fromCanonicalIndex(entry[ans.KEY_BEST_MOVE], transform)
+                return (self.board.dimCoordinateForIndex(move), self.whoHas)
+
+        moveDict = self.searchCurrentPosition()
+        move = moveDict[mma.KEY_BESTMOVE]
+        if move is None:
+            print("\n\n**********MOVE IS NONE*********\n\n")
+            return (None, self.whoHas)
+
+        if self.ponderer is not None:
+            self.ponderer.storeResult(positionKey, transform, moveDict)
+        if self.analysisStore is not None:
+            self.analysisStore.store(positionKey, symmetry.toCanonicalIndex(move, transform),
+                                     moveDict.get(gs.KEY_DEPTH, self.SEARCH_DEPTH), moveDict[mma.KEY_EVAL])
         return (self.board.dimCoordinateForIndex(move), self.whoHas)
 
     def getWinnerOfCurrentPosition(self):
@@ -152,46 +206,85 @@ class FiveInARow:
             return X_TOKEN
         elif currentEvaluation <= GameEvaluator.MIN_EVAL+200:
             return O_TOKEN
-        elif self.__isBoardFull():
+        elif self.isBoardFull():
             return NO_TOKEN
         return None
 
     def resetGame(self):
-        self.whoHas = X_TOKEN
-        self.board = sd.StrideDimension((self.START_WITH_NO_OF_COLUMNS, self.START_WITH_NO_OF_ROWS))
-        self.board.fillData(NO_TOKEN)
+        super().resetGame()
         self.analyzeBoard = sd.StrideDimension((6, 6))
         self.analyzeBoard.fillData(NO_TOKEN)
-
-    def getNumberOfColumns(self):
-        return self.board.dimensions[0]
-
-    def getNumberOfRows(self):
-        return self.board.dimensions[1]
+        if self.ponderer is not None:
+            self.ponderer.cancel()
+            self.ponderer.principalVariation = []
+        self.eventDispatcher.post(self.EVENT_GAME_RESET)
+
+    # As "getPositionKey", but rotated and reflected positions get the same key.
+    # Returns (key, transform). Moves in a stored position are mapped back with
+    # bs.getBoardSymmetry(dimensions).fromCanonicalIndex(move, transform).
+    def getCanonicalPositionKey(self):
+        return bs.canonicalPositionKey(self.board, self.whoHas)
+
+    # As many candidates as asked for, not only the few the search looks at.
+    def getRootMoves(self, numberOfMoves):
+        return self.game_evaluator.getMoves(self.whoHas == X_TOKEN, self.board, self.moveX, self.moveO, self.undoMove,
+                                            self.threatTracker, max(numberOfMoves, self.game_evaluator.MAX_CANDIDATE_MOVES))
+
+    # Forced when a win or a block is the only move, critical with open threes on board.
+    def getThreatStatus(self):
+        threats = self.threatTracker.getThreats()
+        if len(threats[BoardScanner.KEY_LIST_OF_WINNING_MOVES_FOR_X]) > 0 or len(threats[BoardScanner.KEY_LIST_OF_WINNING_MOVES_FOR_O]) > 0:
+            return self.THREAT_FORCED
+        if len(threats[BoardScanner.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_X]) > 0 or len(threats[BoardScanner.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_O]) > 0:
+            return self.THREAT_CRITICAL
+        return self.THREAT_NONE
+
+    # Anything with "evaluate(board)" as GameEvaluator, or None for "game_evaluator".
+    def setPositionEvaluator(self, evaluator):
+        self.positionEvaluator = evaluator
+        self.evalCache.clear()
+        if self.ponderer is not None:
+            self.ponderer.setPositionEvaluator(evaluator)
+
+    # Let the engine think on the opponents time. See class Ponderer.
+    def enablePondering(self):
+        if self.ponderer is None:
+            self.ponderer = Ponderer(self)
+
+    # Stops the threads of the game: the listener queues and a ponder search. Call when the game is done with.
+    def close(self):
+        if self.ponderer is not None:
+            self.ponderer.close()
+        self.eventDispatcher.stop()
 
     ###############################################
     #
     # Callback Interfaces for different algorithms
     #
     ###############################################
-    # Callback functions used by computer algorithm
-    def evalBoard(self):
+    # Callback functions used by computer algorithm. Moves are made by the engine.
+    # Called by the engine's evalBoard, which caches the result.
+    def evaluatePosition(self):
+        if self.positionEvaluator is not None:
+            return self.positionEvaluator.evaluate(self.board)
         return self.game_evaluator.evaluate(self.board)
 
-    def moveX(self, move):
-        self.board.setDataAtIndex(move, X_TOKEN)
+    def getPossibleMovesMaximizer(self):
+        return self.__getPossibleMoves(True)
 
-    def moveO(self, move):
-        self.board.setDataAtIndex(move, O_TOKEN)
+    def getPossibleMovesMinimizer(self):
+        return self.__getPossibleMoves(False)
 
-    def undoMove(self, move):
-        self.board.setDataAtIndex(move, NO_TOKEN)
+    def onTokenPlaced(self, index, token):
+        self.threatTracker.update(self.board, index)
 
-    def getPossibleMovesMaximizer(self):
-        return self.game_evaluator.getMoves(True, self.board, self.moveX, self.moveO, self.undoMove)
+    def onTokenRemoved(self, index, token):
+        self.threatTracker.update(self.board, index)
 
-    def getPossibleMovesMinimizer(self):
-        return self.game_evaluator.getMoves(False, self.board, self.moveX, self.moveO, self.undoMove)
+    # The threats are found again whenever the engine hashes from scratch (new, resized or set up board).
+    def rehash(self):
+        super().rehash()
+        self.threatTracker.rebuild(self.board)
 
 
 
@@ -201,31 +294,14 @@ class FiveInARow:
     #                   Private help methods
     #
     ################################################################
-
-    def __invertWhoHas(self):
-        if self.whoHas == X_TOKEN:
-            self.whoHas = O_TOKEN
-        else:
-            self.whoHas = X_TOKEN
-
-    # Checks if the "token" is ok to place at "coordinate". Raises exception if not!
-    def __checkMove(self, coordinate, token):
-        if token not in (X_TOKEN, O_TOKEN):
-            raise Exception("Only \'X\' or \'O\' is allowed as token!")
-
-        if not self.whoHas == token:
-            raise Exception("Wrong players move")
-        try:
-            x = int(coordinate[0])
-            y = int(coordinate[1])
-        except:
-            raise Exception("Give tuple of integer as move! E.g. (1,1)")
-
-        if x < 1 or x > self.board.dimensions[0] or y < 1 or y > self.board.dimensions[1]:
-            raise Exception("!!!! Coords out of range !!!")
-
-        if not self.__isFree((x, y)):
-            raise Exception("!!! OCCUPIED SQUARE !!!")
+    # Moves for the search. Wider while selective search is on, unless SEARCH_ALGO was changed
+    # afterwards to one without the reductions and the pruning.
+    def __getPossibleMoves(self, regardingMaximizer):
+        if self.isSelectiveSearch() and self.SEARCH_ALGO == gs.PVS_ASPIRATION_ALGO:
+            return self.game_evaluator.getMoves(regardingMaximizer, self.board, self.moveX, self.moveO, self.undoMove,
+                                                self.threatTracker, self.SELECTIVE_CANDIDATE_MOVES, self.SELECTIVE_MOVE_MARGIN)
+        return self.game_evaluator.getMoves(regardingMaximizer, self.board, self.moveX, self.moveO, self.undoMove,
+                                            self.threatTracker)
 
     # Takes a list and returns X if all elements are X. Return o if all elements are O. Else return None.
     def __checkIfAllArePlayerTokens(self, ll):
@@ -237,19 +313,12 @@ class FiveInARow:
             return O_TOKEN
         return None
 
-    def __isBoardFull(self):
-        if NO_TOKEN in self.board.getAllData():
-            return False
-        return True
-
-    def __isFree(self, coordinate):
-        return self.board.getData(coordinate)==NO_TOKEN
-
     def __isBoardEmpty(self):
         return all(x == NO_TOKEN or x is None for x in self.board.getAllData())
 
     def __isFirstMoveForO(self):
-        if self.board.getAllData().count(X_TOKEN) == 1:
+        allBoardData = self.board.getAllData()
+        if allBoardData.count(X_TOKEN) == 1 and allBoardData.count(O_TOKEN) == 0:
             xind = self.board.getIndexAtFirstOccurrenceOfData(X_TOKEN)
             xcoord = self.board.dimCoordinateForIndex(xind)
             ocoord = [1, 1]
@@ -268,20 +337,31 @@ class FiveInARow:
     #
     # If it is a long game, the board may be extended during the game.
     #
+    # Returns (columns added to the left, rows added at the bottom), i.e. how much
+    # the coordinates of tokens already on board were shifted.
     ################################################################
     def __extendBoardIfCloseToEdge(self):
+        columnsAddedLeft = 0
+        rowsAddedLow = 0
         extends = self.__numberOfExtendsNeededToEdgeLow()
         if extends > 0:
-            self.board.extendDimension(2, 1, True, NO_TOKEN)
+            self.__extendBoard(2, 1, True)
+            rowsAddedLow = 1
         extends = self.__numberOfExtendsNeededToEdgeHigh()
         if extends > 0:
-            self.board.extendDimension(2, 1, False, NO_TOKEN)
+            self.__extendBoard(2, 1, False)
         extends = self.__numberOfExtendsNeededToEdgeLeft()
         if extends > 0:
-            self.board.extendDimension(1, 1, True, NO_TOKEN)
+            self.__extendBoard(1, 1, True)
+            columnsAddedLeft = 1
         extends = self.__numberOfExtendsNeededToEdgeRight()
         if extends > 0:
-            self.board.extendDimension(1, 1, False, NO_TOKEN)
+            self.__extendBoard(1, 1, False)
+        return (columnsAddedLeft, rowsAddedLow)
+
+    def __extendBoard(self, dimension, numberOfExtends, atLowEnd):
+        self.resizeBoard(dimension, numberOfExtends, atLowEnd)
+        self.eventDispatcher.post(self.EVENT_BOARD_SIZE_CHANGE, dimension, numberOfExtends, atLowEnd)
 
     def __numberOfExtendsNeededToEdgeLow(self):
         extendsNeeded = 0
@@ -336,12 +416,22 @@ class FiveInARow:
     #           it will be interested when certain events is
     #           happening in the main game. Here can external
     #           objects apply to be alerted for the events
+    #
+    #           "backpressure" is one of ed.BACKPRESSURE_DROP, ed.BACKPRESSURE_COALESCE
+    #           or ed.BACKPRESSURE_BLOCK and tells what to do when the listener
+    #           can not keep up. None gives the dispatchers default.
     ################################################################
-    def apply_for_event(self, event, appliers_callback):
-        if event == self.EVENT_MOVE_MADE:
-            self.eventList[self.EVENT_MOVE_MADE].append({self.KEY_EVENT_CALLBACK: appliers_callback})
-        elif event == self.EVENT_BOARD_SIZE_CHANGE:
-            self.eventList[self.EVENT_BOARD_SIZE_CHANGE].append({self.KEY_EVENT_CALLBACK: appliers_callback})
+    def apply_for_event(self, event, appliers_callback, backpressure=None):
+        if event in (self.EVENT_MOVE_MADE, self.EVENT_BOARD_SIZE_CHANGE, self.EVENT_GAME_RESET):
+            self.eventDispatcher.addListener(event, appliers_callback, backpressure)
+
+    # The callbacks of "applier" (the object they are bound to) are no longer called.
+    def withdraw_from_events(self, applier):
+        self.eventDispatcher.removeListener(applier)
+
+    # Timing and queue figures per listener. See EventDispatcher.getListenerMetrics.
+    def getListenerMetrics(self):
+        return self.eventDispatcher.getListenerMetrics()
 
     def tbd(self, d):
         if BoardScanner.KEY_BOARD_SCANNER_COLUMN in d:
@@ -422,12 +512,44 @@ class GameEvaluator:
         'OOOOO': MIN_EVAL,
     }
 
-    def __init__(self):
+    # Codes for the tokens when boards are packed into NumPy arrays.
+    # OUTSIDE_CODE pads the lines and never matches a pattern.
+    TOKEN_CODES = {NO_TOKEN: 0, X_TOKEN: 1, O_TOKEN: 2}
+    OUTSIDE_CODE = 3
+
+    # Pruning in "getMoves". While scanning, a move is kept if it is within MOVE_MARGIN
+    # of the best so far. Of those, at most MAX_CANDIDATE_MOVES of the best are returned,
+    # if within BEST_MOVE_MARGIN of the best.
+    MOVE_MARGIN = 10
+    BEST_MOVE_MARGIN = 15
+    MAX_CANDIDATE_MOVES = 3
+
+    # "evaluations" replaces the pattern weights of the class, e.g. to compare engine versions.
+    def __init__(self, evaluations=None):
+        if evaluations is not None:
+            self.evaluations = dict(evaluations)
         self.board_scanner = BoardScanner()
 
+        # A move can only change patterns that cover its cell. No pattern reaches further
+        # than this many cells from the move, in each direction.
+        self.window = max(len(pattern) for pattern in self.evaluations) - 1
+        # Lookahead finds overlapping occurrences too.
+        self.occurrenceRegex = {pattern: re.compile('(?=' + re.escape(pattern) + ')') for pattern in self.evaluations}
+        # (compiled pattern, value) for "evaluateRange". Patterns are searched as "evaluateList" does.
+        self.patternRegex = [(re.compile(pattern), value) for pattern, value in self.evaluations.items()]
+
     def evaluate(self, boardToEvaluate):
-        evalFunc = lambda d: self.evaluateList(d[BoardScanner.KEY_BOARD_LIST_DATA])
-        return self.board_scanner.scanBoardForEvaluation(boardToEvaluate, evalFunc)
+        return self.board_scanner.scanLines(boardToEvaluate, self.evaluateRange)
+
+    # As "evaluateList" for lineBuffer[start:end], without making that string. See BoardScanner.scanLines.
+    def evaluateRange(self, lineBuffer, start, end):
+        if lineBuffer.count(NO_TOKEN, start, end) == end - start:
+            return 0  # Empty line (or no line at all).
+        addVal = 0
+        for regex, value in self.patternRegex:
+            if regex.search(lineBuffer, start, end) is not None:
+                addVal += value
+        return addVal
 
     def evaluateList(self, dataList):
         if len(dataList) == 0:
@@ -442,6 +564,81 @@ class GameEvaluator:
                 addVal += self.evaluations[pattern]
         return addVal
 
+    ################################################################
+    #
+    #       Batch evaluation of many boards with NumPy.
+    #       Gives exactly the same values as "evaluate".
+    #
+    ################################################################
+    def evaluate_batch(self, boards):
+        if np is None:
+            return [self.evaluate(board) for board in boards]
+        weights = np.array(list(self.evaluations.values()), dtype=np.int64)
+        return [int(value) for value in self.pattern_counts_batch(boards) @ weights]
+
+    # Returns an int array of shape (number of boards, number of patterns). Element [b, p] is the
+    # number of lines (columns, rows, diagonals) of board b where pattern p is found, with patterns
+    # in the order of "evaluations". "evaluate" is the sum of these counts times the weights.
+    def pattern_counts_batch(self, boards):
+        counts = np.zeros((len(boards), len(self.evaluations)), dtype=np.int64)
+
+        # Boards of the same size are packed and counted together.
+        groups = {}
+        for i, board in enumerate(boards):
+            groups.setdefault(tuple(board.dimensions), []).append(i)
+        for dimensions, indices in groups.items():
+            packed = self.__packBoards([boards[i] for i in indices], dimensions)
+            counts[indices] = self.__countPatternsInPacked(packed)
+        return counts
+
+    # Returns int8 array of shape (boards, rows, columns).
+    def __packBoards(self, boards, dimensions):
+        lookup = np.full(256, self.OUTSIDE_CODE, dtype=np.int8)
+        for token, code in self.TOKEN_CODES.items():
+            lookup[ord(token)] = code
+        data = ''.join(''.join(board.getAllData()) for board in boards).encode('ascii')
+        return lookup[np.frombuffer(data, dtype=np.uint8)].reshape((len(boards), dimensions[1], dimensions[0]))
+
+    def __countPatternsInPacked(self, packed):
+        numberOfBoards, numberOfRows, numberOfCols = packed.shape
+
+        # Every direction is turned into an array where each line runs along axis 1.
+        # Diagonals are sheared so that they become columns, padded with OUTSIDE_CODE.
+        y = np.arange(numberOfRows)[:, None]
+        x = np.arange(numberOfCols)[None, :]
+        diagonalUp = np.full((numberOfBoards, numberOfRows, numberOfCols + numberOfRows - 1), self.OUTSIDE_CODE, dtype=np.int8)
+        diagonalUp[:, y, x + (numberOfRows - 1 - y)] = packed
+        diagonalDown = np.full((numberOfBoards, numberOfRows, numberOfCols + numberOfRows - 1), self.OUTSIDE_CODE, dtype=np.int8)
+        diagonalDown[:, numberOfRows - 1 - y, x + y] = packed  # Read from top left, as BoardScanner does.
+        directions = [packed, packed.transpose(0, 2, 1), diagonalUp, diagonalDown]
+
+        # Each window of cells is coded as a number in base 4, one code array per pattern length.
+        # A pattern is found in a line if any window code along the line equals the pattern code.
+        counts = np.zeros((numberOfBoards, len(self.evaluations)), dtype=np.int64)
+        windowCodes = {}
+        for patternNumber, pattern in enumerate(self.evaluations):
+            if any(c not in self.TOKEN_CODES for c in pattern):
+                continue  # Can never be found on a board.
+            patternCode = 0
+            for c in pattern:
+                patternCode = patternCode * 4 + self.TOKEN_CODES[c]
+            if len(pattern) not in windowCodes:
+                windowCodes[len(pattern)] = [self.__windowCodes(lines, len(pattern)) for lines in directions]
+            for codes in windowCodes[len(pattern)]:
+                if codes is not None:
+                    counts[:, patternNumber] += (codes == patternCode).any(axis=1).sum(axis=1)
+        return counts
+
+    # Returns the base 4 code of every window of "length" cells along axis 1, or None if lines are shorter.
+    def __windowCodes(self, lines, length):
+        numberOfWindows = lines.shape[1] - length + 1
+        if numberOfWindows <= 0:
+            return None
+        codes = np.zeros((lines.shape[0], numberOfWindows, lines.shape[2]), dtype=np.int32)
+        for offset in range(length):
+            codes = codes * 4 + lines[:, offset:offset + numberOfWindows, :]
+        return codes
+
     ################################################################
     #
     #       To make sure not give too many
@@ -450,8 +647,15 @@ class GameEvaluator:
     #       moves for the algo to consider.
     #
     ################################################################
-    def getMoves(self, regardingMaximizer, whichBoard, moveX_callback, moveO_callback, undoMove_callback):
-        scanDict = self.board_scanner.scanBoardForPositions(whichBoard)
+    # The move callbacks are not used, moves are scored without trying them on the board.
+    # With a ThreatTracker that follows "whichBoard", its lists are used instead of scanning the board.
+    # "maxCandidateMoves" replaces MAX_CANDIDATE_MOVES, "moveMargin" replaces both MOVE_MARGIN and BEST_MOVE_MARGIN.
+    def getMoves(self, regardingMaximizer, whichBoard, moveX_callback, moveO_callback, undoMove_callback, threatTracker=None,
+                 maxCandidateMoves=None, moveMargin=None):
+        if threatTracker is not None:
+            scanDict = threatTracker.getThreats()
+        else:
+            scanDict = self.board_scanner.scanBoardForPositions(whichBoard)
 
         # 1 - Is there a winner on board. No more moves are possible
         if len(scanDict[self.board_scanner.KEY_LIST_OF_WINNERS_X]) > 0 or len(
@@ -463,20 +667,20 @@ class GameEvaluator:
             # 2) If I (as X) have at least one winning move. Return the first.
             if len(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X]) > 0:
                 return [
-                    whichBoard.indexForDimCoordinate(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X][0])]
+                    whichBoard.indexForDimCoordinate(next(iter(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X])))]
             # 3) If opponent (as O) have at least one winning move. Return first move, to stop him.
             elif len(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O]) > 0:
                 return [
-                    whichBoard.indexForDimCoordinate(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O][0])]
+                    whichBoard.indexForDimCoordinate(next(iter(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O])))]
         else:
             # 2) If I (as O) have at least one winning move. Return the first.
             if len(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O]) > 0:
                 return [
-                    whichBoard.indexForDimCoordinate(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O][0])]
+                    whichBoard.indexForDimCoordinate(next(iter(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_O])))]
             # 3) If opponent (as X) have at least one winning move. Return first move, to stop him.
             elif len(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X]) > 0:
                 return [
-                    whichBoard.indexForDimCoordinate(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X][0])]
+                    whichBoard.indexForDimCoordinate(next(iter(scanDict[self.board_scanner.KEY_LIST_OF_WINNING_MOVES_FOR_X])))]
 
         # 3) Potential winners.
         if regardingMaximizer:
@@ -520,38 +724,24 @@ class GameEvaluator:
         bestDiffMax = GameEvaluator.MIN_EVAL
         bestDiffMin = GameEvaluator.MAX_EVAL
 
+        token = X_TOKEN if regardingMaximizer else O_TOKEN
+        lines = {}  # Lines of the board, read when first needed. See "__getLine".
+
         for move in moveList:
             moveCoords = tuple(whichBoard.dimCoordinateForIndex(move))
 
-            preEval = self.evaluateList(self.__getColForCoord(moveCoords, whichBoard))
-            preEval += self.evaluateList(self.__getRowForCoord(moveCoords, whichBoard))
-            preEval += self.evaluateList(self.__getDiagonalForCoordUp(moveCoords, whichBoard))
-            preEval += self.evaluateList(self.__getDiagonalForCoordDown(moveCoords, whichBoard))
-
-            # 2) Try the move
-            if regardingMaximizer:
-                moveX_callback(move)
-            else:
-                moveO_callback(move)
-
-            # 3) Evaluate after the move try
-            postEval = self.evaluateList(self.__getColForCoord(moveCoords, whichBoard))
-            postEval += self.evaluateList(self.__getRowForCoord(moveCoords, whichBoard))
-            postEval += self.evaluateList(self.__getDiagonalForCoordUp(moveCoords, whichBoard))
-            postEval += self.evaluateList(self.__getDiagonalForCoordDown(moveCoords, whichBoard))
-
-            # 4) Undo the move try
-            undoMove_callback(move)
-
-            evalDiff = postEval - preEval
+            # How much the evaluation of the four lines through the move changes by the move.
+            evalDiff = 0
+            for lineKey, position in self.__getLinesThroughCoord(moveCoords, whichBoard):
+                evalDiff += self.__evaluateMoveInLine(self.__getLine(lineKey, moveCoords, whichBoard, lines), position, token)
 
             if regardingMaximizer:
                 bestDiffMax = max(bestDiffMax, evalDiff)
-                if evalDiff > (bestDiffMax - 10):
+                if evalDiff > (bestDiffMax - (moveMargin or self.MOVE_MARGIN)):
                     moveEvalDict[move] = evalDiff
             else:
                 bestDiffMin = min(bestDiffMin, evalDiff)
-                if evalDiff < (bestDiffMin + 10):
+                if evalDiff < (bestDiffMin + (moveMargin or self.MOVE_MARGIN)):
                     moveEvalDict[move] = evalDiff
 
         # So far all sensible moves are evaluated and placed into a dictionary.
@@ -568,15 +758,57 @@ class GameEvaluator:
         bestOfDic = {}
         cntr = 0
         for key in sortedDict.keys():
-            if sortedDict[key] > bestEval - 15:
+            if sortedDict[key] > bestEval - (moveMargin or self.BEST_MOVE_MARGIN):
                 bestOfDic[key] = sortedDict[key]
             cntr += 1
-            if cntr == 3:
+            if cntr == (maxCandidateMoves or self.MAX_CANDIDATE_MOVES):
                 break
 
         listToReturn = list(bestOfDic.keys())
         return listToReturn
 
+    # Returns the change in "evaluateList" of a line, when "token" is put on the empty cell at "position".
+    # A pattern found in the line away from the cell is there both before and after the move.
+    # Other patterns can only be found covering the cell, i.e. in a window around it.
+    def __evaluateMoveInLine(self, line, position, token):
+        lineString, occurrences = line
+        start = max(0, position - self.window)
+        before = lineString[start:position + self.window + 1]
+        after = before[:position - start] + token + before[position - start + 1:]
+        evalDiff = 0
+        for pattern, weight in self.evaluations.items():
+            occurrence = occurrences.get(pattern)
+            if occurrence is not None and (occurrence[0] < position - len(pattern) + 1 or occurrence[1] > position):
+                continue
+            evalDiff += weight * ((pattern in after) - (pattern in before))
+        return evalDiff
+
+    # Returns (key of line, position of coord in line) for column, row and both diagonals through coord.
+    def __getLinesThroughCoord(self, coord, whichBoard):
+        x, y = coord
+        numberOfRows = whichBoard.dimensions[1]
+        return [(('col', x), y - 1),
+                (('row', y), x - 1),
+                (('up', x - y), min(x, y) - 1),
+                (('down', x + y), min(x + y - 1, numberOfRows) - y)]
+
+    # Returns (line as string, {pattern: (first start, last start)} for patterns found in it).
+    # "coord" is any cell on the line. Read from the board once per key and kept in "lines".
+    def __getLine(self, lineKey, coord, whichBoard, lines):
+        if lineKey not in lines:
+            readLine = {'col': self.__getColForCoord,
+                        'row': self.__getRowForCoord,
+                        'up': self.__getDiagonalForCoordUp,
+                        'down': self.__getDiagonalForCoordDown}[lineKey[0]]
+            lineString = ''.join(readLine(coord, whichBoard))
+            occurrences = {}
+            for pattern, regex in self.occurrenceRegex.items():
+                starts = [match.start() for match in regex.finditer(lineString)]
+                if len(starts) > 0:
+                    occurrences[pattern] = (starts[0], starts[-1])
+            lines[lineKey] = (lineString, occurrences)
+        return lines[lineKey]
+
     def __getColForCoord(self, coord, whichBoard):
         col = whichBoard.getDimensionalData((coord[0], None))
         return col
@@ -590,7 +822,7 @@ class GameEvaluator:
         c = 1
         if r > whichBoard.dimensions[1]: #Number of rows
             r = whichBoard.dimensions[1]
-            c = whichBoard.dimensions[0] - (whichBoard.dimensions[1] - coord[1])
+            c = coord[0] + coord[1] - whichBoard.dimensions[1]
 
         dia = whichBoard.getDimensionalDataWithDirection((c, r), (1, -1))
 
@@ -664,57 +896,48 @@ class BoardScanner:
         ['OOOOO', [0, 4]],
     ]
 
+    def __init__(self):
+        # Board size -> (function gathering the cells of all lines from board data, (start, end) of each line).
+        self.lineLayouts = {}
+
     # "functionToCallForEachList" takes dict as argument. Keys in dict is as of above
     def scanBoardForEvaluation(self, boardToScan, functionToCallForEachList):
-        numberOfCols = boardToScan.dimensions[0]
-        numberOfRows = boardToScan.dimensions[1]
-
         summator = 0
+        for key, lineNumber, lineData in self.__readLines(boardToScan):
+            summator += functionToCallForEachList({key: lineNumber, self.KEY_BOARD_LIST_DATA: lineData})
+        return summator
 
-        ################################################
-        #           Scanning columns
-        ################################################
-        for columnNumber in range(1, numberOfCols + 1):
-            colDict = {self.KEY_BOARD_SCANNER_COLUMN: columnNumber,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalData((columnNumber, None))}
-            summator += functionToCallForEachList(colDict)
-
-        ################################################
-        #           Scanning rows
-        ################################################
-        for rowNumber in range(1, numberOfRows + 1):
-            rowDict = {self.KEY_BOARD_SCANNER_ROW: rowNumber,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalData((None, rowNumber))}
-            summator += functionToCallForEachList(rowDict)
-
-        ################################################
-        #           Scanning diagonal up
-        ################################################
-        for rdu in range(numberOfRows, 0, -1):
-            rduDict = {self.KEY_BOARD_SCANNER_DIAGONAL_UP_FROM_LEFT_SIDE_ROW_NUMBER: rdu,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalDataWithDirection((1, rdu), (1, 1))}
-            summator += functionToCallForEachList(rduDict)
-
-        for cdu in range(2, numberOfCols + 1):
-            cduDict = {self.KEY_BOARD_SCANNER_DIAGONAL_UP_FROM_BOTTOM_SIDE_COL_NUMBER: cdu,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalDataWithDirection((cdu, 1), (1, 1))}
-            summator += functionToCallForEachList(cduDict)
-
-        ################################################
-        #       Scanning diagonal down
-        ################################################
-        for rdd in range(1, numberOfRows + 1):
-            rddDict = {self.KEY_BOARD_SCANNER_DIAGONAL_DOWN_FROM_LEFT_SIDE_ROW_NUMBER: rdd,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalDataWithDirection((1, rdd), (1, -1))}
-            summator += functionToCallForEachList(rddDict)
-
-        for cdd in range(2, numberOfCols + 1):
-            cddDict = {self.KEY_BOARD_SCANNER_DIAGONAL_DOWN_FROM_TOP_SIDE_COL_NUMBER: cdd,
-                       self.KEY_BOARD_LIST_DATA: boardToScan.getDimensionalDataWithDirection((cdd, numberOfRows), (1, -1))}
-            summator += functionToCallForEachList(cddDict)
-
+    # As "scanBoardForEvaluation", without a dict and a list per line. All lines are put after each other
+    # in one string, and "functionToCallForEachLine(lineBuffer, start, end)" is called for each line, which
+    # is lineBuffer[start:end]. Read it in place, e.g. with regex.search(lineBuffer, start, end).
+    def scanLines(self, boardToScan, functionToCallForEachLine):
+        gatherCells, lineRanges = self.getLineLayout(boardToScan.dimensions)
+        lineBuffer = ''.join(gatherCells(boardToScan.getAllData()))
+        summator = 0
+        for start, end in lineRanges:
+            summator += functionToCallForEachLine(lineBuffer, start, end)
         return summator
 
+    # Returns (gatherCells, lineRanges) for a board of "dimensions", made once per size. gatherCells(board data)
+    # returns the cells of all lines, line after line, in the order of "scanBoardForEvaluation".
+    def getLineLayout(self, dimensions):
+        dimensions = tuple(dimensions)
+        layout = self.lineLayouts.get(dimensions)
+        if layout is None:
+            # The lines of a board holding its own indices tell where each line reads.
+            indexBoard = sd.StrideDimension(dimensions)
+            indexBoard.fillData(0)
+            for index in range(dimensions[0] * dimensions[1]):
+                indexBoard.setDataAtIndex(index, index)
+            order = []
+            lineRanges = []
+            for key, lineNumber, lineIndices in self.__readLines(indexBoard):
+                lineRanges.append((len(order), len(order) + len(lineIndices)))
+                order += lineIndices
+            layout = (operator.itemgetter(*order), lineRanges)
+            self.lineLayouts[dimensions] = layout
+        return layout
+
     def scanBoardForPositions(self, boardToScan):
         numberOfCols = boardToScan.dimensions[0]
         numberOfRows = boardToScan.dimensions[1]
@@ -823,6 +1046,45 @@ class BoardScanner:
 
 
     # INTERNAL HELPER METHODS
+    # Yields (key, line number, line data) for every line of the board, with keys as of above.
+    def __readLines(self, boardToScan):
+        numberOfCols = boardToScan.dimensions[0]
+        numberOfRows = boardToScan.dimensions[1]
+
+        ################################################
+        #           Scanning columns
+        ################################################
+        for columnNumber in range(1, numberOfCols + 1):
+            yield self.KEY_BOARD_SCANNER_COLUMN, columnNumber, boardToScan.getDimensionalData((columnNumber, None))
+
+        ################################################
+        #           Scanning rows
+        ################################################
+        for rowNumber in range(1, numberOfRows + 1):
+            yield self.KEY_BOARD_SCANNER_ROW, rowNumber, boardToScan.getDimensionalData((None, rowNumber))
+
+        ################################################
+        #           Scanning diagonal up
+        ################################################
+        for rdu in range(numberOfRows, 0, -1):
+            yield (self.KEY_BOARD_SCANNER_DIAGONAL_UP_FROM_LEFT_SIDE_ROW_NUMBER, rdu,
+                   boardToScan.getDimensionalDataWithDirection((1, rdu), (1, 1)))
+
+        for cdu in range(2, numberOfCols + 1):
+            yield (self.KEY_BOARD_SCANNER_DIAGONAL_UP_FROM_BOTTOM_SIDE_COL_NUMBER, cdu,
+                   boardToScan.getDimensionalDataWithDirection((cdu, 1), (1, 1)))
+
+        ################################################
+        #       Scanning diagonal down
+        ################################################
+        for rdd in range(1, numberOfRows + 1):
+            yield (self.KEY_BOARD_SCANNER_DIAGONAL_DOWN_FROM_LEFT_SIDE_ROW_NUMBER, rdd,
+                   boardToScan.getDimensionalDataWithDirection((1, rdd), (1, -1)))
+
+        for cdd in range(2, numberOfCols + 1):
+            yield (self.KEY_BOARD_SCANNER_DIAGONAL_DOWN_FROM_TOP_SIDE_COL_NUMBER, cdd,
+                   boardToScan.getDimensionalDataWithDirection((cdd, numberOfRows), (1, -1)))
+
     def __extractMovesFromMatchingPattern(self, patternList, listNumber, listString, coordMatchingFunction, patternMoveAppender):
         retList = []
         for pattern in patternList:
@@ -837,13 +1099,115 @@ class BoardScanner:
 
 
 
+####### CLASS THREAT TRACKER #########
+class ThreatTracker:
+    """
+    The lists of BoardScanner.scanBoardForPositions, kept up to date move by move.
+    """
+
+    def __init__(self):
+        bsc = BoardScanner
+        patternLists = {bsc.KEY_LIST_OF_WINNING_MOVES_FOR_X: bsc.definitivWinnersX,
+                        bsc.KEY_LIST_OF_WINNING_MOVES_FOR_O: bsc.definitivWinnersO,
+                        bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_X: bsc.potentialWinnersX,
+                        bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_O: bsc.potentialWinnersO,
+                        bsc.KEY_LIST_OF_WINNERS_X: bsc.winnersX,
+                        bsc.KEY_LIST_OF_WINNERS_O: bsc.winnersO}
+        # (key, compiled pattern, positions in the pattern that are listed)
+        self.patterns = [(key, re.compile(pattern), positions)
+                         for key, patternList in patternLists.items() for pattern, positions in patternList]
+
+        # Key as scanBoardForPositions -> {coordinates: number of matches listing them}.
+        self.threats = {key: {} for key in patternLists}
+        # Line -> [(key, coordinates)] found in it. Lines are keyed as in GameEvaluator.getMoves.
+        self.lineThreats = {}
+
+    # Same keys as scanBoardForPositions. Values are dicts with the coordinates as keys.
+    # They are updated in place by the tracker, do not change them.
+    def getThreats(self):
+        return self.threats
+
+    # Scans every line of "board" from scratch. Needed whenever the board is replaced or resized.
+    def rebuild(self, board):
+        for coordinates in self.threats.values():
+            coordinates.clear()
+        self.lineThreats = {}
+        numberOfCols = board.dimensions[0]
+        numberOfRows = board.dimensions[1]
+        lineKeys = [('col', x) for x in range(1, numberOfCols + 1)]
+        lineKeys += [('row', y) for y in range(1, numberOfRows + 1)]
+        lineKeys += [('up', d) for d in range(1 - numberOfRows, numberOfCols)]
+        lineKeys += [('down', s) for s in range(2, numberOfCols + numberOfRows + 1)]
+        for lineKey in lineKeys:
+            self.__scanLine(lineKey, board)
+
+    # Call when the cell at "index" got or lost a token. Only the four lines through it can change.
+    def update(self, board, index):
+        x, y = board.dimCoordinateForIndex(index)
+        for lineKey in (('col', x), ('row', y), ('up', x - y), ('down', x + y)):
+            self.__scanLine(lineKey, board)
+
+    # Replaces what was found in the line "lineKey" by the matches in "lineString". The first
+    # character of the string is the cell "start", the next ones follow in "direction".
+    def scanLineString(self, lineKey, lineString, start, direction):
+        for key, coordinates in self.lineThreats.pop(lineKey, []):
+            if self.threats[key][coordinates] == 1:
+                del self.threats[key][coordinates]
+            else:
+                self.threats[key][coordinates] -= 1
+
+        x, y = start
+        dx, dy = direction
+        found = []
+        for key, regex, positions in self.patterns:
+            for match in regex.finditer(lineString):
+                for position in positions:
+                    steps = match.start() + position
+                    coordinates = (x + steps * dx, y + steps * dy)
+                    self.threats[key][coordinates] = self.threats[key].get(coordinates, 0) + 1
+                    found.append((key, coordinates))
+        if len(found) > 0:
+            self.lineThreats[lineKey] = found
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    def __scanLine(self, lineKey, board):
+        (x, y), (dx, dy) = self.__getLineStart(lineKey, board)
+        if dx == 0:
+            lineString = ''.join(board.getDimensionalData((x, None)))
+        elif dy == 0:
+            lineString = ''.join(board.getDimensionalData((None, y)))
+        else:
+            lineString = ''.join(board.getDimensionalDataWithDirection((x, y), (dx, dy)))
+        self.scanLineString(lineKey, lineString, (x, y), (dx, dy))
+
+    # Returns (first cell of line, direction), as the lines are read in GameEvaluator.getMoves.
+    def __getLineStart(self, lineKey, board):
+        kind, number = lineKey
+        numberOfRows = board.dimensions[1]
+        if kind == 'col':
+            return (number, 1), (0, 1)
+        if kind == 'row':
+            return (1, number), (1, 0)
+        if kind == 'up':
+            return (max(1, 1 + number), max(1, 1 - number)), (1, 1)
+        r = min(number - 1, numberOfRows)
+        return (number - r, r), (1, -1)
+####### END CLASS THREAT TRACKER #########
+
+
 
 
 
 
-class TextBasedFiveInARowGame:
+
+class TextBasedFiveInARowGame(ge.TextBasedGame):
     def __init__(self):
-        self.game = FiveInARow()
+        super().__init__(FiveInARow(), "FIVE IN A ROW")
+        self.game.enablePondering()
         self.analyzer = None #GameAnalyzer(self.game)
 
     def debugGame(self):
@@ -852,86 +1216,16 @@ class TextBasedFiveInARowGame:
         self.game.debug()
 
     def play(self):
-        print("*" * 11)
-        print("FIVE IN A ROW")
-        print("*" * 11)
-        print("Play X or O? (X)>")
-        self.playersToken = X_TOKEN
-        self.computersToken = O_TOKEN
-        if input() == O_TOKEN:
-            self.playersToken = O_TOKEN
-            self.computersToken = X_TOKEN
-
         if self.analyzer is not None:
             self.analyzer.startDaemon()
-        while True:
-            self.printBoard()
-            if self.game.whoHas == self.playersToken:
-                try:
-                    #self.game.getMovesSorted(True)
-                    playersmove = self.__askPlayerForMove()
-                    self.game.makeMove(playersmove, self.playersToken)
-                except Exception as err:
-                    print(str(err))
-            else:
-                move = self.game.getComputersMoveForCurrentPosition()
-                self.game.makeMove(move[0], move[1])
-                print("Computer moves: ", move[0])
-
-                #self.game.getMovesSorted(False)
-                #playersmove = self.__askPlayerForMove()
-                #self.game.makeMove(playersmove, self.computersToken)
-
-
-            winnerOfCurrentPos = self.game.getWinnerOfCurrentPosition()
-            if winnerOfCurrentPos is None:
-                continue
-
-            if winnerOfCurrentPos == self.playersToken:
-                self.printBoard()
-                print("You win! Congrats!")
-            elif winnerOfCurrentPos == self.computersToken:
-                self.printBoard()
-                print("You loose...sorry.")
-            elif winnerOfCurrentPos == self.game.NO_TOKEN:
-                self.printBoard()
-                print("It's a draw!")
-
-            print("Another game? (Y/n)")
-            ans = input()
-            if ans == 'n':
-                print("Ok! Thank's for the game!")
-                break
-            self.game.resetGame()
-            self.__swapToken()
+        super().play()
+        if self.analyzer is not None:
+            self.analyzer.close()
+        self.game.close()
 
         #TODO - stop threads
         exit()
 
-
-    def printBoard(self):
-        list = self.game.getGameBoardsAllDimensions()
-        spaces = 3
-        for x in range(len(list) - 1, -1, -1):
-            if x + 1 < 10:
-                spaces = 3
-            else:
-                spaces = 2
-            print(x + 1, end=' ' * spaces)
-            for y in range(len(list[x])):
-                if list[x][y] == None:
-                    print('-', end='   ')
-                else:
-                    print(list[x][y], end='   ')
-            print("")
-        print("",end=' '*(spaces+1))
-        for i in range(self.game.getNumberOfColumns()):
-            if i+1 < 10:
-                print(i+1, end='   ')
-            else:
-                print(i + 1, end='  ')
-        print("")
-
     def printAnalyzeBoard(self):
         list = self.game.getAnalyzeBoard()
         spaces = 3
@@ -955,14 +1249,8 @@ class TextBasedFiveInARowGame:
                 print(i + 1, end='  ')
         print("")
 
-    def __swapToken(self):
-        tmpToken = self.playersToken
-        self.playersToken = self.computersToken
-        self.computersToken = tmpToken
-
-    def __askPlayerForMove(self):
-        x = 1
-        y = 1
+    # Besides coordinates: 'e' prints evaluation, 'd' debug, 'p' the board and 'h' a hint.
+    def askPlayerForMove(self):
         while True:
             print("Your move(" + self.playersToken + ")>")
             move = input()
@@ -1002,13 +1290,30 @@ class TextBasedFiveInARowGame:
 
 class GameAnalyzer:
 
-    def __init__(self, game):
+    # "analysisStore" is an optional AnalysisStore. Positions found there start the analysis
+    # deeper, and every finished depth is stored.
+    # "scheduler" is an optional AnalysisScheduler. If given, positions are analyzed by its
+    # shared worker pool, and this analyzer starts no thread of its own.
+    # "numberOfSuggestions" best moves are analyzed in the same search, see "getMoveSuggestions".
+    # The scheduler only gives the best move.
+    def __init__(self, game, analysisStore=None, scheduler=None, priority=0, numberOfSuggestions=1):
         self.game = game
+        self.numberOfSuggestions = numberOfSuggestions
+        self.analysisStore = analysisStore
+        self.scheduler = scheduler
+        self.priority = priority
+        self.daemonStarted = False
+
+        # The analyze board is copied once here. After that it follows the game by the
+        # moves and resizes in the events, applied when the analysis restarts.
         self.analyzeBoard = sd.StrideDimension((self.game.START_WITH_NO_OF_COLUMNS, self.game.START_WITH_NO_OF_ROWS))
-        self.game.apply_for_event(game.EVENT_MOVE_MADE, self.moveMade)
-        self.game.apply_for_event(game.EVENT_BOARD_SIZE_CHANGE, self.gameBoardResized)
+        self.set_analyze_board_as_game_board()
+        self.pendingDeltas = collections.deque()
+        self.game.apply_for_event(game.EVENT_MOVE_MADE, self.moveMade, ed.BACKPRESSURE_BLOCK)
+        self.game.apply_for_event(game.EVENT_BOARD_SIZE_CHANGE, self.gameBoardResized, ed.BACKPRESSURE_BLOCK)
+        self.game.apply_for_event(game.EVENT_GAME_RESET, self.gameReset, ed.BACKPRESSURE_BLOCK)
         self.analyzeDaemon = threading.Thread(target=self.analyzeGame)
-        self.analyzeAlgo = mma.GameAlgo(self.analyze_evaluate,
+        self.analyzeAlgo = gs.GameSearchAlgo(self.analyze_evaluate,
                                         self.analyze_move_x, self.analyze_move_o,
                                         self.analyze_undo_move, self.analyze_undo_move,
                                         self.analyze_getPossibleMovesMaximizer, self.analyze_getPossibleMovesMinimizer,
@@ -1016,21 +1321,57 @@ class GameAnalyzer:
         self.board_scanner = BoardScanner()
         self.game_evaluator = GameEvaluator()
 
-        self.whoHas = X_TOKEN
+        self.whoHas = self.game.whoHas
         self.moveSuggestion = None
+        self.moveSuggestions = []
 
-
+    # Kinds of deltas in "pendingDeltas".
+    DELTA_MOVE = 0
+    DELTA_RESIZE = 1
+    DELTA_RESET = 2
 
     def moveMade(self, coordinate, token):
         print("Game Analyzer Object called> Event Move Made happened in game: ", coordinate, token)
+        self.pendingDeltas.append((self.DELTA_MOVE, coordinate, token))
         self.newMove = True
-        if self.analyzeDaemon.isAlive():
+        self.__submitToScheduler()
+        if self.analyzeDaemon.is_alive():
             print("Move made and daemon IS running!")
         else:
             print("Move made but no daemon running")
 
-    def gameBoardResized(self):
+    def gameBoardResized(self, dimension, numberOfExtends, atLowEnd):
         print("Game Analyzer Object called> Event Board Resized happened in game")
+        self.pendingDeltas.append((self.DELTA_RESIZE, dimension, numberOfExtends, atLowEnd))
+        self.newMove = True
+        self.__submitToScheduler()
+
+    def gameReset(self):
+        self.pendingDeltas.append((self.DELTA_RESET,))
+        self.newMove = True
+        self.__submitToScheduler()
+
+    # With a scheduler there is no search on the analyze board, so deltas are applied at once.
+    def __submitToScheduler(self):
+        if self.scheduler is None or not self.daemonStarted:
+            return
+        self.apply_pending_deltas()
+        self.scheduler.submitPosition(id(self), self.analyzeBoard.getDataForSave(), self.whoHas, self.priority)
+
+    # Brings the analyze board up to date with the game. Only called between searches,
+    # when the search has undone all its moves on the analyze board.
+    def apply_pending_deltas(self):
+        while len(self.pendingDeltas) > 0:
+            delta = self.pendingDeltas.popleft()
+            if delta[0] == self.DELTA_MOVE:
+                self.analyzeBoard.setData(delta[1], delta[2])
+                self.whoHas = O_TOKEN if delta[2] == X_TOKEN else X_TOKEN
+            elif delta[0] == self.DELTA_RESIZE:
+                self.analyzeBoard.extendDimension(delta[1], delta[2], delta[3], NO_TOKEN)
+            else:
+                self.analyzeBoard = sd.StrideDimension((self.game.START_WITH_NO_OF_COLUMNS, self.game.START_WITH_NO_OF_ROWS))
+                self.analyzeBoard.fillData(NO_TOKEN)
+                self.whoHas = X_TOKEN
 
 
     def analyze_evaluate(self):
@@ -1052,8 +1393,23 @@ class GameAnalyzer:
         return self.game_evaluator.getMoves(False, self.analyzeBoard, self.analyze_move_x, self.analyze_move_o, self.analyze_undo_move)
 
     def getMoveSuggestion(self):
+        if self.scheduler is not None:
+            result = self.scheduler.getBestResult(id(self))
+            return None if result is None else result[asch.KEY_MOVE]
         return self.moveSuggestion
 
+    # The best moves of the deepest analysis so far, best first, as
+    # (coordinates, evaluation, principal variation as coordinates).
+    def getMoveSuggestions(self):
+        if self.scheduler is not None:
+            result = self.scheduler.getBestResult(id(self))
+            return [] if result is None else [(result[asch.KEY_MOVE], result[asch.KEY_EVAL], result[asch.KEY_HISTORY])]
+        return list(self.moveSuggestions)
+
+    # Stops the events from the game to this analyzer.
+    def close(self):
+        self.game.withdraw_from_events(self)
+
     newMove = False
     def stopAnalyze(self):
         print("Stop analyze called...")
@@ -1062,23 +1418,39 @@ class GameAnalyzer:
 
     def analyzeGame(self):
 
-        self.set_analyze_board_as_game_board()
-        self.whoHas = self.game.whoHas
-        currentDepth = 2
+        self.apply_pending_deltas()
+        currentDepth = self.__startDepthFromStore()
 
         while True:
             if self.newMove:
                 time.sleep(3)
                 self.moveSuggestion = None
-                self.set_analyze_board_as_game_board()
-                self.whoHas = self.game.whoHas
-                currentDepth = 2
+                self.moveSuggestions = []
                 self.newMove = False
-
-            moveDict = self.analyzeAlgo.calculateMoveWithHistory(mma.MINMAXALPHABETAPRUNINGWITHHISTORY_ALGO, self.whoHas == X_TOKEN, currentDepth)
+                self.apply_pending_deltas()
+                currentDepth = self.__startDepthFromStore()
+
+            if self.numberOfSuggestions > 1:
+                rootMoves = self.game_evaluator.getMoves(self.whoHas == X_TOKEN, self.analyzeBoard, self.analyze_move_x, self.analyze_move_o,
+                                                         self.analyze_undo_move, None, max(self.numberOfSuggestions, self.game_evaluator.MAX_CANDIDATE_MOVES))
+                topMoves = self.analyzeAlgo.calculateTopMoves(self.whoHas == X_TOKEN, currentDepth, self.numberOfSuggestions, rootMoves)
+                if len(topMoves) == 0:
+                    while not self.newMove:
+                        time.sleep(1)
+                    continue
+                moveDict = topMoves[0]
+            else:
+                moveDict = self.analyzeAlgo.calculateMoveWithHistory(mma.MINMAXALPHABETAPRUNINGWITHHISTORY_ALGO, self.whoHas == X_TOKEN, currentDepth)
+                topMoves = [moveDict]
+            self.moveSuggestions = [(self.analyzeBoard.dimCoordinateForIndex(top[mma.KEY_BESTMOVE]), top[mma.KEY_EVAL],
+                                     [self.analyzeBoard.dimCoordinateForIndex(m) for m in top[mma.KEY_HISTORY]]) for top in topMoves]
             move = moveDict[mma.KEY_BESTMOVE]
             history = moveDict[mma.KEY_HISTORY]
             moveWithCoords = self.analyzeBoard.dimCoordinateForIndex(move)
+            if self.analysisStore is not None:
+                positionKey, transform = bs.canonicalPositionKey(self.analyzeBoard, self.whoHas)
+                self.analysisStore.store(positionKey, bs.getBoardSymmetry(self.analyzeBoard.dimensions).toCanonicalIndex(move, transform),
+                                         currentDepth, moveDict[mma.KEY_EVAL])
 
             if self.moveSuggestion is None:
                 self.moveSuggestion = self.analyzeBoard.dimCoordinateForIndex(moveDict[mma.KEY_BESTMOVE])
@@ -1097,8 +1469,25 @@ class GameAnalyzer:
         #return (self.board.dimCoordinateForIndex(move), self.whoHas)
 
 
+    # Returns the depth to start analyzing at. If the position is in the store, its best move
+    # becomes the suggestion and analysis continues one depth deeper than stored.
+    def __startDepthFromStore(self):
+        if self.analysisStore is None:
+            return 2
+        positionKey, transform = bs.canonicalPositionKey(self.analyzeBoard, self.whoHas)
+        entry = self.analysisStore.lookup(positionKey)
+        if entry is None or not entry[ans.KEY_BOUND] == ans.BOUND_EXACT:
+            return 2
+        move = bs.getBoardSymmetry(self.analyzeBoard.dimensions).fromCanonicalIndex(entry[ans.KEY_BEST_MOVE], transform)
+        self.moveSuggestion = self.analyzeBoard.dimCoordinateForIndex(move)
+        return max(2, entry[ans.KEY_DEPTH] + 1)
+
     def startDaemon(self):
         print("startDaemon CALLED")
+        self.daemonStarted = True
+        if self.scheduler is not None:
+            self.__submitToScheduler()
+            return
         self.analyzeDaemon.start()
         return
 
@@ -1106,6 +1495,162 @@ class GameAnalyzer:
         self.analyzeBoard.setUpWithData(self.game.board.getDataForSave())
 
 
+class Ponderer:
+    """
+    Lets the engine think while the opponent thinks.
+
+    After the computer has moved, the reply it expects (second move of the
+    principal variation) is played on a private game, and that position is
+    searched in a daemon thread. If the opponent plays the expected move the
+    answer is already there, or the search is joined where it is.
+    A search on a reply that was not played is cancelled.
+    The latest search results are kept between moves, keyed by position.
+    """
+
+    MAX_SEARCH_RESULTS = 1000
+
+    def __init__(self, game):
+        self.game = game
+        self.ponderGame = FiveInARow()
+        self.ponderGame.DYNAMIC_BOARD = game.DYNAMIC_BOARD
+        self.ponderGame.SEARCH_DEPTH = game.SEARCH_DEPTH
+        self.ponderGame.SEARCH_ALGO = game.SEARCH_ALGO
+        self.ponderGame.game_evaluator = game.game_evaluator
+        self.ponderGame.setPositionEvaluator(game.positionEvaluator)
+        if game.isSelectiveSearch():
+            self.ponderGame.enableSelectiveSearch(*game.selectiveSearch)
+
+        # Own search algo on the ponder game, whose possible-moves callbacks give up when
+        # "cancelEvent" is set. That is checked once per node, so a cancelled ponder stops at once.
+        self.ponderAlgo = gs.GameSearchAlgo(self.ponderGame.evalBoard,
+                                            self.ponderGame.moveX, self.ponderGame.moveO,
+                                            self.ponderGame.undoMove, self.ponderGame.undoMove,
+                                            self.__getPossibleMovesMaximizer, self.__getPossibleMovesMinimizer,
+                                            self.ponderGame.MIN_EVAL, self.ponderGame.MAX_EVAL)
+        self.ponderGame.configureSearchAlgo(self.ponderAlgo)
+        self.cancelEvent = threading.Event()
+
+        # Canonical position key -> moveDict as returned by calculateMoveWithHistory,
+        # with the moves in the canonical orientation. See FiveInARow.getCanonicalPositionKey.
+        # Oldest results are dropped when there are more than MAX_SEARCH_RESULTS.
+        self.searchResults = {}
+
+        # Coordinates of the line the engine expects. First move is the engines own.
+        self.principalVariation = []
+
+        self.ponderKey = None
+        self.ponderTransform = bs.IDENTITY
+        self.ponderDaemon = None
+
+    # Returns the best move (index) for the position, or None if it is neither searched nor being pondered.
+    def getPonderedMove(self, positionKey, transform):
+        if self.ponderDaemon is not None and self.ponderDaemon.is_alive():
+            if self.ponderKey == positionKey:
+                # Opponent played the expected move. Continue the search where it is.
+                self.ponderDaemon.join()
+            else:
+                self.cancel()
+
+        moveDict = self.searchResults.get(positionKey)
+        if moveDict is None:
+            return None
+        symmetry = bs.getBoardSymmetry(self.game.board.dimensions)
+        moveDict = self.__mapMoves(moveDict, lambda m: symmetry.fromCanonicalIndex(m, transform))
+        self.__setPrincipalVariation(moveDict)
+        return moveDict[mma.KEY_BESTMOVE]
+
+    def storeResult(self, positionKey, transform, moveDict):
+        symmetry = bs.getBoardSymmetry(self.game.board.dimensions)
+        self.__storeCanonical(positionKey, self.__mapMoves(moveDict, lambda m: symmetry.toCanonicalIndex(m, transform)))
+        self.__setPrincipalVariation(moveDict)
+
+    def close(self):
+        self.cancel()
+        self.ponderGame.close()
+
+    # Results found with the old evaluator are thrown away.
+    def setPositionEvaluator(self, evaluator):
+        self.cancel()
+        self.ponderGame.setPositionEvaluator(evaluator)
+        self.searchResults.clear()
+
+    # Stops a running ponder search and waits for it. Its result is thrown away.
+    def cancel(self):
+        if self.ponderDaemon is None:
+            return
+        self.cancelEvent.set()
+        self.ponderDaemon.join()
+        self.ponderDaemon = None
+
+    # Called by the game after every move. "lowEndExtends" tells how much the board coordinates
+    # were shifted by the dynamic board after the move.
+    def moveMade(self, coordinates, token, lowEndExtends):
+        pv = self.principalVariation
+        self.principalVariation = []
+        if len(pv) < 2 or not list(pv[0]) == list(coordinates):
+            return
+        predictedReply = (pv[1][0] + lowEndExtends[0], pv[1][1] + lowEndExtends[1])
+        self.__startPondering(predictedReply)
+
+    def __startPondering(self, predictedReply):
+        # An earlier guess still being searched was not played. The ponder game can only hold one position.
+        self.cancel()
+
+        self.ponderGame.setUpPosition(self.game.board.getDataForSave(), self.game.whoHas)
+        if not self.ponderGame.makeMove(predictedReply, self.game.whoHas):
+            return
+        if self.ponderGame.getWinnerOfCurrentPosition() is not None:
+            return
+
+        self.ponderKey, self.ponderTransform = self.ponderGame.getCanonicalPositionKey()
+        if self.ponderKey in self.searchResults:
+            return
+        self.cancelEvent.clear()
+        self.ponderDaemon = threading.Thread(target=self.__ponder, daemon=True)
+        self.ponderDaemon.start()
+
+    # A cancelled search leaves its moves on the ponder game. The next ponder sets up the position again.
+    def __ponder(self):
+        moveDict = self.ponderAlgo.calculateMoveBeforeDeadline(self.ponderGame.SEARCH_ALGO,
+                                                               self.ponderGame.whoHas == X_TOKEN,
+                                                               self.ponderGame.SEARCH_DEPTH, gs.INFINITY)
+        if self.cancelEvent.is_set() or moveDict is None or moveDict[mma.KEY_BESTMOVE] is None:
+            return
+        if moveDict[gs.KEY_DEPTH] < self.ponderGame.SEARCH_DEPTH:
+            return
+        symmetry = bs.getBoardSymmetry(self.ponderGame.board.dimensions)
+        self.__storeCanonical(self.ponderKey, self.__mapMoves(moveDict, lambda m: symmetry.toCanonicalIndex(m, self.ponderTransform)))
+
+    def __storeCanonical(self, positionKey, moveDict):
+        self.searchResults.pop(positionKey, None)
+        self.searchResults[positionKey] = moveDict
+        while len(self.searchResults) > self.MAX_SEARCH_RESULTS:
+            del self.searchResults[next(iter(self.searchResults))]
+
+    def __getPossibleMovesMaximizer(self):
+        if self.cancelEvent.is_set():
+            raise gs.SearchTimeout()
+        return self.ponderGame.getPossibleMovesMaximizer()
+
+    def __getPossibleMovesMinimizer(self):
+        if self.cancelEvent.is_set():
+            raise gs.SearchTimeout()
+        return self.ponderGame.getPossibleMovesMinimizer()
+
+    # Returns a copy of "moveDict" with best move and history mapped by "mapFunction".
+    def __mapMoves(self, moveDict, mapFunction):
+        mappedDict = dict(moveDict)
+        mappedDict[mma.KEY_BESTMOVE] = mapFunction(moveDict[mma.KEY_BESTMOVE])
+        mappedDict[mma.KEY_HISTORY] = [mapFunction(m) for m in moveDict[mma.KEY_HISTORY]]
+        return mappedDict
+
+    def __setPrincipalVariation(self, moveDict):
+        history = list(moveDict[mma.KEY_HISTORY])
+        if len(history) == 0 or not history[0] == moveDict[mma.KEY_BESTMOVE]:
+            history.insert(0, moveDict[mma.KEY_BESTMOVE])
+        self.principalVariation = [self.game.board.dimCoordinateForIndex(m) for m in history]
+
+
 if __name__ == '__main__':
     print("Welcome to GamePlayer - Five in a row!")
     tbfir = TextBasedFiveInARowGame()
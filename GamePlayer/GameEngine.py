@@ -0,0 +1,475 @@
+#!/usr/bin/env python
+
+"""
+# GameEngine is the core that the two player board games are built on.
+#
+# It owns what every game needs and that used to be written once per game:
+#   - The board (a StrideDimension) and who has the move.
+#   - Making and checking moves, and the move stack. Every token put on the
+#     board, by a player or by the search, is pushed on the stack and popped
+#     when undone.
+#   - A Zobrist hash of the position, kept up to date move by move.
+#   - A cache of evaluations, keyed by the hash.
+#   - The search, with the callbacks mma.GameAlgo needs, and search tracing.
+#     With a TimeManager set, the search is deepened as the clock allows
+#     instead of to SEARCH_DEPTH.
+#
+# A game subclasses GameEngine and gives at least "evaluatePosition". Most
+# games also give "getPossibleMoves" and "getWinnerOfCurrentPosition".
+# Anything that changes the board must go through the engine (makeMove,
+# the move callbacks, resizeBoard, setUpPosition, resetGame), or the hash
+# and the cache are wrong.
+#
+# TextBasedGame is the text UI loop shared by the games.
+#
+"""
+
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import StrideDimensions.StrideDimensions as sd
+import GamePlayer.GameSearch as gs
+import GamePlayer.SearchTrace as st
+import random
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+####### CLASS GAME ENGINE #########
+class GameEngine:
+    """
+    Board, move stack, hashing, evaluation cache and search shared by all games.
+    """
+
+    X_TOKEN = 'X'
+    O_TOKEN = 'O'
+    NO_TOKEN = '-'
+
+    MIN_EVAL = -100
+    MAX_EVAL = 100
+
+    # Any algorithm of mma or GameSearch, e.g. gs.PVS_ASPIRATION_ALGO.
+    SEARCH_ALGO = mma.MINMAXALPHABETAPRUNINGWITHHISTORY_ALGO
+    SEARCH_DEPTH = 4
+
+    # Number of evaluations kept. The cache is cleared when it is full.
+    EVAL_CACHE_SIZE = 100000
+
+    # Selective search, see "enableSelectiveSearch" and GameSearchAlgo. Margins are in evaluation units.
+    LATE_MOVE_REDUCTION_FROM = 3
+    FUTILITY_MARGINS = {1: 10, 2: 30}
+
+    # From "getThreatStatus", for time management.
+    #   THREAT_NONE:        Nothing urgent.
+    #   THREAT_CRITICAL:    Threats on board that need thought.
+    #   THREAT_FORCED:      Only one sensible move (a win or a block).
+    THREAT_NONE = 0
+    THREAT_CRITICAL = 1
+    THREAT_FORCED = 2
+
+    def __init__(self, dimensions):
+        self.startDimensions = tuple(dimensions)
+        self.whoHas = self.X_TOKEN
+        self.playersToken = self.X_TOKEN
+        self.board = sd.StrideDimension(self.startDimensions)
+        self.board.fillData(self.NO_TOKEN)
+
+        # (index, token) of every token on board, in the order they were put there.
+        self.moveStack = []
+
+        self.evalCache = {}
+        # Board size the Zobrist keys were made for.
+        self.hashedDimensions = None
+        self.rehash()
+
+        self.traceRecorder = None
+        # (lateMoveReductionFrom, futilityMargins) while selective search is on, else None.
+        self.selectiveSearch = None
+        self.computerAlgo = self.createSearchAlgo()
+
+        # moveDict of the last "getComputersMoveForCurrentPosition".
+        self.lastSearchResult = None
+
+        # Set to a TimeManager to search as long as the clock allows. See "searchCurrentPosition".
+        self.timeManager = None
+
+    ########################################
+    #
+    #           Game interface
+    #
+    ########################################
+    # Call this to get the board for print.
+    def getBoard(self):
+        return self.board.getDimensionalData((None, None))
+
+    def getNumberOfColumns(self):
+        return self.board.dimensions[0]
+
+    def getNumberOfRows(self):
+        return self.board.dimensions[1]
+
+    # Makes an actual move and do all administrations. Return True if move could be made. Else False.
+    def makeMove(self, coordinates, token):
+        try:
+            self.checkMove(coordinates, token)
+        except Exception as err:
+            print(str(err))
+            return False
+        self.placeToken(self.board.indexForDimCoordinate((int(coordinates[0]), int(coordinates[1]))), token)
+        self.__invertWhoHas()
+        return True
+
+    # Takes back the last move. Returns False if there is none.
+    def undoLastMove(self):
+        if len(self.moveStack) == 0:
+            return False
+        self.undoMove(self.moveStack[-1][0])
+        self.__invertWhoHas()
+        return True
+
+    def getComputersMoveForCurrentPosition(self):
+        moveDict = self.searchCurrentPosition()
+        return (self.board.dimCoordinateForIndex(moveDict[mma.KEY_BESTMOVE]), self.whoHas)
+
+    # The "numberOfMoves" best moves for the player to move, from one search to SEARCH_DEPTH (multi-PV).
+    # Returns [(coordinates, evaluation, principal variation as coordinates)], best first.
+    def getTopMovesForCurrentPosition(self, numberOfMoves):
+        topMoves = self.computerAlgo.calculateTopMoves(self.whoHas == self.X_TOKEN, self.SEARCH_DEPTH, numberOfMoves,
+                                                       self.getRootMoves(numberOfMoves))
+        return [(self.board.dimCoordinateForIndex(moveDict[mma.KEY_BESTMOVE]), moveDict[mma.KEY_EVAL],
+                 [self.board.dimCoordinateForIndex(m) for m in moveDict[mma.KEY_HISTORY]]) for moveDict in topMoves]
+
+    # Searches the current position, for as long as the time manager allows if there is one,
+    # else to SEARCH_DEPTH. Returns the moveDict, also kept as "lastSearchResult".
+    def searchCurrentPosition(self):
+        if self.timeManager is not None:
+            moveDict = self.timeManager.searchMove(self)
+        else:
+            moveDict = self.computerAlgo.calculateMoveWithHistory(gs.historyAlgoFor(self.SEARCH_ALGO), self.whoHas == self.X_TOKEN, self.SEARCH_DEPTH)
+        self.lastSearchResult = moveDict
+        return moveDict
+
+    # Returns X_TOKEN or O_TOKEN for a winner, NO_TOKEN for a draw and None if the game is not over.
+    def getWinnerOfCurrentPosition(self):
+        currentEvaluation = self.evalBoard()
+        if currentEvaluation >= self.MAX_EVAL:
+            return self.X_TOKEN
+        elif currentEvaluation <= self.MIN_EVAL:
+            return self.O_TOKEN
+        elif self.isBoardFull():
+            return self.NO_TOKEN
+        return None
+
+    def resetGame(self):
+        self.whoHas = self.X_TOKEN
+        self.board = sd.StrideDimension(self.startDimensions)
+        self.board.fillData(self.NO_TOKEN)
+        self.moveStack = []
+        self.rehash()
+
+    # Sets up a position. "boardData" as from board.getDataForSave. The move stack is emptied.
+    def setUpPosition(self, boardData, whoHas):
+        self.board.setUpWithData(boardData)
+        self.whoHas = whoHas
+        self.moveStack = []
+        self.rehash()
+
+    # Extends the board as StrideDimension.extendDimension does. Moves on the stack are moved along.
+    def resizeBoard(self, dimension, numberOfExtends, atLowEnd):
+        stackedCoordinates = [self.board.dimCoordinateForIndex(index) for index, token in self.moveStack]
+        self.board.extendDimension(dimension, numberOfExtends, atLowEnd, self.NO_TOKEN)
+        if atLowEnd:
+            for coordinates in stackedCoordinates:
+                coordinates[dimension - 1] += numberOfExtends
+        self.moveStack = [(self.board.indexForDimCoordinate(coordinates), token)
+                          for coordinates, (index, token) in zip(stackedCoordinates, self.moveStack)]
+        self.rehash()
+
+    # Same board size and same tokens gives same key. Player to move is not part of it.
+    def getBoardKey(self):
+        return (tuple(self.board.dimensions), ''.join(self.board.getAllData()))
+
+    # Same board size, same tokens and same player to move gives same key.
+    def getPositionKey(self):
+        return self.getBoardKey() + (self.whoHas,)
+
+    # Record every callback the search makes into a trace file. See SearchTrace.
+    def enableTrace(self, path):
+        self.disableTrace()
+        self.traceRecorder = st.TraceRecorder(path)
+        self.computerAlgo = self.createSearchAlgo()
+
+    def disableTrace(self):
+        if self.traceRecorder is None:
+            return
+        self.traceRecorder.close()
+        self.traceRecorder = None
+        self.computerAlgo = self.createSearchAlgo()
+
+    def createSearchAlgo(self):
+        callbacks = (self.evalBoard,
+                     self.moveX, self.moveO,
+                     self.undoMove, self.undoMove,
+                     self.getPossibleMovesMaximizer, self.getPossibleMovesMinimizer)
+        if self.traceRecorder is not None:
+            callbacks = self.traceRecorder.wrap(*callbacks)
+        algo = gs.GameSearchAlgo(*callbacks, self.MIN_EVAL, self.MAX_EVAL)
+        self.configureSearchAlgo(algo)
+        return algo
+
+    # Late move reductions and futility pruning in PVS_ASPIRATION_ALGO. Defaults are LATE_MOVE_REDUCTION_FROM
+    # and FUTILITY_MARGINS. Sets SEARCH_ALGO to PVS_ASPIRATION_ALGO, the only algorithm that has them.
+    # A game may look at more moves while it is on, see "isSelectiveSearch".
+    def enableSelectiveSearch(self, lateMoveReductionFrom=None, futilityMargins=None):
+        self.SEARCH_ALGO = gs.PVS_ASPIRATION_ALGO
+        self.selectiveSearch = (lateMoveReductionFrom if lateMoveReductionFrom is not None else self.LATE_MOVE_REDUCTION_FROM,
+                                futilityMargins if futilityMargins is not None else self.FUTILITY_MARGINS)
+        self.configureSearchAlgo(self.computerAlgo)
+
+    def disableSelectiveSearch(self):
+        self.selectiveSearch = None
+        self.configureSearchAlgo(self.computerAlgo)
+
+    def isSelectiveSearch(self):
+        return self.selectiveSearch is not None
+
+    # Gives a GameSearchAlgo working on this game the selective search settings of the game.
+    def configureSearchAlgo(self, algo):
+        if self.selectiveSearch is None:
+            algo.lateMoveReductionFrom, algo.futilityMargins = None, None
+        else:
+            algo.lateMoveReductionFrom, algo.futilityMargins = self.selectiveSearch
+
+    ###############################################
+    #
+    # Callback Interfaces for different algorithms
+    #
+    ###############################################
+    def evalBoard(self):
+        evaluation = self.evalCache.get(self.positionHash)
+        if evaluation is None:
+            evaluation = self.evaluatePosition()
+            if len(self.evalCache) >= self.EVAL_CACHE_SIZE:
+                self.evalCache.clear()
+            self.evalCache[self.positionHash] = evaluation
+        return evaluation
+
+    def moveX(self, move):
+        self.placeToken(move, self.X_TOKEN)
+
+    def moveO(self, move):
+        self.placeToken(move, self.O_TOKEN)
+
+    # Takes back the token at index "move". Must be the last one put on board.
+    def undoMove(self, move):
+        index, token = self.moveStack.pop()
+        if not index == move:
+            self.moveStack.append((index, token))
+            raise Exception("Undo of " + str(move) + " but last move is " + str(index))
+        self.board.setDataAtIndex(index, self.NO_TOKEN)
+        self.positionHash ^= self.zobristKeys[token][index]
+        self.onTokenRemoved(index, token)
+
+    def getPossibleMovesMaximizer(self):
+        return self.getPossibleMoves()
+
+    def getPossibleMovesMinimizer(self):
+        return self.getPossibleMoves()
+
+    ###############################################
+    #
+    #       Given by the games
+    #
+    ###############################################
+    # Evaluation of the board. Positive is good for X. Not cached, see "evalBoard".
+    def evaluatePosition(self):
+        raise Exception("Game must implement evaluatePosition!")
+
+    # Default: all free squares, none if game is over.
+    def getPossibleMoves(self):
+        if self.getWinnerOfCurrentPosition() is None:
+            return self.board.getIndexListWhereDataIs(self.NO_TOKEN)
+        return []
+
+    # Moves looked at in the root by "getTopMovesForCurrentPosition". Default: None, the possible moves.
+    def getRootMoves(self, numberOfMoves):
+        return None
+
+    # How urgent the position is for the player to move, one of THREAT_... Default: THREAT_NONE.
+    def getThreatStatus(self):
+        return self.THREAT_NONE
+
+    # Called after a token is put on or taken from the board, for games keeping own structures.
+    def onTokenPlaced(self, index, token):
+        pass
+
+    def onTokenRemoved(self, index, token):
+        pass
+
+    ################################################################
+    #
+    #       Help methods for the games
+    #
+    ################################################################
+    # Puts "token" at index "move" and pushes it on the move stack.
+    def placeToken(self, move, token):
+        self.board.setDataAtIndex(move, token)
+        self.moveStack.append((move, token))
+        self.positionHash ^= self.zobristKeys[token][move]
+        self.onTokenPlaced(move, token)
+
+    # Checks if the "token" is ok to place at "coordinate". Raises exception if not!
+    def checkMove(self, coordinate, token):
+        if token not in (self.X_TOKEN, self.O_TOKEN):
+            raise Exception("Only \'X\' or \'O\' is allowed as token!")
+
+        if not self.whoHas == token:
+            raise Exception("Wrong players move")
+        try:
+            x = int(coordinate[0])
+            y = int(coordinate[1])
+        except:
+            raise Exception("Give tuple of integer as move! E.g. (1,1)")
+
+        if x < 1 or x > self.board.dimensions[0] or y < 1 or y > self.board.dimensions[1]:
+            raise Exception("!!!! Coords out of range !!!")
+
+        if not self.isFree((x, y)):
+            raise Exception("!!! OCCUPIED SQUARE !!!")
+
+    def isBoardFull(self):
+        return self.NO_TOKEN not in self.board.getAllData()
+
+    def isFree(self, coordinate):
+        return self.board.getData(coordinate) == self.NO_TOKEN
+
+    # Zobrist keys for the board size and the hash of the board from scratch.
+    # The keys only depend on the board size, so equal positions get equal hashes.
+    # While the size stays the same the keys, and so the cached evaluations, are kept.
+    # Then many positions set up one after the other share the cache.
+    def rehash(self):
+        dimensions = tuple(self.board.dimensions)
+        if not dimensions == self.hashedDimensions:
+            numberOfCells = dimensions[0] * dimensions[1]
+            randomKeys = random.Random(numberOfCells)
+            self.zobristKeys = {token: [randomKeys.getrandbits(64) for i in range(numberOfCells)]
+                                for token in (self.X_TOKEN, self.O_TOKEN)}
+            self.hashedDimensions = dimensions
+            self.evalCache.clear()
+        self.positionHash = 0
+        for index, token in enumerate(self.board.getAllData()):
+            if token in self.zobristKeys:
+                self.positionHash ^= self.zobristKeys[token][index]
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    def __invertWhoHas(self):
+        if self.whoHas == self.X_TOKEN:
+            self.whoHas = self.O_TOKEN
+        else:
+            self.whoHas = self.X_TOKEN
+####### END CLASS GAME ENGINE #########
+
+
+####### CLASS TEXT BASED GAME #########
+class TextBasedGame:
+    """
+    Plays a GameEngine game against the computer in a terminal.
+    """
+
+    def __init__(self, game, title):
+        self.game = game
+        self.title = title
+
+    def play(self):
+        print("*" * len(self.title))
+        print(self.title)
+        print("*" * len(self.title))
+        print("Play X or O? (X)>")
+        self.playersToken = self.game.X_TOKEN
+        self.computersToken = self.game.O_TOKEN
+        if input() == self.game.O_TOKEN:
+            self.playersToken = self.game.O_TOKEN
+            self.computersToken = self.game.X_TOKEN
+
+        while True:
+            self.printBoard()
+            if self.game.whoHas == self.playersToken:
+                try:
+                    playersmove = self.askPlayerForMove()
+                    self.game.makeMove(playersmove, self.playersToken)
+                except Exception as err:
+                    print(str(err))
+            else:
+                move = self.game.getComputersMoveForCurrentPosition()
+                self.game.makeMove(move[0], move[1])
+                print("Computer moves: ", move[0])
+
+            winnerOfCurrentPos = self.game.getWinnerOfCurrentPosition()
+            if winnerOfCurrentPos is None:
+                continue
+
+            self.printBoard()
+            if winnerOfCurrentPos == self.playersToken:
+                print("You win! Congrats!")
+            elif winnerOfCurrentPos == self.computersToken:
+                print("You loose...sorry.")
+            else:
+                print("It's a draw!")
+
+            print("Another game? (Y/n)")
+            ans = input()
+            if ans == 'n':
+                print("Ok! Thank's for the game!")
+                break
+            self.game.resetGame()
+            self.swapToken()
+
+    # Top row first, with row numbers to the left and column numbers below.
+    def printBoard(self):
+        rows = self.game.getBoard()
+        spaces = 3
+        for y in range(len(rows) - 1, -1, -1):
+            spaces = 3 if y + 1 < 10 else 2
+            print(y + 1, end=' ' * spaces)
+            for token in rows[y]:
+                print('-' if token is None else token, end='   ')
+            print("")
+        print("", end=' ' * (spaces + 1))
+        for x in range(self.game.getNumberOfColumns()):
+            print(x + 1, end='   ' if x + 1 < 10 else '  ')
+        print("")
+
+    def swapToken(self):
+        tmpToken = self.playersToken
+        self.playersToken = self.computersToken
+        self.computersToken = tmpToken
+
+    # Asks until the player gives coordinates on the board. Override for other kinds of moves.
+    def askPlayerForMove(self):
+        while True:
+            print("Your move(" + self.playersToken + ")>")
+            coord = input().split(",")
+            if not len(coord) == 2:
+                print("!!! Give coord eg. 3,2 !!!")
+                continue
+            try:
+                x = int(coord[0])
+                y = int(coord[1])
+            except:
+                print("!!! Give numbers for coords !!!")
+                continue
+            if x < 1 or x > self.game.getNumberOfColumns() or y < 1 or y > self.game.getNumberOfRows():
+                print("!!!! Coords out of range !!!")
+                continue
+            return (x, y)
+####### END CLASS TEXT BASED GAME #########
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+
+"""
+# GameSearch adds search algorithms of its own next to the ones in
+#  MinMaxAlgorithm.
+#
+# Usage:
+#
+#   GameSearchAlgo takes the same callbacks as mma.GameAlgo and can be used
+#   wherever a GameAlgo is used. Pass one of the algorithms below to
+#   "calculateMove" or "calculateMoveWithHistory" to use it. Any other
+#   algorithm is handed over to mma.GameAlgo as before.
+#
+#   PVS_ASPIRATION_ALGO:
+#       Principal variation search (null window search for all but the
+#       first move) with iterative deepening. Each iteration starts with an
+#       aspiration window around the score of the previous iteration, and
+#       is searched again with a full window when it fails high or low.
+#
+#   Selective search (off by default) makes PVS_ASPIRATION_ALGO look deeper
+#   at the moves that matter. Set "lateMoveReductionFrom" and/or
+#   "futilityMargins" of the GameSearchAlgo, or use
+#   GameEngine.enableSelectiveSearch:
+#       Late move reductions: with moves ordered best first, the moves from
+#       number "lateMoveReductionFrom" (0 is the first) are searched
+#       LATE_MOVE_REDUCTION plies shallower. One that beats alpha is searched
+#       again to full depth.
+#       Futility pruning: "futilityMargins" maps the depth left to a margin.
+#       When the static evaluation plus the margin can not reach alpha (beta
+#       for the minimizer), only the first move is searched.
+#
+#   "calculateTopMoves" finds the best few moves of the root, with scores
+#   and principal variations, in one search (multi-PV).
+#
+#   "calculateMoveBeforeDeadline" deepens one depth at a time until a
+#   deadline, for any algorithm. PVS_ASPIRATION_ALGO is stopped in the middle
+#   of a depth when the deadline passes. Other algorithms can only be stopped
+#   between depths, so a depth is not started if it is not expected to be
+#   done in time.
+#
+"""
+
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+PVS_ASPIRATION_ALGO = "pvsAspirationAlgo"
+
+# Keys in the dictionary from "calculateMoveWithHistory", in addition to the ones from mma.
+KEY_NODES = "keyNodes"
+KEY_DEPTH = "keyDepth"
+
+INFINITY = float('inf')
+
+
+# Raised in the search when the deadline has passed.
+class SearchTimeout(Exception):
+    pass
+
+
+# Returns the algorithm to use when the history (principal variation) is wanted.
+def historyAlgoFor(algo):
+    if algo == PVS_ASPIRATION_ALGO:
+        return algo
+    return mma.MINMAXALPHABETAPRUNINGWITHHISTORY_ALGO
+
+
+####### CLASS GAME SEARCH ALGO #########
+class GameSearchAlgo(mma.GameAlgo):
+    """
+    A mma.GameAlgo that also knows the search algorithms of this module.
+    """
+
+    # Half width of the first window tried around the score of previous iteration.
+    ASPIRATION_WINDOW = 25
+
+    # Nodes searched between looks at the clock, when there is a deadline.
+    NODES_PER_CLOCK_CHECK = 64
+
+    # How many times longer than the last depth the next is expected to take, until two depths are timed.
+    DEFAULT_DEPTH_GROWTH = 4
+
+    # Late move reductions: plies taken off, and the least depth left where moves are reduced.
+    LATE_MOVE_REDUCTION = 1
+    LATE_MOVE_REDUCTION_MIN_DEPTH = 3
+
+    def __init__(self, evaluate_callback, moveX_callback, moveO_callback, undoX_callback, undoO_callback,
+                 possibleMovesMaximizer_callback, possibleMovesMinimizer_callback, minEval, maxEval):
+        super().__init__(evaluate_callback, moveX_callback, moveO_callback, undoX_callback, undoO_callback,
+                         possibleMovesMaximizer_callback, possibleMovesMinimizer_callback, minEval, maxEval)
+        self.__evaluate = evaluate_callback
+        self.__moveX = moveX_callback
+        self.__moveO = moveO_callback
+        self.__undoX = undoX_callback
+        self.__undoO = undoO_callback
+        self.__possibleMovesMaximizer = possibleMovesMaximizer_callback
+        self.__possibleMovesMinimizer = possibleMovesMinimizer_callback
+
+        # Selective search of PVS_ASPIRATION_ALGO. None is off. See the module description.
+        self.lateMoveReductionFrom = None
+        self.futilityMargins = None
+
+        # Statistics of the last search made by this module.
+        self.__resetStatistics()
+        self.searchTime = 0
+
+        self.__previousPV = []
+        self.__deadline = None
+
+    def calculateMove(self, algo, maximizer, depth=4):
+        if algo == PVS_ASPIRATION_ALGO:
+            return self.calculateMoveWithHistory(algo, maximizer, depth)[mma.KEY_BESTMOVE]
+        return super().calculateMove(algo, maximizer, depth)
+
+    def calculateMoveWithHistory(self, algo, maximizer, depth=4):
+        if algo == PVS_ASPIRATION_ALGO:
+            return self.__iterativeDeepening(maximizer, depth)
+        return super().calculateMoveWithHistory(algo, maximizer, depth)
+
+    # Searches depth 1, 2, ... up to "maxDepth" and returns the moveDict of the deepest depth done,
+    # with KEY_DEPTH. Stops when "deadline" (as time.time()) passes, or when
+    # "shouldContinue(moveDict, seconds used)" returns False after a depth. Depth 1 is always done.
+    def calculateMoveBeforeDeadline(self, algo, maximizer, maxDepth, deadline, shouldContinue=None):
+        startTime = time.time()
+        self.__resetStatistics()
+        self.__previousPV = []
+        moveDict = None
+        depthTimes = []
+        for depth in range(1, maxDepth + 1):
+            depthStartTime = time.time()
+            if depth > 1:
+                growth = self.DEFAULT_DEPTH_GROWTH
+                if len(depthTimes) >= 2 and depthTimes[-2] > 0:
+                    growth = max(1, depthTimes[-1] / depthTimes[-2])
+                if depthStartTime + depthTimes[-1] * growth > deadline:
+                    break
+            try:
+                if algo == PVS_ASPIRATION_ALGO:
+                    self.__deadline = deadline if depth > 1 else None
+                    value = moveDict[mma.KEY_EVAL] if moveDict is not None else 0
+                    value, pv = self.__deepen(maximizer, depth, value)
+                    self.__previousPV = pv
+                    depthMoveDict = {mma.KEY_BESTMOVE: pv[0] if len(pv) > 0 else None,
+                                     mma.KEY_EVAL: value,
+                                     mma.KEY_HISTORY: pv,
+                                     KEY_NODES: self.nodeCount}
+                else:
+                    depthMoveDict = super().calculateMoveWithHistory(historyAlgoFor(algo), maximizer, depth)
+            except SearchTimeout:
+                break
+            finally:
+                self.__deadline = None
+            moveDict = depthMoveDict
+            moveDict[KEY_DEPTH] = depth
+            depthTimes.append(time.time() - depthStartTime)
+            if moveDict[mma.KEY_BESTMOVE] is None:
+                break
+            if shouldContinue is not None and not shouldContinue(moveDict, time.time() - startTime):
+                break
+        self.searchTime = time.time() - startTime
+        return moveDict
+
+    # The "numberOfMoves" best moves of the root, best first, from one search to "depth". Returns a moveDict
+    # (KEY_BESTMOVE, KEY_EVAL, KEY_HISTORY) for each. "rootMoves" replaces the possible moves callback at
+    # the root, e.g. to look at more moves there than in the rest of the tree.
+    # Once the list is full, a move is first searched with a null window at the score of the last move in
+    # the list. Only moves that get into the list are searched with an open window.
+    def calculateTopMoves(self, maximizer, depth, numberOfMoves, rootMoves=None):
+        startTime = time.time()
+        self.__resetStatistics()
+        if rootMoves is None:
+            rootMoves = self.__possibleMovesMaximizer() if maximizer else self.__possibleMovesMinimizer()
+        rootMoves = list(rootMoves)
+        sign = 1 if maximizer else -1
+
+        # Root move -> score and principal variation of the iteration before. Best moves are searched first.
+        scores = {}
+        lines = {}
+        topMoves = []  # (score, move, principal variation), best first
+        for iterationDepth in range(1, depth + 1):
+            rootMoves.sort(key=lambda m: -sign * scores.get(m, 0))
+            topMoves = []
+            for move in rootMoves:
+                bound = topMoves[-1][0] if len(topMoves) == numberOfMoves else None
+                value, line = self.__searchRootMove(maximizer, move, iterationDepth, bound, lines.get(move, []))
+                scores[move] = value
+                if line is None:
+                    continue
+                lines[move] = line
+                topMoves.append((value, move, line))
+                topMoves.sort(key=lambda top: -sign * top[0])
+                del topMoves[numberOfMoves:]
+        self.__previousPV = []
+        self.searchTime = time.time() - startTime
+
+        return [{mma.KEY_BESTMOVE: move, mma.KEY_EVAL: value, mma.KEY_HISTORY: line} for value, move, line in topMoves]
+
+    # Searches one root move. Returns (score, principal variation), with None for the principal
+    # variation if the move did not beat "bound" (then the score is only a bound).
+    def __searchRootMove(self, maximizer, move, depth, bound, previousLine):
+        self.__previousPV = previousLine
+        if maximizer:
+            self.__moveX(move)
+        else:
+            self.__moveO(move)
+        try:
+            childPV = []
+            if bound is None:
+                value = self.__search(not maximizer, depth - 1, 1, -INFINITY, INFINITY, childPV, True)
+            elif maximizer:
+                value = self.__search(not maximizer, depth - 1, 1, bound, bound + 1, childPV, True)
+                if value > bound:
+                    childPV = []
+                    value = self.__search(not maximizer, depth - 1, 1, bound, INFINITY, childPV, True)
+            else:
+                value = self.__search(not maximizer, depth - 1, 1, bound - 1, bound, childPV, True)
+                if value < bound:
+                    childPV = []
+                    value = self.__search(not maximizer, depth - 1, 1, -INFINITY, bound, childPV, True)
+        finally:
+            if maximizer:
+                self.__undoX(move)
+            else:
+                self.__undoO(move)
+
+        if bound is None or (maximizer and value > bound) or (not maximizer and value < bound):
+            return value, [move] + childPV
+        return value, None
+
+    def __resetStatistics(self):
+        self.nodeCount = 0
+        self.reducedSearches = 0
+        self.reSearches = 0
+        self.futilityPrunedMoves = 0
+
+    ################################################################
+    #
+    #       Principal variation search with aspiration windows
+    #
+    ################################################################
+    def __iterativeDeepening(self, maximizer, maxDepth):
+        startTime = time.time()
+        self.__resetStatistics()
+        self.__previousPV = []
+        value = 0
+        pv = []
+        for depth in range(1, maxDepth + 1):
+            value, pv = self.__deepen(maximizer, depth, value)
+            self.__previousPV = pv
+        self.searchTime = time.time() - startTime
+
+        return {mma.KEY_BESTMOVE: pv[0] if len(pv) > 0 else None,
+                mma.KEY_EVAL: value,
+                mma.KEY_HISTORY: pv,
+                KEY_NODES: self.nodeCount,
+                KEY_DEPTH: maxDepth}
+
+    # One iteration. "value" is the score of the previous iteration.
+    def __deepen(self, maximizer, depth, value):
+        if depth == 1:
+            return self.__aspirationSearch(maximizer, depth, -INFINITY, INFINITY)
+        return self.__aspirationSearch(maximizer, depth, value - self.ASPIRATION_WINDOW, value + self.ASPIRATION_WINDOW)
+
+    # Search with window (alpha, beta). On fail low or fail high, open that side and search again.
+    def __aspirationSearch(self, maximizer, depth, alpha, beta):
+        while True:
+            pv = []
+            value = self.__search(maximizer, depth, 0, alpha, beta, pv, True)
+            if value <= alpha and alpha > -INFINITY:
+                alpha = -INFINITY
+            elif value >= beta and beta < INFINITY:
+                beta = INFINITY
+            else:
+                return value, pv
+
+    def __search(self, maximizer, depth, ply, alpha, beta, pv, onPV):
+        self.nodeCount += 1
+        if self.__deadline is not None and self.nodeCount % self.NODES_PER_CLOCK_CHECK == 0 and time.time() > self.__deadline:
+            raise SearchTimeout()
+        if depth == 0:
+            return self.__evaluate()
+
+        if maximizer:
+            moves = self.__possibleMovesMaximizer()
+        else:
+            moves = self.__possibleMovesMinimizer()
+        if len(moves) == 0:
+            return self.__evaluate()
+
+        # Try the move of the previous iterations principal variation first.
+        if onPV and ply < len(self.__previousPV) and self.__previousPV[ply] in moves:
+            pvMove = self.__previousPV[ply]
+            moves = [pvMove] + [m for m in moves if not m == pvMove]
+        else:
+            onPV = False
+
+        # Futility pruning: the later moves are not searched if the position is too far from the window.
+        futileValue = None
+        if self.futilityMargins is not None and ply > 0 and depth in self.futilityMargins and len(moves) > 1:
+            staticValue = self.__evaluate()
+            if maximizer and staticValue + self.futilityMargins[depth] <= alpha:
+                futileValue = staticValue + self.futilityMargins[depth]
+            elif not maximizer and staticValue - self.futilityMargins[depth] >= beta:
+                futileValue = staticValue - self.futilityMargins[depth]
+
+        bestValue = -INFINITY if maximizer else INFINITY
+        firstMove = True
+        for moveNumber, move in enumerate(moves):
+            if futileValue is not None and not firstMove:
+                self.futilityPrunedMoves += len(moves) - moveNumber
+                if (maximizer and futileValue > bestValue) or (not maximizer and futileValue < bestValue):
+                    bestValue = futileValue
+                break
+
+            reduced = (self.lateMoveReductionFrom is not None and moveNumber >= self.lateMoveReductionFrom
+                       and depth >= self.LATE_MOVE_REDUCTION_MIN_DEPTH and not onPV)
+            if maximizer:
+                self.__moveX(move)
+            else:
+                self.__moveO(move)
+
+            # The move is undone also when a SearchTimeout passes through.
+            try:
+                childPV = []
+                if firstMove:
+                    value = self.__search(not maximizer, depth - 1, ply + 1, alpha, beta, childPV, onPV)
+                elif maximizer:
+                    if reduced:
+                        self.reducedSearches += 1
+                        value = self.__search(not maximizer, depth - 1 - self.LATE_MOVE_REDUCTION, ply + 1, alpha, alpha + 1, childPV, False)
+                    if not reduced or value > alpha:
+                        if reduced:
+                            self.reSearches += 1
+                            childPV = []
+                        value = self.__search(not maximizer, depth - 1, ply + 1, alpha, alpha + 1, childPV, False)
+                    if alpha < value < beta:
+                        childPV = []
+                        value = self.__search(not maximizer, depth - 1, ply + 1, alpha, beta, childPV, False)
+                else:
+                    if reduced:
+                        self.reducedSearches += 1
+                        value = self.__search(not maximizer, depth - 1 - self.LATE_MOVE_REDUCTION, ply + 1, beta - 1, beta, childPV, False)
+                    if not reduced or value < beta:
+                        if reduced:
+                            self.reSearches += 1
+                            childPV = []
+                        value = self.__search(not maximizer, depth - 1, ply + 1, beta - 1, beta, childPV, False)
+                    if alpha < value < beta:
+                        childPV = []
+                        value = self.__search(not maximizer, depth - 1, ply + 1, alpha, beta, childPV, False)
+            finally:
+                if maximizer:
+                    self.__undoX(move)
+                else:
+                    self.__undoO(move)
+
+            if maximizer and value > bestValue:
+                bestValue = value
+                if value > alpha:
+                    alpha = value
+                pv[:] = [move] + childPV
+            elif not maximizer and value < bestValue:
+                bestValue = value
+                if value < beta:
+                    beta = value
+                pv[:] = [move] + childPV
+
+            if alpha >= beta:
+                break
+            firstMove = False
+
+        return bestValue
+####### END CLASS GAME SEARCH ALGO #########
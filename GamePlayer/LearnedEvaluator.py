@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+
+"""
+# LearnedEvaluator is a five in a row evaluation learned from self-play, as
+#  an alternative to the pattern table of GameEvaluator. NumPy only.
+#
+# The model is a shallow convolutional network over the board:
+#   - Every line of five cells (in the four directions, also lines reaching
+#     outside the board) is one window. A cell is given as three inputs:
+#     X, O and outside the board.
+#   - Each window goes through the same hidden layer (HIDDEN units, ReLU).
+#   - The hidden units are summed over all windows and weighted to one value.
+# The output is the same model on the board minus the model on the board with
+# X and O swapped. So swapping the players changes the sign of the evaluation,
+# and windows without tokens add nothing. The output is trained as the log odds
+# of X winning, from the positions of self-play games and their results.
+#
+# Boards of the same size are evaluated as one batch. The cells of every window
+# are found by an index table per board size.
+#
+# Five in a row still gives MAX_EVAL/MIN_EVAL. Other evaluations are kept well
+# inside, since FiveInARow takes evaluations close to them as won.
+#
+# Usage:
+#
+#   python LearnedEvaluator.py selfplay games.jsonl --games 200 --depth 2
+#   python LearnedEvaluator.py train games.jsonl model.npz
+#   python LearnedEvaluator.py benchmark model.npz
+#
+#   game.setPositionEvaluator(loadModel("model.npz"))
+#
+"""
+
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.EvaluationTuner as et
+import GamePlayer.MatchRunner as mr
+import GamePlayer.Benchmark as bm
+import GamePlayer.GameSearch as gs
+import GamePlayer.WorkerPool as wp
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+WINDOW = 5
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+
+# Inputs of a cell.
+X_INPUT = 0
+O_INPUT = 1
+OUTSIDE_INPUT = 2
+INPUTS_PER_CELL = 3
+
+
+# Returns a LearnedEvaluator as saved by LearnedEvaluator.save.
+def loadModel(path):
+    data = np.load(path)
+    evaluator = LearnedEvaluator(hidden=data['hiddenWeights'].shape[1])
+    evaluator.hiddenWeights = data['hiddenWeights']
+    evaluator.hiddenBias = data['hiddenBias']
+    evaluator.outputWeights = data['outputWeights']
+    return evaluator
+
+
+####### CLASS LEARNED EVALUATOR #########
+class LearnedEvaluator:
+    """
+    Shallow convolutional evaluation of five in a row boards.
+    """
+
+    MIN_EVAL = fiar.GameEvaluator.MIN_EVAL
+    MAX_EVAL = fiar.GameEvaluator.MAX_EVAL
+
+    HIDDEN = 16
+
+    # Evaluation units per unit of log odds, and the largest evaluation that is not a five in a row.
+    EVAL_SCALE = 100
+    MAX_LEARNED_EVAL = 700
+
+    # Training (Adam on the logistic loss).
+    LEARNING_RATE = 0.01
+    BATCH_SIZE = 128
+
+    def __init__(self, hidden=None, seed=0):
+        if np is None:
+            raise Exception("LearnedEvaluator needs NumPy!")
+        hidden = hidden or self.HIDDEN
+        randomGenerator = np.random.default_rng(seed)
+        inputs = WINDOW * INPUTS_PER_CELL
+        self.hiddenWeights = randomGenerator.normal(0.0, 1.0 / np.sqrt(inputs), (inputs, hidden))
+        self.hiddenBias = np.zeros(hidden)
+        self.outputWeights = randomGenerator.normal(0.0, 0.01, hidden)
+
+        # Board dimensions -> window index table, see "__getWindowIndices".
+        self.windowIndices = {}
+
+    ########################################
+    #
+    #           Evaluation
+    #
+    ########################################
+    # Same interface as GameEvaluator.evaluate.
+    def evaluate(self, boardToEvaluate):
+        return int(self.evaluate_batch([boardToEvaluate])[0])
+
+    # Returns an int array with the evaluation of each board.
+    def evaluate_batch(self, boards):
+        evaluations = np.zeros(len(boards), dtype=np.int64)
+        for indices, windows in self.__windowsBySize(boards):
+            logOdds = self.__forward(windows)[0]
+            scaled = np.clip(np.rint(logOdds * self.EVAL_SCALE), -self.MAX_LEARNED_EVAL, self.MAX_LEARNED_EVAL)
+            xFives = (windows[:, :, :, X_INPUT].sum(axis=2) == WINDOW).any(axis=1)
+            oFives = (windows[:, :, :, O_INPUT].sum(axis=2) == WINDOW).any(axis=1)
+            evaluations[indices] = np.where(xFives, self.MAX_EVAL, np.where(oFives, self.MIN_EVAL, scaled))
+        return evaluations
+
+    def save(self, path):
+        np.savez(path, hiddenWeights=self.hiddenWeights, hiddenBias=self.hiddenBias, outputWeights=self.outputWeights)
+
+    ########################################
+    #
+    #           Training
+    #
+    ########################################
+    # Fits the model to "results" (1 X won, 0.5 draw, 0 O won) of "boards". Returns the mean loss of the last epoch.
+    def train(self, boards, results, epochs=20, seed=0, progress_callback=None):
+        results = np.asarray(results, dtype=np.float64)
+        randomGenerator = np.random.default_rng(seed)
+        parameters = [self.hiddenWeights, self.hiddenBias, self.outputWeights]
+        firstMoments = [np.zeros_like(p) for p in parameters]
+        secondMoments = [np.zeros_like(p) for p in parameters]
+        step = 0
+        windowsBySize = self.__windowsBySize(boards)
+        loss = 0.0
+        for epoch in range(1, epochs + 1):
+            batches = []
+            for indices, windows in windowsBySize:
+                order = randomGenerator.permutation(len(indices))
+                batches += [(windows[order[i:i + self.BATCH_SIZE]], results[indices[order[i:i + self.BATCH_SIZE]]])
+                            for i in range(0, len(order), self.BATCH_SIZE)]
+            randomGenerator.shuffle(batches)
+
+            lossSum = 0.0
+            for windows, batchResults in batches:
+                gradients, batchLoss = self.__gradients(windows, batchResults)
+                lossSum += batchLoss * len(batchResults)
+                step += 1
+                for parameter, gradient, firstMoment, secondMoment in zip(parameters, gradients, firstMoments, secondMoments):
+                    firstMoment *= 0.9
+                    firstMoment += 0.1 * gradient
+                    secondMoment *= 0.999
+                    secondMoment += 0.001 * gradient * gradient
+                    parameter -= self.LEARNING_RATE * (firstMoment / (1 - 0.9 ** step)) / (np.sqrt(secondMoment / (1 - 0.999 ** step)) + 1e-8)
+            loss = lossSum / max(len(results), 1)
+            if progress_callback is not None:
+                progress_callback(epoch, loss)
+        return loss
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # Returns [(indices in "boards", windows of those boards)], one per board size.
+    # Windows are float arrays of shape (boards, windows, WINDOW, INPUTS_PER_CELL).
+    def __windowsBySize(self, boards):
+        groups = {}
+        for i, board in enumerate(boards):
+            groups.setdefault(tuple(board.dimensions), []).append(i)
+        lookup = np.zeros((256, INPUTS_PER_CELL))
+        lookup[ord(fiar.X_TOKEN), X_INPUT] = 1.0
+        lookup[ord(fiar.O_TOKEN), O_INPUT] = 1.0
+        windowsBySize = []
+        for dimensions, indices in groups.items():
+            data = ''.join(''.join(boards[i].getAllData()) for i in indices).encode('ascii')
+            cells = lookup[np.frombuffer(data, dtype=np.uint8)].reshape((len(indices), dimensions[0] * dimensions[1], INPUTS_PER_CELL))
+            # One more cell, outside the board, for window cells that are not on it.
+            outside = np.zeros((len(indices), 1, INPUTS_PER_CELL))
+            outside[:, :, OUTSIDE_INPUT] = 1.0
+            cells = np.concatenate([cells, outside], axis=1)
+            windowsBySize.append((np.array(indices), cells[:, self.__getWindowIndices(boards[indices[0]])]))
+        return windowsBySize
+
+    # Index table of shape (windows, WINDOW) into the board data, with the number of cells for outside.
+    # Every line of WINDOW cells with at least one cell on the board is a window.
+    def __getWindowIndices(self, board):
+        dimensions = tuple(board.dimensions)
+        if dimensions not in self.windowIndices:
+            numberOfCols, numberOfRows = dimensions
+            outsideIndex = numberOfCols * numberOfRows
+            windows = []
+            for dx, dy in DIRECTIONS:
+                for x in range(1 - WINDOW, numberOfCols + WINDOW):
+                    for y in range(1 - WINDOW, numberOfRows + WINDOW):
+                        cells = [(x + i * dx, y + i * dy) for i in range(WINDOW)]
+                        onBoard = [1 <= cx <= numberOfCols and 1 <= cy <= numberOfRows for cx, cy in cells]
+                        if any(onBoard):
+                            windows.append([board.indexForDimCoordinate(cell) if isOn else outsideIndex
+                                            for cell, isOn in zip(cells, onBoard)])
+            self.windowIndices[dimensions] = np.array(windows)
+        return self.windowIndices[dimensions]
+
+    # Returns (log odds of X winning, [(inputs, hidden pre-activations, hidden sums)] of the board and
+    # of the swapped board).
+    def __forward(self, windows):
+        numberOfBoards, numberOfWindows = windows.shape[:2]
+        swapped = windows[:, :, :, [O_INPUT, X_INPUT, OUTSIDE_INPUT]]
+        caches = []
+        outputs = []
+        for w in (windows, swapped):
+            inputs = w.reshape((numberOfBoards, numberOfWindows, WINDOW * INPUTS_PER_CELL))
+            preActivations = inputs @ self.hiddenWeights + self.hiddenBias
+            hiddenSums = np.maximum(preActivations, 0.0).sum(axis=1)
+            outputs.append(hiddenSums @ self.outputWeights)
+            caches.append((inputs, preActivations, hiddenSums))
+        return outputs[0] - outputs[1], caches
+
+    # Returns (gradients of hiddenWeights, hiddenBias and outputWeights, mean logistic loss).
+    def __gradients(self, windows, results):
+        logOdds, caches = self.__forward(windows)
+        predictions = 1.0 / (1.0 + np.exp(-logOdds))
+        loss = -np.mean(results * np.log(predictions + 1e-12) + (1 - results) * np.log(1 - predictions + 1e-12))
+        outputGradient = (predictions - results) / len(results)
+
+        gradients = [np.zeros_like(self.hiddenWeights), np.zeros_like(self.hiddenBias), np.zeros_like(self.outputWeights)]
+        for sign, (inputs, preActivations, hiddenSums) in zip((1.0, -1.0), caches):
+            branchGradient = sign * outputGradient
+            gradients[2] += hiddenSums.T @ branchGradient
+            hiddenGradient = (branchGradient[:, None] * self.outputWeights[None, :])[:, None, :] * (preActivations > 0)
+            gradients[0] += np.einsum('bwi,bwh->ih', inputs, hiddenGradient)
+            gradients[1] += hiddenGradient.sum(axis=(0, 1))
+        return gradients, loss
+####### END CLASS LEARNED EVALUATOR #########
+
+
+################################################################
+#
+#       Self-play, training and benchmark.
+#
+################################################################
+# Runs in the worker processes. "job" is (game number, opening, config, max moves).
+# Returns the game in the archive format of ArchiveAnnotator.
+def playSelfPlayGame(job):
+    gameNumber, opening, config, maxMoves = job
+    game = mr.createEngine(config)
+    moves = []
+    for coordinates in opening:
+        game.makeMove(coordinates, game.whoHas)
+        moves.append(list(coordinates))
+    while len(moves) < maxMoves and mr.getWinner(game) is None:
+        coordinates, token = game.getComputersMoveForCurrentPosition()
+        if not game.makeMove(coordinates, token):
+            break
+        moves.append(list(coordinates))
+    return {"moves": moves, "result": mr.getWinner(game) or fiar.NO_TOKEN}
+
+
+# Plays "numberOfGames" games of the engine against itself from random openings. Appends them to "archivePath".
+def selfPlay(archivePath, numberOfGames, depth=2, numberOfWorkers=None, seed=0, progress_callback=None):
+    numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+    jobs = ((gameNumber, mr.createOpening(mr.MatchRunner.OPENING_MOVES, seed * numberOfGames + gameNumber),
+             {mr.KEY_SEARCH_DEPTH: depth}, mr.MatchRunner.MAX_MOVES) for gameNumber in range(numberOfGames))
+    with concurrent.futures.ProcessPoolExecutor(numberOfWorkers) as executor, open(archivePath, 'a') as archiveFile:
+        for gamesDone, archivedGame in enumerate(wp.imapBounded(executor, playSelfPlayGame, jobs, numberOfWorkers * 2), 1):
+            archiveFile.write(json.dumps(archivedGame) + "\n")
+            if progress_callback is not None:
+                progress_callback(gamesDone)
+
+
+# Trains a new model on the positions of the archive and saves it. Returns the model.
+def trainFromArchive(archivePath, modelPath, epochs=20, progress_callback=None):
+    positions = list(et.readPositions(archivePath, et.EvaluationTuner.SKIP_OPENING_MOVES))
+    evaluator = LearnedEvaluator()
+    evaluator.train([board for board, result in positions], [result for board, result in positions], epochs,
+                    progress_callback=progress_callback)
+    evaluator.save(modelPath)
+    return evaluator
+
+
+# Nodes per second of both evaluators on the Benchmark positions, and a match between them.
+def benchmark(modelPath, depth=2, numberOfPairs=50, numberOfWorkers=None):
+    for name, evaluator in (("pattern table", None), ("learned", loadModel(modelPath))):
+        nodes = 0
+        usedTime = 0.0
+        for rows in bm.FIVE_IN_A_ROW_POSITIONS:
+            game = bm.fiveInARowFromRows(rows)
+            game.setPositionEvaluator(evaluator)
+            counter = [0]
+            startTime = time.time()
+            bm.countingAlgo(game, counter).calculateMoveWithHistory(gs.PVS_ASPIRATION_ALGO, game.whoHas == fiar.X_TOKEN, depth + 1)
+            usedTime += time.time() - startTime
+            nodes += counter[0]
+        print("{:>15} nodes: {:>7} time: {:>7.3f} nodes/s: {:>9.1f}".format(name, nodes, usedTime, nodes / max(usedTime, 1e-9)))
+
+    runner = mr.MatchRunner({mr.KEY_MODEL: modelPath, mr.KEY_SEARCH_DEPTH: depth}, {mr.KEY_SEARCH_DEPTH: depth},
+                            mr.SPRT(elo0=0, elo1=50), numberOfWorkers)
+    runner.MAX_PAIRS = numberOfPairs
+    summary = runner.run()
+    games = summary[mr.KEY_WINS] + summary[mr.KEY_DRAWS] + summary[mr.KEY_LOSSES]
+    mr.printSummary(summary)
+    print("Learned evaluator win rate: {:.1%}".format((summary[mr.KEY_WINS] + 0.5 * summary[mr.KEY_DRAWS]) / max(games, 1)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Self-play, training and benchmark of the learned evaluator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    selfPlayCommand = commands.add_parser("selfplay", help="Play games and append them to an archive")
+    selfPlayCommand.add_argument("archive")
+    selfPlayCommand.add_argument("--games", type=int, default=100)
+    selfPlayCommand.add_argument("--depth", type=int, default=2)
+    selfPlayCommand.add_argument("--workers", type=int)
+    selfPlayCommand.add_argument("--seed", type=int, default=0)
+    trainCommand = commands.add_parser("train", help="Train a model on the positions of an archive")
+    trainCommand.add_argument("archive")
+    trainCommand.add_argument("model")
+    trainCommand.add_argument("--epochs", type=int, default=20)
+    benchmarkCommand = commands.add_parser("benchmark", help="Compare a model with the pattern table")
+    benchmarkCommand.add_argument("model")
+    benchmarkCommand.add_argument("--depth", type=int, default=2)
+    benchmarkCommand.add_argument("--pairs", type=int, default=50)
+    benchmarkCommand.add_argument("--workers", type=int)
+    arguments = parser.parse_args()
+
+    if arguments.command == "selfplay":
+        selfPlay(arguments.archive, arguments.games, arguments.depth, arguments.workers, arguments.seed,
+                 lambda gamesDone: print("Games:", gamesDone))
+    elif arguments.command == "train":
+        trainFromArchive(arguments.archive, arguments.model, arguments.epochs,
+                         lambda epoch, loss: print("Epoch", epoch, "loss {:.4f}".format(loss)))
+    else:
+        benchmark(arguments.model, arguments.depth, arguments.pairs, arguments.workers)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+"""
+# MatchRunner plays two FiveInARow engine configurations against each other
+#  until a sequential probability ratio test (SPRT) can tell which is stronger.
+#
+# An engine configuration is a dictionary, see "createEngine". Anything not
+# given is as in FiveInARow and GameEvaluator, e.g.
+#
+#   {KEY_EVALUATIONS: {...}, KEY_MOVE_MARGIN: 8, KEY_SEARCH_DEPTH: 4}
+#
+# Games are played in pairs: both engines get the same random opening, once
+# with each color. Pairs are played in parallel in a pool of worker processes.
+#
+# The SPRT tests H0: A is elo0 stronger than B, against H1: A is elo1
+# stronger. After each pair the log likelihood ratio is updated from the mean
+# and variance of the pair scores (normal approximation, which takes the
+# correlation within a pair into account). The match stops as soon as the
+# ratio crosses one of the bounds given by alpha and beta.
+#
+# Usage:
+#
+#   runner = MatchRunner(configA, configB, SPRT(elo0=0, elo1=20))
+#   result = runner.run(progress_callback=print)
+#
+"""
+
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.LearnedEvaluator as le
+import GamePlayer.WorkerPool as wp
+import concurrent.futures
+import math
+import os
+import random
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Keys in engine configurations.
+KEY_EVALUATIONS = "keyEvaluations"
+KEY_MOVE_MARGIN = "keyMoveMargin"
+KEY_BEST_MOVE_MARGIN = "keyBestMoveMargin"
+KEY_MAX_CANDIDATE_MOVES = "keyMaxCandidateMoves"
+KEY_SEARCH_DEPTH = "keySearchDepth"
+KEY_SEARCH_ALGO = "keySearchAlgo"
+KEY_MODEL = "keyModel"  # Path of a LearnedEvaluator model, used to evaluate positions.
+KEY_SELECTIVE_SEARCH = "keySelectiveSearch"  # True for FiveInARow.enableSelectiveSearch with its defaults. Search algo is then PVS.
+
+# Keys in results.
+KEY_PAIR = "keyPair"
+KEY_SCORES = "keyScores"
+KEY_TIME_A = "keyTimeA"
+KEY_TIME_B = "keyTimeB"
+KEY_MOVES_A = "keyMovesA"
+KEY_MOVES_B = "keyMovesB"
+KEY_PAIRS = "keyPairs"
+KEY_WINS = "keyWins"
+KEY_DRAWS = "keyDraws"
+KEY_LOSSES = "keyLosses"
+KEY_ELO = "keyElo"
+KEY_LLR = "keyLLR"
+KEY_DECISION = "keyDecision"
+
+# Decisions of the SPRT.
+H0 = "H0"
+H1 = "H1"
+
+
+# Expected score for the side that is "elo" stronger.
+def eloToScore(elo):
+    return 1.0 / (1.0 + 10.0 ** (-elo / 400.0))
+
+
+def scoreToElo(score):
+    score = min(max(score, 1e-6), 1.0 - 1e-6)
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+####### CLASS SPRT #########
+class SPRT:
+    """
+    Sequential probability ratio test on pair scores, normal approximation.
+    """
+
+    # The variance of a few pairs says little. No decision before this many pairs.
+    MIN_PAIRS = 10
+    # Variance used while the pair scores are still all the same.
+    MIN_VARIANCE = 1e-3
+
+    def __init__(self, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+        self.score0 = eloToScore(elo0)
+        self.score1 = eloToScore(elo1)
+        self.lowerBound = math.log(beta / (1.0 - alpha))
+        self.upperBound = math.log((1.0 - beta) / alpha)
+        self.numberOfPairs = 0
+        self.sum = 0.0
+        self.sumOfSquares = 0.0
+
+    # "score" is the score of A in a pair, from 0 to 1.
+    def addPairScore(self, score):
+        self.numberOfPairs += 1
+        self.sum += score
+        self.sumOfSquares += score * score
+
+    def getMeanScore(self):
+        return self.sum / self.numberOfPairs if self.numberOfPairs > 0 else 0.5
+
+    def getLLR(self):
+        if self.numberOfPairs < self.MIN_PAIRS:
+            return 0.0
+        mean = self.getMeanScore()
+        variance = max(self.sumOfSquares / self.numberOfPairs - mean * mean, self.MIN_VARIANCE)
+        return self.numberOfPairs * (self.score1 - self.score0) * (2 * mean - self.score0 - self.score1) / (2 * variance)
+
+    # H0, H1 or None if the test has not decided yet.
+    def getDecision(self):
+        llr = self.getLLR()
+        if llr >= self.upperBound:
+            return H1
+        if llr <= self.lowerBound:
+            return H0
+        return None
+####### END CLASS SPRT #########
+
+
+# Returns a FiveInARow set up as "config".
+def createEngine(config):
+    game = fiar.FiveInARow()
+    game.game_evaluator = fiar.GameEvaluator(config.get(KEY_EVALUATIONS))
+    for key, attribute in ((KEY_MOVE_MARGIN, 'MOVE_MARGIN'),
+                           (KEY_BEST_MOVE_MARGIN, 'BEST_MOVE_MARGIN'),
+                           (KEY_MAX_CANDIDATE_MOVES, 'MAX_CANDIDATE_MOVES')):
+        if key in config:
+            setattr(game.game_evaluator, attribute, config[key])
+    if KEY_SEARCH_DEPTH in config:
+        game.SEARCH_DEPTH = config[KEY_SEARCH_DEPTH]
+    if KEY_SEARCH_ALGO in config:
+        game.SEARCH_ALGO = config[KEY_SEARCH_ALGO]
+    if KEY_MODEL in config:
+        game.setPositionEvaluator(le.loadModel(config[KEY_MODEL]))
+    if config.get(KEY_SELECTIVE_SEARCH):
+        game.enableSelectiveSearch()
+    return game
+
+
+# Returns random alternating moves near the middle of a new board. Same "seed", same opening.
+def createOpening(numberOfMoves, seed):
+    randomMoves = random.Random(seed)
+    game = fiar.FiveInARow()
+    opening = []
+    for i in range(numberOfMoves):
+        while True:
+            coordinates = ((game.getNumberOfColumns() + 1) // 2 + randomMoves.randint(-2, 2),
+                           (game.getNumberOfRows() + 1) // 2 + randomMoves.randint(-2, 2))
+            if 1 <= coordinates[0] <= game.getNumberOfColumns() and 1 <= coordinates[1] <= game.getNumberOfRows() \
+                    and game.isFree(coordinates):
+                break
+        opening.append(coordinates)
+        game.makeMove(coordinates, game.whoHas)
+    return opening
+
+
+# Five in a row on board decides, whatever the evaluators of the engines say.
+def getWinner(game):
+    scanDict = game.threatTracker.getThreats()
+    if len(scanDict[fiar.BoardScanner.KEY_LIST_OF_WINNERS_X]) > 0:
+        return fiar.X_TOKEN
+    if len(scanDict[fiar.BoardScanner.KEY_LIST_OF_WINNERS_O]) > 0:
+        return fiar.O_TOKEN
+    return None
+
+
+################################################################
+#
+#       Runs in the worker processes.
+#
+################################################################
+# Returns (winner or NO_TOKEN for draw, {token: seconds used}, {token: moves made}).
+def playGame(configX, configO, opening, maxMoves):
+    games = {fiar.X_TOKEN: createEngine(configX), fiar.O_TOKEN: createEngine(configO)}
+    usedTime = {fiar.X_TOKEN: 0.0, fiar.O_TOKEN: 0.0}
+    movesMade = {fiar.X_TOKEN: 0, fiar.O_TOKEN: 0}
+    for coordinates in opening:
+        for game in games.values():
+            game.makeMove(coordinates, game.whoHas)
+
+    # Both engines make every move, so their boards grow alike.
+    judge = games[fiar.X_TOKEN]
+    for moveNumber in range(len(opening), maxMoves):
+        winner = getWinner(judge)
+        if winner is not None:
+            return winner, usedTime, movesMade
+        token = judge.whoHas
+        startTime = time.perf_counter()
+        coordinates = games[token].getComputersMoveForCurrentPosition()[0]
+        usedTime[token] += time.perf_counter() - startTime
+        movesMade[token] += 1
+        for game in games.values():
+            if not game.makeMove(coordinates, token):
+                raise Exception("Engine playing " + token + " made illegal move " + str(coordinates))
+    return getWinner(judge) or fiar.NO_TOKEN, usedTime, movesMade
+
+
+# "job" is (pair number, opening, config A, config B, max moves). A plays X in the first game.
+def playPair(job):
+    pairNumber, opening, configA, configB, maxMoves = job
+    scores = []
+    timeA = timeB = 0.0
+    movesA = movesB = 0
+    for tokenA, tokenB, configX, configO in ((fiar.X_TOKEN, fiar.O_TOKEN, configA, configB),
+                                             (fiar.O_TOKEN, fiar.X_TOKEN, configB, configA)):
+        winner, usedTime, movesMade = playGame(configX, configO, opening, maxMoves)
+        scores.append(1.0 if winner == tokenA else 0.0 if winner == tokenB else 0.5)
+        timeA += usedTime[tokenA]
+        timeB += usedTime[tokenB]
+        movesA += movesMade[tokenA]
+        movesB += movesMade[tokenB]
+    return {KEY_PAIR: pairNumber, KEY_SCORES: scores,
+            KEY_TIME_A: timeA, KEY_TIME_B: timeB, KEY_MOVES_A: movesA, KEY_MOVES_B: movesB}
+
+
+####### CLASS MATCH RUNNER #########
+class MatchRunner:
+    """
+    Plays pairs of games between two engine configurations until the SPRT decides.
+    """
+
+    OPENING_MOVES = 4
+    MAX_MOVES = 120
+    MAX_PAIRS = 2000
+
+    # Pairs in flight per worker. Few, since pairs played after a decision are wasted.
+    IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, configA, configB, sprt=None, numberOfWorkers=None, seed=0):
+        self.configA = configA
+        self.configB = configB
+        self.sprt = sprt or SPRT()
+        self.numberOfWorkers = numberOfWorkers or os.cpu_count() or 1
+        self.seed = seed
+
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.timeA = 0.0
+        self.timeB = 0.0
+        self.movesA = 0
+        self.movesB = 0
+
+    # Plays until the SPRT decides or MAX_PAIRS are played. Returns the summary, see "getSummary".
+    def run(self, progress_callback=None):
+        with concurrent.futures.ProcessPoolExecutor(self.numberOfWorkers) as executor:
+            for result in wp.imapBounded(executor, playPair, self.__jobs(),
+                                         self.numberOfWorkers * self.IN_FLIGHT_PER_WORKER, ordered=False):
+                self.__addResult(result)
+                if progress_callback is not None:
+                    progress_callback(self.getSummary())
+                if self.sprt.getDecision() is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+        return self.getSummary()
+
+    # Wins, draws and losses are of A. Time is seconds per move.
+    def getSummary(self):
+        return {KEY_PAIRS: self.sprt.numberOfPairs,
+                KEY_WINS: self.wins,
+                KEY_DRAWS: self.draws,
+                KEY_LOSSES: self.losses,
+                KEY_ELO: scoreToElo(self.sprt.getMeanScore()),
+                KEY_LLR: self.sprt.getLLR(),
+                KEY_DECISION: self.sprt.getDecision(),
+                KEY_TIME_A: self.timeA / max(self.movesA, 1),
+                KEY_TIME_B: self.timeB / max(self.movesB, 1)}
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    def __jobs(self):
+        for pairNumber in range(self.MAX_PAIRS):
+            opening = createOpening(self.OPENING_MOVES, self.seed * self.MAX_PAIRS + pairNumber)
+            yield (pairNumber, opening, self.configA, self.configB, self.MAX_MOVES)
+
+    def __addResult(self, result):
+        for score in result[KEY_SCORES]:
+            if score == 1.0:
+                self.wins += 1
+            elif score == 0.0:
+                self.losses += 1
+            else:
+                self.draws += 1
+        self.sprt.addPairScore(sum(result[KEY_SCORES]) / 2)
+        self.timeA += result[KEY_TIME_A]
+        self.timeB += result[KEY_TIME_B]
+        self.movesA += result[KEY_MOVES_A]
+        self.movesB += result[KEY_MOVES_B]
+####### END CLASS MATCH RUNNER #########
+
+
+def printSummary(summary):
+    print("Pairs: {} W/D/L: {}/{}/{} Elo: {:+.1f} LLR: {:.2f} Decision: {} "
+          "s/move A: {:.3f} B: {:.3f}".format(summary[KEY_PAIRS], summary[KEY_WINS], summary[KEY_DRAWS],
+                                            summary[KEY_LOSSES], summary[KEY_ELO], summary[KEY_LLR],
+                                            summary[KEY_DECISION], summary[KEY_TIME_A], summary[KEY_TIME_B]))
+
+
+if __name__ == '__main__':
+    # Example: are the default margins better than tighter ones at depth 2?
+    runner = MatchRunner({KEY_SEARCH_DEPTH: 2},
+                         {KEY_SEARCH_DEPTH: 2, KEY_MOVE_MARGIN: 5, KEY_BEST_MOVE_MARGIN: 8},
+                         SPRT(elo0=0, elo1=50))
+    printSummary(runner.run(printSummary))
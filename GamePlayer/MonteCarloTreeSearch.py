@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+"""
+# MonteCarloTreeSearch is an alternative to the MinMax algorithms. It uses
+#  the same callbacks as mma.GameAlgo, so it can be attached to
+#  "computerAlgo" of TicTacToe and FiveInARow.
+#
+# The search:
+#   1) Selects a path down the tree by UCT, where moves early in the list
+#      from the possible-moves callback get a higher prior.
+#   2) Expands one untried move.
+#   3) Plays a rollout from there, picking moves from the possible-moves
+#      callback weighted by the same priors.
+#   4) Backs the result up the path.
+#
+# The tree is kept between calls. If the position of a new call is found
+# among the children or grandchildren of the last root, that subtree is
+# searched further instead of starting over. This needs a callback that
+# returns a key for the tokens on the board. The search does not tell the
+# game whose turn it is, so the side to move is kept in the node and
+# compared on its own.
+#
+# With "calculateMoveBeforeDeadline" it can also be searched by a TimeManager,
+# and "calculateTopMoves" gives the most visited moves of the root (multi-PV).
+#
+# Usage:
+#
+#   game = FiveInARow()
+#   game.computerAlgo = forFiveInARow(game)
+#
+"""
+
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import GamePlayer.GameSearch as gs
+import math
+import random
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+MCTS_ALGO = "mctsAlgo"
+
+
+class MCTSNode:
+    """
+    One position in the search tree.
+    "valueSum" is counted from the view of the player that made "move".
+    """
+
+    def __init__(self, move, parent, maximizer, prior):
+        self.move = move
+        self.parent = parent
+        self.maximizer = maximizer  # True if X (maximizer) is to move in this node.
+        self.prior = prior
+        self.children = []
+        self.untriedMoves = None  # List of (move, prior). None until the node is visited.
+        self.visits = 0
+        self.valueSum = 0.0
+        self.key = None
+
+
+####### CLASS MONTE CARLO TREE SEARCH #########
+class MonteCarloTreeSearch:
+    """
+    UCT search with move priors, driven by the mma.GameAlgo callbacks.
+    """
+
+    # Budget per move. Search stops at whichever comes first. TIME_BUDGET None means no time limit.
+    ITERATIONS = 1000
+    TIME_BUDGET = None
+
+    EXPLORATION = 1.4
+    PRIOR_WEIGHT = 1.0
+    ROLLOUT_DEPTH = 10
+
+    def __init__(self, evaluate_callback, moveX_callback, moveO_callback, undoX_callback, undoO_callback,
+                 possibleMovesMaximizer_callback, possibleMovesMinimizer_callback, minEval, maxEval,
+                 boardKey_callback=None):
+        self.evaluate = evaluate_callback
+        self.moveX = moveX_callback
+        self.moveO = moveO_callback
+        self.undoX = undoX_callback
+        self.undoO = undoO_callback
+        self.possibleMovesMaximizer = possibleMovesMaximizer_callback
+        self.possibleMovesMinimizer = possibleMovesMinimizer_callback
+        self.minEval = minEval
+        self.maxEval = maxEval
+        self.boardKey = boardKey_callback
+
+        self.root = None
+        self.iterationCount = 0
+
+    # "algo" and "depth" are there to be called like mma.GameAlgo. The budget is ITERATIONS and TIME_BUDGET.
+    def calculateMove(self, algo, maximizer, depth=4):
+        return self.calculateMoveWithHistory(algo, maximizer, depth)[mma.KEY_BESTMOVE]
+
+    def calculateMoveWithHistory(self, algo, maximizer, depth=4):
+        self.__setUpRoot(maximizer)
+        self.iterationCount = 0
+        self.__iterateWithinBudget(self.ITERATIONS, self.__getTimeBudgetDeadline())
+        return self.__getMoveDict(self.root, maximizer)
+
+    # As GameSearchAlgo.calculateMoveBeforeDeadline, so a TimeManager can be used. ITERATIONS are searched
+    # at a time, in place of one depth, until "deadline" passes, "shouldContinue" returns False or the
+    # principal variation is "maxDepth" moves long. gs.KEY_DEPTH is the length of the principal variation.
+    def calculateMoveBeforeDeadline(self, algo, maximizer, maxDepth, deadline, shouldContinue=None):
+        startTime = time.time()
+        self.__setUpRoot(maximizer)
+        self.iterationCount = 0
+        while True:
+            self.__iterateWithinBudget(self.iterationCount + self.ITERATIONS, deadline)
+            moveDict = self.__getMoveDict(self.root, maximizer)
+            moveDict[gs.KEY_DEPTH] = len(moveDict[mma.KEY_HISTORY])
+            if time.time() > deadline or moveDict[mma.KEY_BESTMOVE] is None or moveDict[gs.KEY_DEPTH] >= maxDepth:
+                return moveDict
+            if shouldContinue is not None and not shouldContinue(moveDict, time.time() - startTime):
+                return moveDict
+
+    # As GameSearchAlgo.calculateTopMoves, with the budget of "calculateMove". The moves are the most
+    # visited children of the root. "depth" is not used.
+    def calculateTopMoves(self, maximizer, depth, numberOfMoves, rootMoves=None):
+        self.__setUpRoot(maximizer)
+        if rootMoves is not None:
+            # The root is only searched for these moves.
+            self.root = MCTSNode(None, None, maximizer, 1.0)
+            self.root.key = self.boardKey() if self.boardKey is not None else None
+            self.root.untriedMoves = self.__withPriors(rootMoves)
+        self.iterationCount = 0
+        self.__iterateWithinBudget(self.ITERATIONS, self.__getTimeBudgetDeadline())
+
+        children = sorted(self.root.children, key=lambda child: child.visits, reverse=True)[:numberOfMoves]
+        topMoves = []
+        for child in children:
+            moveDict = self.__getMoveDict(child, not maximizer)
+            topMoves.append({mma.KEY_BESTMOVE: child.move,
+                             mma.KEY_EVAL: self.__getEstimatedEval(child, maximizer),
+                             mma.KEY_HISTORY: [child.move] + moveDict[mma.KEY_HISTORY]})
+        return topMoves
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    def __getTimeBudgetDeadline(self):
+        return None if self.TIME_BUDGET is None else time.time() + self.TIME_BUDGET
+
+    # Iterates until "iterationCount" is "iterations", or "deadline" (as time.time(), None for none) passes.
+    def __iterateWithinBudget(self, iterations, deadline):
+        while self.iterationCount < iterations:
+            if deadline is not None and time.time() > deadline:
+                break
+            self.__iterate()
+            self.iterationCount += 1
+
+    # Best move, estimated evaluation and most visited line below "node", where "maximizer" is to move.
+    def __getMoveDict(self, node, maximizer):
+        if len(node.children) == 0:
+            return {mma.KEY_BESTMOVE: None, mma.KEY_EVAL: self.evaluate(), mma.KEY_HISTORY: []}
+
+        bestChild = max(node.children, key=lambda child: child.visits)
+        history = []
+        while len(node.children) > 0:
+            node = max(node.children, key=lambda child: child.visits)
+            history.append(node.move)
+        return {mma.KEY_BESTMOVE: history[0], mma.KEY_EVAL: self.__getEstimatedEval(bestChild, maximizer),
+                mma.KEY_HISTORY: history}
+
+    # Win rate of "child" as an evaluation between minEval and maxEval. "maximizer" made the move into it.
+    def __getEstimatedEval(self, child, maximizer):
+        winRate = child.valueSum / child.visits
+        if not maximizer:
+            winRate = 1 - winRate
+        return self.minEval + winRate * (self.maxEval - self.minEval)
+
+    def __setUpRoot(self, maximizer):
+        key = self.boardKey() if self.boardKey is not None else None
+        if key is not None and self.root is not None:
+            if self.root.key == key and self.root.maximizer == maximizer:
+                return
+            for child in self.root.children:
+                for grandChild in [child] + child.children:
+                    if grandChild.key == key and grandChild.maximizer == maximizer:
+                        grandChild.parent = None
+                        self.root = grandChild
+                        return
+        self.root = MCTSNode(None, None, maximizer, 1.0)
+        self.root.key = key
+
+    def __iterate(self):
+        movesMade = []
+        node = self.root
+
+        # 1) Selection
+        while node.untriedMoves is not None and len(node.untriedMoves) == 0 and len(node.children) > 0:
+            node = self.__selectChild(node)
+            self.__makeMove(node.parent.maximizer, node.move, movesMade)
+
+        # 2) Expansion
+        if node.untriedMoves is None:
+            node.untriedMoves = self.__getMovesWithPriors(node.maximizer)
+        if len(node.untriedMoves) > 0:
+            move, prior = node.untriedMoves.pop(0)
+            self.__makeMove(node.maximizer, move, movesMade)
+            child = MCTSNode(move, node, not node.maximizer, prior)
+            if self.boardKey is not None:
+                child.key = self.boardKey()
+            node.children.append(child)
+            node = child
+
+        # 3) Rollout
+        value = self.__rollout(node.maximizer, movesMade)
+
+        # 4) Undo all moves and back up the result
+        while len(movesMade) > 0:
+            maximizer, move = movesMade.pop()
+            if maximizer:
+                self.undoX(move)
+            else:
+                self.undoO(move)
+
+        while node is not None:
+            node.visits += 1
+            if node.parent is not None:
+                # Value is from X's view. Count it from the view of the one who moved into the node.
+                node.valueSum += value if node.parent.maximizer else 1 - value
+            node = node.parent
+
+    def __selectChild(self, node):
+        logVisits = math.log(node.visits + 1)
+        bestScore = None
+        bestChild = None
+        for child in node.children:
+            score = (child.valueSum / child.visits
+                     + self.EXPLORATION * math.sqrt(logVisits / child.visits)
+                     + self.PRIOR_WEIGHT * child.prior / (1 + child.visits))
+            if bestScore is None or score > bestScore:
+                bestScore = score
+                bestChild = child
+        return bestChild
+
+    # Returns value between 0 (O wins) and 1 (X wins). Moves made are appended to "movesMade".
+    def __rollout(self, maximizer, movesMade):
+        for i in range(self.ROLLOUT_DEPTH):
+            movesWithPriors = self.__getMovesWithPriors(maximizer)
+            if len(movesWithPriors) == 0:
+                break
+            move = random.choices([m for m, p in movesWithPriors], [p for m, p in movesWithPriors])[0]
+            self.__makeMove(maximizer, move, movesMade)
+            maximizer = not maximizer
+        currentEval = self.evaluate()
+        return min(1.0, max(0.0, (currentEval - self.minEval) / (self.maxEval - self.minEval)))
+
+    # Moves first in the list of the possible-moves callback are considered the best.
+    def __getMovesWithPriors(self, maximizer):
+        if maximizer:
+            return self.__withPriors(self.possibleMovesMaximizer())
+        return self.__withPriors(self.possibleMovesMinimizer())
+
+    def __withPriors(self, moves):
+        weights = [1.0 / (i + 1) for i in range(len(moves))]
+        total = sum(weights)
+        return [(move, weight / total) for move, weight in zip(moves, weights)]
+
+    def __makeMove(self, maximizer, move, movesMade):
+        if maximizer:
+            self.moveX(move)
+        else:
+            self.moveO(move)
+        movesMade.append((maximizer, move))
+####### END CLASS MONTE CARLO TREE SEARCH #########
+
+
+# Returns a MonteCarloTreeSearch to attach as "computerAlgo" of a FiveInARow game.
+def forFiveInARow(game):
+    return MonteCarloTreeSearch(game.evalBoard, game.moveX, game.moveO, game.undoMove, game.undoMove,
+                                game.getPossibleMovesMaximizer, game.getPossibleMovesMinimizer,
+                                game.game_evaluator.MIN_EVAL, game.game_evaluator.MAX_EVAL,
+                                game.getBoardKey)
+
+
+# Returns a MonteCarloTreeSearch to attach as "computerAlgo" of a TicTacToe game.
+def forTicTacToe(game):
+    return MonteCarloTreeSearch(game.evalBoard, game.moveX, game.moveO, game.undoMove, game.undoMove,
+                                game.getPossibleMoves, game.getPossibleMoves,
+                                game.MIN_EVAL, game.MAX_EVAL,
+                                game.getBoardKey)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+"""
+# ProofNumberSearch solves FiveInARow positions on small fixed boards
+#  (DYNAMIC_BOARD off, 7x7 to 9x9), instead of searching them to a fixed depth.
+#
+# Depth first proof-number search (DFPN). Every node has a proof number (how
+# many leaves must still be proven for the attacker to win) and a disproof
+# number (how many for the attacker not to win). The most proving node is
+# searched, within thresholds, until the root is proven or disproven.
+#
+# Moves come from GameEvaluator.getMoves, through the game's ThreatTracker:
+#   - When a win or a block is on board, getMoves gives the only move worth
+#     trying. Any other move loses at once, so the proof stays sound.
+#   - Else the moves of getMoves are tried first, then all other free squares.
+#     A disproof must look at every move, not only the good ones.
+#
+# A position is solved by up to two searches: can the player to move win, and
+# if not, can the opponent win. Neither is a draw.
+#
+# Nodes are kept in a table keyed by (attacker, positionHash). When it grows
+# over MAX_ENTRIES, the nodes that took the least work to search are thrown
+# away (garbage collection). Solved nodes are kept before unsolved ones.
+# The table can be checkpointed to a file, and a solve of the same position
+# goes on from it after a restart.
+#
+# Usage:
+#
+#   game = FiveInARow()
+#   game.DYNAMIC_BOARD = False
+#   ...set up the position...
+#   result = ProofNumberSearch(game, checkpointPath="solve.pickle").solve()
+#   result[KEY_RESULT], result[KEY_MOVE]
+#
+"""
+
+import GamePlayer.FiveInARow as fiar
+import argparse
+import os
+import pickle
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Results, for the player to move.
+RESULT_WIN = "win"
+RESULT_LOSS = "loss"
+RESULT_DRAW = "draw"
+RESULT_UNKNOWN = "unknown"
+
+KEY_RESULT = "result"
+KEY_MOVE = "move"
+KEY_NODES = "nodes"
+KEY_TIME = "time"
+
+# Proof and disproof numbers never go over this. A node with one of them INFINITY is solved.
+INFINITY = 10 ** 9
+
+KEY_POSITION = "position"
+KEY_TABLE = "table"
+
+
+####### CLASS PROOF NUMBER SEARCH #########
+class ProofNumberSearch:
+    """
+    DFPN solver for a FiveInARow position on a fixed board.
+    """
+
+    # Nodes kept in the table. Garbage collection keeps GC_KEEP_FRACTION of them.
+    MAX_ENTRIES = 2000000
+    GC_KEEP_FRACTION = 0.5
+
+    # Seconds between checkpoints.
+    CHECKPOINT_INTERVAL = 60.0
+
+    def __init__(self, game, checkpointPath=None, maxEntries=None):
+        if game.DYNAMIC_BOARD:
+            raise Exception("ProofNumberSearch needs a fixed board (DYNAMIC_BOARD off)!")
+        self.game = game
+        self.checkpointPath = checkpointPath
+        if maxEntries is not None:
+            self.MAX_ENTRIES = maxEntries
+
+        # (attacker, positionHash) -> [proof number, disproof number, work]
+        self.table = {}
+        self.nodes = 0
+        self.garbageCollections = 0
+
+        self.__maxNodes = None
+        self.__lastCheckpoint = None
+
+    # Solves the position of the game for the player to move. Returns a dict with KEY_RESULT (RESULT_...),
+    # KEY_MOVE (coordinates of the winning move on RESULT_WIN, else None), KEY_NODES and KEY_TIME.
+    # With "maxNodes", RESULT_UNKNOWN is returned when more nodes than that would be needed.
+    def solve(self, maxNodes=None):
+        startTime = time.time()
+        self.__readCheckpoint()
+        self.__maxNodes = None if maxNodes is None else self.nodes + maxNodes
+        self.__lastCheckpoint = time.time()
+
+        toMove = self.game.whoHas
+        opponent = self.__otherToken(toMove)
+        result = RESULT_UNKNOWN
+        move = None
+        if self.__prove(toMove, toMove):
+            result = RESULT_WIN
+            move = self.game.board.dimCoordinateForIndex(self.__getProvingMove(toMove, toMove))
+        elif self.__isDisproven(toMove):
+            if self.__prove(opponent, toMove):
+                result = RESULT_LOSS
+            elif self.__isDisproven(opponent):
+                result = RESULT_DRAW
+
+        self.__writeCheckpoint()
+        return {KEY_RESULT: result, KEY_MOVE: move, KEY_NODES: self.nodes, KEY_TIME: time.time() - startTime}
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # Searches the root until "attacker" is proven to win or not. Returns True if proven to win.
+    def __prove(self, attacker, toMove):
+        rootKey = (attacker, self.game.positionHash)
+        while True:
+            proofNumber, disproofNumber = self.__getNumbers(rootKey)
+            if proofNumber == 0:
+                return True
+            if disproofNumber == 0 or self.__isOverNodeLimit():
+                return False
+            self.__searchNode(attacker, toMove, INFINITY, INFINITY)
+
+    def __isDisproven(self, attacker):
+        return self.__getNumbers((attacker, self.game.positionHash))[1] == 0
+
+    def __isOverNodeLimit(self):
+        return self.__maxNodes is not None and self.nodes >= self.__maxNodes
+
+    # Proof and disproof numbers of a node, (1, 1) if not in the table.
+    def __getNumbers(self, key):
+        entry = self.table.get(key)
+        if entry is None:
+            return 1, 1
+        return entry[0], entry[1]
+
+    # DFPN "multiple iterative deepening" of the current position, until its proof number reaches
+    # "proofThreshold" or its disproof number "disproofThreshold".
+    def __searchNode(self, attacker, toMove, proofThreshold, disproofThreshold):
+        key = (attacker, self.game.positionHash)
+        self.nodes += 1
+        startNodes = self.nodes
+        earlierWork = self.table[key][2] if key in self.table else 0
+        self.__checkpointIfDue()
+
+        moves = self.__getMoves(attacker, toMove, key)
+        if moves is None:
+            return
+
+        isOrNode = toMove == attacker
+        nextToMove = self.__otherToken(toMove)
+        while True:
+            proofNumber, disproofNumber, best, secondBest = self.__collectChildren(attacker, toMove, moves, isOrNode)
+            self.__store(key, proofNumber, disproofNumber, earlierWork + self.nodes - startNodes)
+            if proofNumber >= proofThreshold or disproofNumber >= disproofThreshold or self.__isOverNodeLimit():
+                return
+
+            childProof, childDisproof = best[1], best[2]
+            if isOrNode:
+                childProofThreshold = min(proofThreshold, secondBest + 1)
+                childDisproofThreshold = min(INFINITY, disproofThreshold - disproofNumber + childDisproof)
+            else:
+                childProofThreshold = min(INFINITY, proofThreshold - proofNumber + childProof)
+                childDisproofThreshold = min(disproofThreshold, secondBest + 1)
+
+            self.__placeToken(best[0], toMove)
+            try:
+                self.__searchNode(attacker, nextToMove, childProofThreshold, childDisproofThreshold)
+            finally:
+                self.game.undoMove(best[0])
+
+    # Returns (proof number, disproof number, (move, child proof, child disproof) of the child to search,
+    # the second smallest child proof number in an OR node or disproof number in an AND node).
+    def __collectChildren(self, attacker, toMove, moves, isOrNode):
+        proofSum = 0
+        disproofSum = 0
+        best = None
+        bestNumber = INFINITY + 1
+        secondBest = INFINITY
+        for move in moves:
+            childProof, childDisproof = self.__getNumbers((attacker, self.__getChildHash(move, toMove)))
+
+            proofSum += childProof
+            disproofSum += childDisproof
+            number = childProof if isOrNode else childDisproof
+            if number < bestNumber:
+                secondBest = bestNumber
+                bestNumber = number
+                best = (move, childProof, childDisproof)
+            elif number < secondBest:
+                secondBest = number
+            if number == 0:
+                break  # Solved by this child.
+
+        if bestNumber == 0:
+            return (0, INFINITY, best, secondBest) if isOrNode else (INFINITY, 0, best, secondBest)
+        secondBest = min(secondBest, INFINITY)
+        if isOrNode:
+            return bestNumber, min(disproofSum, INFINITY), best, secondBest
+        return min(proofSum, INFINITY), bestNumber, best, secondBest
+
+    # Moves of the current position, or None if it is solved (stored in the table) without them.
+    def __getMoves(self, attacker, toMove, key):
+        threats = self.game.threatTracker.getThreats()
+        defender = self.__otherToken(attacker)
+        if len(threats[fiar.BoardScanner.KEY_LIST_OF_WINNERS_X]) > 0 or len(threats[fiar.BoardScanner.KEY_LIST_OF_WINNERS_O]) > 0:
+            attackerWon = len(threats[self.__winnersKey(attacker)]) > 0
+            self.__store(key, 0 if attackerWon else INFINITY, INFINITY if attackerWon else 0, 0)
+            return None
+        if self.game.isBoardFull():
+            self.__store(key, INFINITY, 0, 0)  # A draw is no win for the attacker.
+            return None
+
+        candidates = self.game.game_evaluator.getMoves(toMove == fiar.X_TOKEN, self.game.board, self.game.moveX,
+                                                        self.game.moveO, self.game.undoMove, self.game.threatTracker)
+        if len(threats[self.__winningMovesKey(attacker)]) > 0 or len(threats[self.__winningMovesKey(defender)]) > 0:
+            return candidates
+
+        candidateSet = set(candidates)
+        return candidates + [move for move in self.game.board.getIndexListWhereDataIs(fiar.NO_TOKEN)
+                             if move not in candidateSet]
+
+    # The move of a proven OR node that leads to a proven child. All free squares are looked at, as getMoves
+    # may pick another one of several winning moves or blocks than the search did.
+    def __getProvingMove(self, attacker, toMove):
+        for move in self.game.board.getIndexListWhereDataIs(fiar.NO_TOKEN):
+            if self.__getNumbers((attacker, self.__getChildHash(move, toMove)))[0] == 0:
+                return move
+        raise Exception("No proving move in a proven position!")
+
+    # positionHash after "token" is put at "move", without putting it there.
+    def __getChildHash(self, move, token):
+        return self.game.positionHash ^ self.game.zobristKeys[token][move]
+
+    def __placeToken(self, move, token):
+        if token == fiar.X_TOKEN:
+            self.game.moveX(move)
+        else:
+            self.game.moveO(move)
+
+    def __otherToken(self, token):
+        return fiar.O_TOKEN if token == fiar.X_TOKEN else fiar.X_TOKEN
+
+    def __winnersKey(self, token):
+        if token == fiar.X_TOKEN:
+            return fiar.BoardScanner.KEY_LIST_OF_WINNERS_X
+        return fiar.BoardScanner.KEY_LIST_OF_WINNERS_O
+
+    def __winningMovesKey(self, token):
+        if token == fiar.X_TOKEN:
+            return fiar.BoardScanner.KEY_LIST_OF_WINNING_MOVES_FOR_X
+        return fiar.BoardScanner.KEY_LIST_OF_WINNING_MOVES_FOR_O
+
+    # "work" is the number of nodes searched below the node, over all its visits.
+    def __store(self, key, proofNumber, disproofNumber, work):
+        self.table[key] = [proofNumber, disproofNumber, work]
+        if len(self.table) > self.MAX_ENTRIES:
+            self.__collectGarbage()
+
+    # Keeps the solved nodes and the unsolved ones that took most work, GC_KEEP_FRACTION of MAX_ENTRIES in all.
+    def __collectGarbage(self):
+        keep = int(self.MAX_ENTRIES * self.GC_KEEP_FRACTION)
+        ranked = sorted(self.table.items(), key=lambda item: (item[1][0] == 0 or item[1][1] == 0, item[1][2]),
+                        reverse=True)
+        self.table = dict(ranked[:keep])
+        self.garbageCollections += 1
+
+    def __checkpointIfDue(self):
+        if self.checkpointPath is not None and time.time() - self.__lastCheckpoint >= self.CHECKPOINT_INTERVAL:
+            self.__writeCheckpoint()
+            self.__lastCheckpoint = time.time()
+
+    # The table is used only if it was saved for the same position.
+    def __readCheckpoint(self):
+        if self.checkpointPath is None or not os.path.exists(self.checkpointPath):
+            return
+        with open(self.checkpointPath, 'rb') as checkpointFile:
+            checkpoint = pickle.load(checkpointFile)
+        if checkpoint[KEY_POSITION] == self.game.getPositionKey():
+            self.table = checkpoint[KEY_TABLE]
+            self.nodes = checkpoint[KEY_NODES]
+
+    # The checkpoint is replaced in one step.
+    def __writeCheckpoint(self):
+        if self.checkpointPath is None:
+            return
+        temporaryPath = self.checkpointPath + ".tmp"
+        with open(temporaryPath, 'wb') as checkpointFile:
+            pickle.dump({KEY_POSITION: self.game.getPositionKey(), KEY_TABLE: self.table, KEY_NODES: self.nodes},
+                        checkpointFile, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryPath, self.checkpointPath)
+####### END CLASS PROOF NUMBER SEARCH #########
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solves a FiveInARow position on a fixed board.")
+    parser.add_argument("position", help="File with one row of the board per line, top row first. "
+                                         + fiar.X_TOKEN + ", " + fiar.O_TOKEN + " and " + fiar.NO_TOKEN)
+    parser.add_argument("--checkpoint", help="The solve is saved here, and goes on from here after a restart")
+    parser.add_argument("--max-nodes", type=int)
+    arguments = parser.parse_args()
+
+    import GamePlayer.Benchmark as bm
+    with open(arguments.position, 'r') as positionFile:
+        rows = [line.strip() for line in positionFile if line.strip()]
+    fixedGame = fiar.FiveInARow()
+    fixedGame.DYNAMIC_BOARD = False
+    bm.setUpFromRows(fixedGame, rows)
+    solveResult = ProofNumberSearch(fixedGame, arguments.checkpoint).solve(arguments.max_nodes)
+    print("Result for", fixedGame.whoHas + ":", solveResult[KEY_RESULT], "Move:", solveResult[KEY_MOVE],
+          "Nodes:", solveResult[KEY_NODES], "Time: %.1f s" % solveResult[KEY_TIME])
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""
+# SearchTrace records what a search does, to find out afterwards where the
+#  time of a slow move went.
+#
+# TraceRecorder wraps the callbacks that mma.GameAlgo drives (evaluate, moves,
+# undos and possible moves). Every call is written as a fixed size binary
+# record to a file while the search runs: callback, depth, move, start time,
+# duration and result (evaluation or number of possible moves).
+#
+# TraceAnalyzer reads a trace file and sums it up per callback, per depth and
+# per root move (nodes and time spent below each root move).
+#
+# Usage:
+#
+#   game.enableTrace("move.trace")
+#   game.getComputersMoveForCurrentPosition()
+#   game.disableTrace()
+#
+#   python SearchTrace.py move.trace
+#
+"""
+
+import struct
+import sys
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+CALLBACK_EVALUATE = 0
+CALLBACK_MOVE_X = 1
+CALLBACK_MOVE_O = 2
+CALLBACK_UNDO_X = 3
+CALLBACK_UNDO_O = 4
+CALLBACK_POSSIBLE_MOVES_MAXIMIZER = 5
+CALLBACK_POSSIBLE_MOVES_MINIMIZER = 6
+
+CALLBACK_NAMES = ["evalBoard", "moveX", "moveO", "undoMove X", "undoMove O",
+                  "getPossibleMovesMaximizer", "getPossibleMovesMinimizer"]
+
+# callback, depth, move, start (microseconds since trace start), duration (microseconds), result
+RECORD = struct.Struct('<BhiQIi')
+
+# Stored for moves that are not board indices.
+NO_MOVE = -1
+OTHER_MOVE = -2
+
+
+####### CLASS TRACE RECORDER #########
+class TraceRecorder:
+    """
+    Wraps search callbacks and streams a record of every call to a file.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb', buffering=1 << 16)
+        self.startTime = time.perf_counter()
+        self.depth = 0
+
+    # Returns the callbacks wrapped, in the same order as given.
+    def wrap(self, evaluate_callback, moveX_callback, moveO_callback, undoX_callback, undoO_callback,
+             possibleMovesMaximizer_callback, possibleMovesMinimizer_callback):
+        return (self.__wrapEvaluate(evaluate_callback),
+                self.__wrapMove(moveX_callback, CALLBACK_MOVE_X),
+                self.__wrapMove(moveO_callback, CALLBACK_MOVE_O),
+                self.__wrapUndo(undoX_callback, CALLBACK_UNDO_X),
+                self.__wrapUndo(undoO_callback, CALLBACK_UNDO_O),
+                self.__wrapPossibleMoves(possibleMovesMaximizer_callback, CALLBACK_POSSIBLE_MOVES_MAXIMIZER),
+                self.__wrapPossibleMoves(possibleMovesMinimizer_callback, CALLBACK_POSSIBLE_MOVES_MINIMIZER))
+
+    def close(self):
+        self.file.close()
+
+    def __write(self, callback, move, start, end, result):
+        if move is None:
+            move = NO_MOVE
+        elif not isinstance(move, int):
+            move = OTHER_MOVE
+        self.file.write(RECORD.pack(callback, self.depth, move,
+                                    int((start - self.startTime) * 1000000),
+                                    int((end - start) * 1000000),
+                                    int(result)))
+
+    def __wrapEvaluate(self, evaluate_callback):
+        def evaluate():
+            start = time.perf_counter()
+            value = evaluate_callback()
+            self.__write(CALLBACK_EVALUATE, None, start, time.perf_counter(), value)
+            return value
+        return evaluate
+
+    def __wrapMove(self, move_callback, callback):
+        def move(m):
+            start = time.perf_counter()
+            move_callback(m)
+            self.__write(callback, m, start, time.perf_counter(), 0)
+            self.depth += 1
+        return move
+
+    def __wrapUndo(self, undo_callback, callback):
+        def undo(m):
+            self.depth -= 1
+            start = time.perf_counter()
+            undo_callback(m)
+            self.__write(callback, m, start, time.perf_counter(), 0)
+        return undo
+
+    def __wrapPossibleMoves(self, possibleMoves_callback, callback):
+        def possibleMoves():
+            start = time.perf_counter()
+            moves = possibleMoves_callback()
+            self.__write(callback, None, start, time.perf_counter(), len(moves))
+            return moves
+        return possibleMoves
+####### END CLASS TRACE RECORDER #########
+
+
+####### CLASS TRACE ANALYZER #########
+class TraceAnalyzer:
+    """
+    Sums up a trace file per callback, per depth and per root move.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        # Callback -> [calls, total microseconds]
+        self.byCallback = {}
+        # Depth -> callback -> [calls, total microseconds]
+        self.byDepth = {}
+        # Root move -> [nodes below, total microseconds from move to undo]
+        self.byRootMove = {}
+
+    # Reads the trace record by record, so traces larger than memory can be analyzed.
+    def records(self):
+        with open(self.path, 'rb') as traceFile:
+            while True:
+                data = traceFile.read(RECORD.size * 4096)
+                if len(data) == 0:
+                    break
+                for record in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+                    yield record
+
+    def analyze(self):
+        rootMove = None
+        rootMoveStart = 0
+        for callback, depth, move, start, duration, result in self.records():
+            calls = self.byCallback.setdefault(callback, [0, 0])
+            calls[0] += 1
+            calls[1] += duration
+            calls = self.byDepth.setdefault(depth, {}).setdefault(callback, [0, 0])
+            calls[0] += 1
+            calls[1] += duration
+
+            if callback in (CALLBACK_MOVE_X, CALLBACK_MOVE_O):
+                if depth == 0:
+                    rootMove = move
+                    rootMoveStart = start
+                    self.byRootMove.setdefault(rootMove, [0, 0])
+                self.byRootMove[rootMove][0] += 1
+            elif callback in (CALLBACK_UNDO_X, CALLBACK_UNDO_O) and depth == 0:
+                self.byRootMove[rootMove][1] += start + duration - rootMoveStart
+        return self
+
+    def printReport(self, numberOfHotspots=10):
+        print("*** Per callback ***")
+        print("{:>28} {:>10} {:>12} {:>10}".format("callback", "calls", "total ms", "us/call"))
+        for callback, (calls, total) in sorted(self.byCallback.items(), key=lambda item: -item[1][1]):
+            print("{:>28} {:>10} {:>12.1f} {:>10.1f}".format(CALLBACK_NAMES[callback], calls, total / 1000, total / calls))
+
+        print("")
+        print("*** Per depth ***")
+        print("{:>5} {:>28} {:>10} {:>12}".format("depth", "callback", "calls", "total ms"))
+        for depth in sorted(self.byDepth):
+            for callback, (calls, total) in sorted(self.byDepth[depth].items()):
+                print("{:>5} {:>28} {:>10} {:>12.1f}".format(depth, CALLBACK_NAMES[callback], calls, total / 1000))
+
+        print("")
+        print("*** Root moves, most time first ***")
+        print("{:>10} {:>10} {:>12}".format("move", "nodes", "total ms"))
+        hotspots = sorted(self.byRootMove.items(), key=lambda item: -item[1][1])[:numberOfHotspots]
+        for move, (nodes, total) in hotspots:
+            print("{:>10} {:>10} {:>12.1f}".format(move, nodes, total / 1000))
+####### END CLASS TRACE ANALYZER #########
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python SearchTrace.py <trace file>")
+    else:
+        TraceAnalyzer(sys.argv[1]).analyze().printReport()
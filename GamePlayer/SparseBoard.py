@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+
+"""
+# SparseBoard is a five in a row board without edges. Only cells with tokens
+#  are stored, so memory and the work per move follow the number of tokens,
+#  not how far the game has wandered.
+#
+# FiveInARow with DYNAMIC_BOARD grows a StrideDimension to the bounding box of
+# the game, and scans all of it. SparseFiveInARow plays the same game on a
+# SparseBoard:
+#   - Moves are coordinates (x, y), any integers, also negative.
+#   - A line (column, row or diagonal) is read only between its outermost
+#     tokens, with a few empty cells added at each end.
+#   - The evaluation is kept per line with GameEvaluator.evaluateList, and the
+#     winners and (potential) winning moves per line by a ThreatTracker. A
+#     move reads the four lines through it again, nothing else.
+#   - Candidate moves are empty cells close to a token.
+#
+# On an endless board no pattern is cut by an edge, so evaluations can differ
+# from FiveInARow near its edges.
+#
+# Usage:
+#
+#   game = SparseFiveInARow()
+#   game.makeMove((0, 0), game.X_TOKEN)
+#   coordinates, token = game.getComputersMoveForCurrentPosition()
+#
+"""
+
+import GamePlayer.FiveInARow as fiar
+import GamePlayer.GameSearch as gs
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Returns (line key, position on line) for column, row and both diagonals through "coordinates".
+# Position on a column is y, on the others x.
+def getLinesThrough(coordinates):
+    x, y = coordinates
+    return [(('col', x), y), (('row', y), x), (('up', x - y), x), (('down', x + y), x)]
+
+
+# Returns the coordinates of "position" on the line.
+def coordinatesOnLine(lineKey, position):
+    kind, number = lineKey
+    if kind == 'col':
+        return (number, position)
+    if kind == 'row':
+        return (position, number)
+    if kind == 'up':
+        return (position, position - number)
+    return (position, number - position)
+
+
+# Returns the step between two neighbouring positions of the line.
+def getLineDirection(lineKey):
+    kind, number = lineKey
+    if kind == 'col':
+        return (0, 1)
+    if kind == 'row':
+        return (1, 0)
+    if kind == 'up':
+        return (1, 1)
+    return (1, -1)
+
+
+####### CLASS SPARSE BOARD #########
+class SparseBoard:
+    """
+    Board without edges. Only cells with tokens are stored.
+    """
+
+    # Empty cells added at both ends of a line when read. Patterns ending in empty cells are
+    # then found as on an endless line.
+    PADDING = 6
+
+    def __init__(self):
+        self.cells = {}  # (x, y) -> token
+        self.lines = {}  # Line key -> {position on line: token}, for lines with tokens.
+
+    def getToken(self, coordinates):
+        return self.cells.get(coordinates, fiar.NO_TOKEN)
+
+    def isFree(self, coordinates):
+        return coordinates not in self.cells
+
+    def setToken(self, coordinates, token):
+        self.cells[coordinates] = token
+        for lineKey, position in getLinesThrough(coordinates):
+            self.lines.setdefault(lineKey, {})[position] = token
+
+    def removeToken(self, coordinates):
+        del self.cells[coordinates]
+        for lineKey, position in getLinesThrough(coordinates):
+            line = self.lines[lineKey]
+            del line[position]
+            if len(line) == 0:
+                del self.lines[lineKey]
+
+    def getNumberOfTokens(self):
+        return len(self.cells)
+
+    def getOccupiedCoordinates(self):
+        return list(self.cells)
+
+    # Returns ((min x, min y), (max x, max y)) of the tokens, None if board is empty.
+    def getBoundingBox(self):
+        if len(self.cells) == 0:
+            return None
+        xs = [x for x, y in self.cells]
+        ys = [y for x, y in self.cells]
+        return (min(xs), min(ys)), (max(xs), max(ys))
+
+    # Returns (line as string, position of its first character). With "extraToken" the line is read
+    # as if that token was at "extraPosition". An empty line is returned as an empty string.
+    def getLineString(self, lineKey, extraPosition=None, extraToken=None):
+        line = self.lines.get(lineKey, {})
+        positions = list(line)
+        if extraToken is not None:
+            positions.append(extraPosition)
+        if len(positions) == 0:
+            return '', 0
+        first = min(positions) - self.PADDING
+        characters = [fiar.NO_TOKEN] * (max(positions) + self.PADDING - first + 1)
+        for position, token in line.items():
+            characters[position - first] = token
+        if extraToken is not None:
+            characters[extraPosition - first] = extraToken
+        return ''.join(characters), first
+
+    # Returns all data to rebuild the board, as [[x, y, token], ...].
+    def getDataForSave(self):
+        return [[x, y, token] for (x, y), token in self.cells.items()]
+####### END CLASS SPARSE BOARD #########
+
+
+####### CLASS SPARSE FIVE IN A ROW #########
+class SparseFiveInARow:
+    """
+    Five in a row on a SparseBoard, with evaluation and threats kept per line.
+    """
+
+    X_TOKEN = fiar.X_TOKEN
+    O_TOKEN = fiar.O_TOKEN
+    NO_TOKEN = fiar.NO_TOKEN
+
+    MIN_EVAL = fiar.GameEvaluator.MIN_EVAL
+    MAX_EVAL = fiar.GameEvaluator.MAX_EVAL
+
+    # Any algorithm of mma or GameSearch, e.g. gs.PVS_ASPIRATION_ALGO.
+    SEARCH_ALGO = mma.MINMAXALPHABETAPRUNING_ALGO
+    SEARCH_DEPTH = 4
+
+    # Candidate moves are empty cells at most this many steps from a token, in any direction.
+    NEIGHBOURHOOD = 2
+
+    # "evaluations" as to GameEvaluator.
+    def __init__(self, evaluations=None):
+        self.game_evaluator = fiar.GameEvaluator(evaluations)
+
+        self.computerAlgo = gs.GameSearchAlgo(self.evalBoard,
+                                              self.moveX, self.moveO,
+                                              self.undoMove, self.undoMove,
+                                              self.getPossibleMovesMaximizer, self.getPossibleMovesMinimizer,
+                                              self.MIN_EVAL, self.MAX_EVAL)
+        self.resetGame()
+
+    ########################################
+    #
+    #           Game interface
+    #
+    ########################################
+    # Makes an actual move. Return True if move could be made. Else False.
+    def makeMove(self, coordinates, token):
+        try:
+            coordinates = self.__checkMove(coordinates, token)
+        except Exception as err:
+            print(str(err))
+            return False
+        self.placeToken(coordinates, token)
+        self.whoHas = self.O_TOKEN if self.whoHas == self.X_TOKEN else self.X_TOKEN
+        return True
+
+    # Takes back the last move. Returns False if there is none.
+    def undoLastMove(self):
+        if len(self.moveStack) == 0:
+            return False
+        self.undoMove(self.moveStack[-1])
+        self.whoHas = self.O_TOKEN if self.whoHas == self.X_TOKEN else self.X_TOKEN
+        return True
+
+    def getComputersMoveForCurrentPosition(self):
+        if self.board.getNumberOfTokens() == 0:
+            return ((0, 0), self.whoHas)
+        moveDict = self.computerAlgo.calculateMoveWithHistory(gs.historyAlgoFor(self.SEARCH_ALGO), self.whoHas == self.X_TOKEN, self.SEARCH_DEPTH)
+        self.lastSearchResult = moveDict
+        return (moveDict[mma.KEY_BESTMOVE], self.whoHas)
+
+    # X_TOKEN or O_TOKEN when there is five in a row, else None. The board never gets full.
+    def getWinnerOfCurrentPosition(self):
+        threats = self.threatTracker.getThreats()
+        if len(threats[fiar.BoardScanner.KEY_LIST_OF_WINNERS_X]) > 0:
+            return self.X_TOKEN
+        if len(threats[fiar.BoardScanner.KEY_LIST_OF_WINNERS_O]) > 0:
+            return self.O_TOKEN
+        return None
+
+    def resetGame(self):
+        self.board = SparseBoard()
+        self.whoHas = self.X_TOKEN
+        self.moveStack = []  # Coordinates of the tokens on board, in the order they were put there.
+        self.lineEvals = {}  # Line key -> GameEvaluator.evaluateList of the line.
+        self.evaluation = 0  # Sum of "lineEvals".
+        self.threatTracker = fiar.ThreatTracker()  # Lines are keyed as by "getLinesThrough".
+        self.lastSearchResult = None
+
+    # Same tokens gives same key. Player to move is not part of it.
+    def getBoardKey(self):
+        return (tuple(sorted(self.board.getDataForSave())),)
+
+    # Same tokens and same player to move gives same key.
+    def getPositionKey(self):
+        return self.getBoardKey() + (self.whoHas,)
+
+    ###############################################
+    #
+    # Callback Interfaces for different algorithms
+    #
+    ###############################################
+    # Kept up to date move by move, nothing to compute.
+    def evalBoard(self):
+        return self.evaluation
+
+    def moveX(self, move):
+        self.placeToken(move, self.X_TOKEN)
+
+    def moveO(self, move):
+        self.placeToken(move, self.O_TOKEN)
+
+    # Takes back the token at "move". Must be the last one put on board.
+    def undoMove(self, move):
+        if not self.moveStack[-1] == move:
+            raise Exception("Undo of " + str(move) + " but last move is " + str(self.moveStack[-1]))
+        self.moveStack.pop()
+        self.board.removeToken(move)
+        self.__updateLinesThrough(move)
+
+    def getPossibleMovesMaximizer(self):
+        return self.__getMoves(True)
+
+    def getPossibleMovesMinimizer(self):
+        return self.__getMoves(False)
+
+    ################################################################
+    #
+    #                   Help methods
+    #
+    ################################################################
+    def placeToken(self, coordinates, token):
+        self.board.setToken(coordinates, token)
+        self.moveStack.append(coordinates)
+        self.__updateLinesThrough(coordinates)
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # Returns coordinates as a tuple of ints. Raises exception if the move is not ok.
+    def __checkMove(self, coordinates, token):
+        if token not in (self.X_TOKEN, self.O_TOKEN):
+            raise Exception("Only \'X\' or \'O\' is allowed as token!")
+        if not self.whoHas == token:
+            raise Exception("Wrong players move")
+        try:
+            coordinates = (int(coordinates[0]), int(coordinates[1]))
+        except:
+            raise Exception("Coordinates must be two integers!")
+        if not self.board.isFree(coordinates):
+            raise Exception("!!! OCCUPIED SQUARE !!!")
+        return coordinates
+
+    # The evaluation and the threats of the four lines through "coordinates" are read again.
+    def __updateLinesThrough(self, coordinates):
+        for lineKey, position in getLinesThrough(coordinates):
+            lineString, first = self.board.getLineString(lineKey)
+            lineEval = self.game_evaluator.evaluateList(lineString)
+            self.evaluation += lineEval - self.lineEvals.pop(lineKey, 0)
+            if not lineEval == 0:
+                self.lineEvals[lineKey] = lineEval
+            self.threatTracker.scanLineString(lineKey, lineString, coordinatesOnLine(lineKey, first), getLineDirection(lineKey))
+
+    # As GameEvaluator.getMoves: winning moves first, then blocks, then open threes, then the
+    # candidates that change the evaluation most.
+    def __getMoves(self, regardingMaximizer):
+        bsc = fiar.BoardScanner
+        threats = self.threatTracker.getThreats()
+        if self.getWinnerOfCurrentPosition() is not None:
+            return []
+        if self.board.getNumberOfTokens() == 0:
+            return [(0, 0)]
+
+        if regardingMaximizer:
+            order = (bsc.KEY_LIST_OF_WINNING_MOVES_FOR_X, bsc.KEY_LIST_OF_WINNING_MOVES_FOR_O)
+        else:
+            order = (bsc.KEY_LIST_OF_WINNING_MOVES_FOR_O, bsc.KEY_LIST_OF_WINNING_MOVES_FOR_X)
+        for key in order:
+            if len(threats[key]) > 0:
+                return [next(iter(threats[key]))]
+
+        if regardingMaximizer:
+            order = (bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_X, bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_O)
+        else:
+            order = (bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_O, bsc.KEY_LIST_OF_POTENTIAL_WINNING_MOVES_FOR_X)
+        for key in order:
+            if len(threats[key]) > 0:
+                return list(threats[key])
+
+        token = self.X_TOKEN if regardingMaximizer else self.O_TOKEN
+        sign = 1 if regardingMaximizer else -1
+        scoredMoves = []
+        for move in self.__getCandidates():
+            evalDiff = 0
+            for lineKey, position in getLinesThrough(move):
+                lineString, first = self.board.getLineString(lineKey, position, token)
+                evalDiff += self.game_evaluator.evaluateList(lineString) - self.lineEvals.get(lineKey, 0)
+            scoredMoves.append((sign * evalDiff, move))
+
+        scoredMoves.sort(key=lambda scoredMove: scoredMove[0], reverse=True)
+        bestEval = scoredMoves[0][0]
+        return [move for evalDiff, move in scoredMoves[:self.game_evaluator.MAX_CANDIDATE_MOVES]
+                if evalDiff > bestEval - self.game_evaluator.BEST_MOVE_MARGIN]
+
+    # Empty cells close to a token, in a fixed order.
+    def __getCandidates(self):
+        candidates = set()
+        steps = range(-self.NEIGHBOURHOOD, self.NEIGHBOURHOOD + 1)
+        for x, y in self.board.getOccupiedCoordinates():
+            for dx in steps:
+                for dy in steps:
+                    if self.board.isFree((x + dx, y + dy)):
+                        candidates.add((x + dx, y + dy))
+        return sorted(candidates)
+####### END CLASS SPARSE FIVE IN A ROW #########
+
+
+"""
+Example: the computer plays against itself, and the board is printed after each move.
+"""
+def printBoard(game):
+    boundingBox = game.board.getBoundingBox()
+    if boundingBox is None:
+        return
+    (minX, minY), (maxX, maxY) = boundingBox
+    for y in range(maxY, minY - 1, -1):
+        print("{:4d} ".format(y) + ''.join(game.board.getToken((x, y)) for x in range(minX, maxX + 1)))
+    print("     x from " + str(minX) + " to " + str(maxX))
+
+
+if __name__ == '__main__':
+    print("Welcome to GamePlayer - Five in a row without edges!")
+    sparseGame = SparseFiveInARow()
+    while sparseGame.getWinnerOfCurrentPosition() is None and len(sparseGame.moveStack) < 100:
+        coordinates, token = sparseGame.getComputersMoveForCurrentPosition()
+        sparseGame.makeMove(coordinates, token)
+        print(token + " plays " + str(coordinates))
+        printBoard(sparseGame)
+    print("Winner: " + str(sparseGame.getWinnerOfCurrentPosition()))
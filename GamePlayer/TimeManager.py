@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+"""
+# TimeManager lets a game search as long as its clock allows, instead of to a
+#  fixed depth.
+#
+# GameClock is the clock of a timed game: time for the game (or for each
+# time control), increment per move, and moves to the next time control.
+#
+# TimeManager gives every move a budget from the clock:
+#   - The base is the time left shared over the moves to go (or an estimate
+#     of them), plus most of the increment.
+#   - Less in the opening, when few tokens are on board.
+#   - More when the game says its position is critical (getThreatStatus),
+#     and only depth 1 when the move is forced (a win or a block).
+# The search deepens one depth at a time (GameSearchAlgo.calculateMoveBeforeDeadline).
+# After each depth it goes on while within the budget. The budget shrinks while
+# the best move stays the same from depth to depth, and grows when it changes.
+# A hard limit, a part of the time left, is never passed by PVS_ASPIRATION_ALGO,
+# which is stopped in the middle of a depth. Other algorithms are stopped between
+# depths, by an estimate of the time of the next depth.
+#
+# Usage:
+#
+#   clock = GameClock(300, increment=2)
+#   game.timeManager = TimeManager(clock)
+#   game.SEARCH_ALGO = gs.PVS_ASPIRATION_ALGO
+#
+#   clock.start(game.whoHas)
+#   coordinates, token = game.getComputersMoveForCurrentPosition()
+#   game.makeMove(coordinates, token)
+#   clock.stop()
+#
+"""
+
+import GamePlayer.GameEngine as ge
+import MinMaxAlgorithm.MinMaxAlgorithm as mma
+import time
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+####### CLASS GAME CLOCK #########
+class GameClock:
+    """
+    Clock of both players. Times in seconds.
+    """
+
+    # "totalTime" for the game, or for every "movesToGo" moves if given. "increment" is added after every move.
+    def __init__(self, totalTime, increment=0.0, movesToGo=None):
+        self.totalTime = totalTime
+        self.increment = increment
+        self.movesPerControl = movesToGo
+        self.remaining = {ge.GameEngine.X_TOKEN: totalTime, ge.GameEngine.O_TOKEN: totalTime}
+        self.movesToGo = {ge.GameEngine.X_TOKEN: movesToGo, ge.GameEngine.O_TOKEN: movesToGo}
+        self.runningToken = None
+        self.startTime = None
+
+    # Starts the clock of "token". Stops the other one if running.
+    def start(self, token):
+        if self.runningToken is not None:
+            self.stop()
+        self.runningToken = token
+        self.startTime = time.time()
+
+    # Stops the running clock after a move. Returns the time used.
+    def stop(self):
+        if self.runningToken is None:
+            return 0.0
+        token = self.runningToken
+        usedTime = time.time() - self.startTime
+        self.runningToken = None
+        self.remaining[token] -= usedTime
+        if self.remaining[token] < 0:
+            return usedTime  # Flagged. No increment.
+
+        self.remaining[token] += self.increment
+        if self.movesToGo[token] is not None:
+            self.movesToGo[token] -= 1
+            if self.movesToGo[token] == 0:
+                self.remaining[token] += self.totalTime
+                self.movesToGo[token] = self.movesPerControl
+        return usedTime
+
+    # Time left for "token", also while its clock runs.
+    def getRemaining(self, token):
+        if token == self.runningToken:
+            return self.remaining[token] - (time.time() - self.startTime)
+        return self.remaining[token]
+
+    # Moves to the next time control, None if all the game is one control.
+    def getMovesToGo(self, token):
+        return self.movesToGo[token]
+
+    def isFlagged(self, token):
+        return self.getRemaining(token) < 0
+####### END CLASS GAME CLOCK #########
+
+
+####### CLASS TIME MANAGER #########
+class TimeManager:
+    """
+    Decides how long each search may take, from the clock and the position.
+    """
+
+    # Kept for making the move and sending it. Never planned to be used.
+    SAFETY_MARGIN = 0.1
+
+    # Moves left of the game, guessed when the clock has no moves to go.
+    DEFAULT_MOVES_TO_GO = 30
+    # Part of the increment planned to be used by every move.
+    INCREMENT_SHARE = 0.8
+
+    # Hard limit: this many budgets, but never more than this part of the time left.
+    HARD_FACTOR = 3.0
+    MAX_FRACTION = 0.4
+
+    # With fewer tokens than this on board, the budget is multiplied by OPENING_FACTOR.
+    OPENING_TOKENS = 6
+    OPENING_FACTOR = 0.5
+    # Multiplies the budget when the game's threat status is THREAT_CRITICAL.
+    CRITICAL_FACTOR = 1.5
+
+    # After each depth where the best move was the same as at the depth before, the budget is
+    # multiplied by STABLE_FACTOR. When it changed, by UNSTABLE_FACTOR.
+    STABLE_FACTOR = 0.7
+    UNSTABLE_FACTOR = 1.5
+
+    # Deepest search tried. The clock stops it long before, in all but trivial positions.
+    MAX_DEPTH = 30
+
+    def __init__(self, clock):
+        self.clock = clock
+
+        # (budget, hard limit) of the last move.
+        self.lastBudget = None
+
+        # Best move of the depth before, and the budget as changed by the depths so far.
+        self.__previousBestMove = None
+        self.__budget = 0
+
+    # Returns (budget, hard limit) in seconds, for the player to move in "game".
+    def getBudget(self, game):
+        remaining = max(0.0, self.clock.getRemaining(game.whoHas) - self.SAFETY_MARGIN)
+        movesToGo = self.clock.getMovesToGo(game.whoHas) or self.DEFAULT_MOVES_TO_GO
+        budget = remaining / movesToGo + self.clock.increment * self.INCREMENT_SHARE
+
+        boardData = game.board.getAllData()
+        if len(boardData) - boardData.count(game.NO_TOKEN) < self.OPENING_TOKENS:
+            budget *= self.OPENING_FACTOR
+        if game.getThreatStatus() == game.THREAT_CRITICAL:
+            budget *= self.CRITICAL_FACTOR
+
+        hardLimit = min(budget * self.HARD_FACTOR, remaining * self.MAX_FRACTION)
+        return min(budget, hardLimit), hardLimit
+
+    # Searches the current position of "game" within the budget. Returns the moveDict, with gs.KEY_DEPTH.
+    def searchMove(self, game):
+        startTime = time.time()
+        self.__budget, hardLimit = self.getBudget(game)
+        self.lastBudget = (self.__budget, hardLimit)
+        self.__previousBestMove = None
+
+        maxDepth = 1 if game.getThreatStatus() == game.THREAT_FORCED else self.MAX_DEPTH
+        return game.computerAlgo.calculateMoveBeforeDeadline(game.SEARCH_ALGO, game.whoHas == game.X_TOKEN, maxDepth,
+                                                             startTime + hardLimit, self.__shouldContinue)
+
+    ################################################################
+    #
+    #                   Private help methods
+    #
+    ################################################################
+    # Called after each depth.
+    def __shouldContinue(self, moveDict, usedTime):
+        bestMove = moveDict[mma.KEY_BESTMOVE]
+        if self.__previousBestMove is not None:
+            if bestMove == self.__previousBestMove:
+                self.__budget *= self.STABLE_FACTOR
+            else:
+                self.__budget *= self.UNSTABLE_FACTOR
+        self.__previousBestMove = bestMove
+        return usedTime < min(self.__budget, self.lastBudget[1])
+####### END CLASS TIME MANAGER #########
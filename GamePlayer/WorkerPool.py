@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+# WorkerPool holds the helpers shared by everything that runs game analysis
+#  in a pool of worker processes.
+#
+# imapBounded maps a function over an iterable in an executor, like
+# executor.map, but only reads the iterable as far as needed to keep a fixed
+# number of jobs in flight. A stream of millions of items never has to be in
+# memory at once.
+#
+# getWorkerGame gives each worker process one game object of a class, set up
+# once and reused by every job the worker runs.
+#
+# Usage:
+#
+#   with concurrent.futures.ProcessPoolExecutor() as executor:
+#       for result in imapBounded(executor, analyze, readItems(), maxInFlight=16):
+#           ...
+#
+"""
+
+import collections
+import concurrent.futures
+
+__author__ = "Helge Modén, www.github.com/helgemod"
+__copyright__ = "Copyright 2020, Helge Modén"
+__credits__ = None
+__license__ = "MIT"
+__version__ = "1.0.1"
+__maintainer__ = "Helge Modén, https://github.com/helgemod/MinMaxAlgorithm"
+__email__ = "helgemod@gmail.com"
+__status__ = "https://github.com/helgemod/GamePlayer"
+__date__ = "2020-11-24"
+
+
+# Yields function(item) for every item. At most "maxInFlight" items are submitted and not yet yielded.
+# If "ordered", results come in the order of the items. Else as soon as they are done.
+def imapBounded(executor, function, iterable, maxInFlight, ordered=True):
+    inFlight = collections.deque() if ordered else set()
+    for item in iterable:
+        if len(inFlight) >= maxInFlight:
+            for result in __waitForResults(inFlight, ordered):
+                yield result
+        future = executor.submit(function, item)
+        if ordered:
+            inFlight.append(future)
+        else:
+            inFlight.add(future)
+    while len(inFlight) > 0:
+        for result in __waitForResults(inFlight, ordered):
+            yield result
+
+
+# Removes at least one done future from "inFlight" and returns their results.
+def __waitForResults(inFlight, ordered):
+    if ordered:
+        return [inFlight.popleft().result()]
+    done, notDone = concurrent.futures.wait(inFlight, return_when=concurrent.futures.FIRST_COMPLETED)
+    inFlight.difference_update(done)
+    return [future.result() for future in done]
+
+
+################################################################
+#
+#       Runs in the worker processes.
+#
+################################################################
+__workerGames = {}
+
+
+# Returns the game of "gameClass" of this process, created on first use.
+def getWorkerGame(gameClass):
+    if gameClass not in __workerGames:
+        __workerGames[gameClass] = gameClass()
+    return __workerGames[gameClass]
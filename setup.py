@@ -10,4 +10,5 @@ setup(name='GamePlayer',
       packages=['GamePlayer'],
       dependency_links=['https://github.com/helgemod/StrideDimensions/archive/1.0.1.tar.gz',
                         'https://github.com/helgemod/MinMaxAlgorithm/archive/1.0.1.tar.gz'],
+      extras_require={'numpy': ['numpy']},
       zip_safe=False)
\ No newline at end of file